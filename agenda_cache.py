@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Agenda Cache - Each day's merged task list, expanded, sorted and serialized once
+
+/api/occurrences used to re-expand every template and scan every single
+task for the whole range on each request. Days are now built once, kept
+as the JSON bytes the response is made of, and reused until an edit
+touches them.
+
+Each cached day records the single tasks and templates on it. When a task
+file's version changes the cache diffs the new content against what it
+last saw, record by record, and drops only the days an edit can affect:
+
+- a single task: the day it was on and the day it is on now
+- a template: the days it was on, plus the cached days its new
+  recurrence lands on
+- a completion toggle: that one date
+
+Days are expanded by expand_occurrences, so responses are unchanged.
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from metrics import json_serialize_seconds
+from recurrence import expand_occurrences, template_dates
+from task_files import COMPLETIONS_FILE, RECURRING_FILE, SINGLE_FILE
+
+# About ten years of days; the least recently used are dropped past this
+AGENDA_MAX_DAYS = 3660
+
+
+def _keyed(content):
+    """Records by id, or None if ids are missing or repeated and can't be diffed"""
+    records = {task.get('id'): task for task in content}
+    if len(records) != len(content) or None in records:
+        return None
+    return records
+
+
+def _same_order(before, after):
+    """Records both versions share are in the same order (the sort is stable, so order matters)"""
+    return [key for key in after if key in before] == [key for key in before if key in after]
+
+
+def _runs(dates):
+    """Sorted dates grouped into (first, last) runs of consecutive days"""
+    runs = []
+    for day in dates:
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+class AgendaDay:
+    """One cached day: its JSON and what it was built from"""
+    __slots__ = ('body', 'singles', 'templates')
+
+    def __init__(self, body, singles, templates):
+        self.body = body
+        self.singles = singles
+        self.templates = templates
+
+
+class AgendaCache:
+    """Per-day agenda JSON, invalidated by the records each day depends on"""
+
+    def __init__(self, read, max_days=AGENDA_MAX_DAYS):
+        self.read = read  # filename -> (content, version), e.g. TaskStore.read
+        self.max_days = max_days
+        self.days = OrderedDict()  # 'YYYY-MM-DD' -> AgendaDay, least recently used first
+        self.by_template = {}      # template id -> cached days it occurs on
+        self.versions = {}         # filename -> version the cache is up to date with
+        self.singles = {}          # single task id -> record, as of versions (None: ids not usable)
+        self.singles_by_date = {}
+        self.recurring = []
+        self.templates = {}
+        self.completions = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def range_json(self, range_start, range_end):
+        """{"from", "to", "days"} for the range as JSON bytes, building only the days not cached"""
+        with self.lock:
+            self._sync()
+            dates = [range_start + timedelta(days=offset) for offset in range((range_end - range_start).days + 1)]
+            missing = []
+            for day in dates:
+                if day.isoformat() in self.days:
+                    self.days.move_to_end(day.isoformat())
+                else:
+                    missing.append(day)
+            self.hits += len(dates) - len(missing)
+            self.misses += len(missing)
+            for first, last in _runs(missing):
+                self._build(first, last)
+            days = b", ".join(b'"%s": %s' % (day.isoformat().encode(), self.days[day.isoformat()].body)
+                              for day in dates)
+        head = json.dumps({"from": range_start.isoformat(), "to": range_end.isoformat()})[:-1]
+        return head.encode() + b', "days": {' + days + b'}}'
+
+    def _build(self, range_start, range_end):
+        singles = []
+        for offset in range((range_end - range_start).days + 1):
+            singles += self.singles_by_date.get((range_start + timedelta(days=offset)).isoformat(), ())
+        days = expand_occurrences(self.recurring, singles, self.completions, range_start, range_end)
+        with json_serialize_seconds.time(what='agenda'):
+            for day, tasks in days.items():
+                single_ids = {id(task): task.get('id') for task in self.singles_by_date.get(day, ())}
+                templates = {task['recurrenceId'] for task in tasks if id(task) not in single_ids}
+                self.days[day] = AgendaDay(json.dumps(tasks).encode(), set(single_ids.values()), templates)
+                for template_id in templates:
+                    self.by_template.setdefault(template_id, set()).add(day)
+        while len(self.days) > self.max_days:
+            self._drop(next(iter(self.days)))
+
+    def _drop(self, day):
+        entry = self.days.pop(day, None)
+        if not entry:
+            return False
+        for template_id in entry.templates:
+            cached = self.by_template.get(template_id)
+            if cached:
+                cached.discard(day)
+                if not cached:
+                    del self.by_template[template_id]
+        return True
+
+    def invalidate(self, days=None):
+        """Drop the given 'YYYY-MM-DD' days, or every day"""
+        with self.lock:
+            self._invalidate(days)
+
+    def _invalidate(self, days=None):
+        for day in list(self.days if days is None else days):
+            self.invalidated += self._drop(day)
+
+    def _sync(self):
+        """Catch up with the task files, dropping the days their edits affect"""
+        for filename, update in ((SINGLE_FILE, self._update_singles),
+                                 (RECURRING_FILE, self._update_templates),
+                                 (COMPLETIONS_FILE, self._update_completions)):
+            content, version = self.read(filename)
+            if self.versions.get(filename) != version:
+                update(content)
+                self.versions[filename] = version
+
+    def _update_singles(self, content):
+        singles = _keyed(content)
+        if singles is None or self.singles is None or not _same_order(self.singles, singles):
+            self._invalidate()
+        else:
+            for task_id in singles.keys() | self.singles.keys():
+                before, after = self.singles.get(task_id), singles.get(task_id)
+                if before is not after and before != after:
+                    self._invalidate({(before or {}).get('date'), (after or {}).get('date')} - {None})
+        self.singles = singles
+        self.singles_by_date = {}
+        for task in content:
+            if task.get('date'):
+                self.singles_by_date.setdefault(task['date'], []).append(task)
+
+    def _update_templates(self, content):
+        templates = _keyed(content)
+        if templates is None or self.templates is None or not _same_order(self.templates, templates):
+            self._invalidate()
+        else:
+            for template_id in templates.keys() | self.templates.keys():
+                before, after = self.templates.get(template_id), templates.get(template_id)
+                if before is after or before == after:
+                    continue
+                self._invalidate(self.by_template.get(template_id, ()))
+                if after and after.get('recurrence') and self.days:
+                    # Cached days the template didn't occur on before but may now
+                    first, last = date.fromisoformat(min(self.days)), date.fromisoformat(max(self.days))
+                    try:
+                        self._invalidate([day.isoformat() for day in template_dates(after, first, last)])
+                    except (TypeError, ValueError):
+                        self._invalidate()  # can't tell which days it lands on
+        self.templates = templates
+        self.recurring = content
+
+    def _update_completions(self, content):
+        for template_id in content.keys() | self.completions.keys():
+            before, after = self.completions.get(template_id) or {}, content.get(template_id) or {}
+            if not isinstance(before, dict) or not isinstance(after, dict):
+                self._invalidate()  # not a {date: completed} map - can't tell which days changed
+            elif before is not after:
+                self._invalidate([day for day in before.keys() | after.keys() if before.get(day) != after.get(day)])
+        self.completions = content
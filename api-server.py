@@ -2,20 +2,681 @@
 """
 API Server with integrated Claude for Schedule app
 """
+import asyncio
 import json
+import logging
 import subprocess
 import time
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import queue
+import signal
+import sys
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from datetime import date, timedelta
+from http import HTTPStatus
+
+import async_http
+from agenda_cache import AgendaCache
+from claude_sessions import (ClaudeSessionPool, ClaudeSessionError, ClaudeReplyError, claude_run_seconds,
+                             claude_spawns, claude_timeouts)
+from command_parser import CommandRouter
+from file_watcher import FileWatcher
+from interval_index import IntervalIndex, from_absolute, parse_datetime, task_interval
+from log_setup import configure_logging
+from metrics import counter, gauge, histogram, json_parse_seconds, json_serialize_seconds, render
+from prompt_builder import PromptBuilder, claude_instructions
+from recurrence import parse_date
+from response_cache import ResponseCache
+from static_files import StaticFiles
+from task_files import (COMPLETIONS_FILE, RECURRING_FILE, SINGLE_FILE, TASK_FILES, PatchError,
+                        VersionConflict, atomic_write_json)
+from task_store import TaskStore
+
+log = logging.getLogger('api-server')
+
+# Claude subprocess limits - each run can take up to 120s, so only a few
+# may run at once and only a few more may wait for a free worker
+CLAUDE_WORKERS = int(os.environ.get("CLAUDE_WORKERS", "2"))
+CLAUDE_MAX_QUEUE = int(os.environ.get("CLAUDE_MAX_QUEUE", "4"))
+
+# SERVER_MODE=async serves on asyncio (run_async_server) instead of a thread per connection
+SERVER_MODE = os.environ.get("SERVER_MODE", "threaded")
+
+
+class ClaudeBusyError(Exception):
+    """Raised when the Claude worker pool queue is full"""
+
+
+class ClaudeWorkerPool:
+    """Fixed-size pool of worker threads for Claude subprocess calls"""
+
+    def __init__(self, workers=CLAUDE_WORKERS, max_queue=CLAUDE_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="claude")
+        self.lock = threading.Lock()
+        self.pending = 0  # running + queued
+
+    def submit(self, fn, *args):
+        """Queue a Claude call, raising ClaudeBusyError if the queue is full"""
+        with self.lock:
+            if self.pending >= self.workers + self.max_queue:
+                raise ClaudeBusyError(f"{self.pending} Claude requests already pending")
+            self.pending += 1
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self.lock:
+            self.pending -= 1
+
+    def queue_depth(self):
+        """Number of requests waiting for a free worker"""
+        with self.lock:
+            return max(0, self.pending - self.workers)
+
+
+claude_pool = ClaudeWorkerPool()
+
+# Set CLAUDE_SESSIONS=0 to always spawn a fresh claude process per request
+USE_CLAUDE_SESSIONS = os.environ.get("CLAUDE_SESSIONS", "1") != "0"
+claude_sessions = None
+claude_sessions_lock = threading.Lock()
+
+
+def get_claude_sessions(context, cwd):
+    global claude_sessions
+    with claude_sessions_lock:
+        if not claude_sessions:
+            claude_sessions = ClaudeSessionPool(context, cwd, size=CLAUDE_WORKERS)
+        return claude_sessions
+
+# Replies that report a failure instead of answering - never cached
+CLAUDE_TIMEOUT_REPLY = "Claude request timed out"
+CLAUDE_ERROR_REPLY = "Error communicating with Claude"
+CLAUDE_CANCELLED_REPLY = "Claude request cancelled"
+
+# Finished jobs are kept this long so dropped clients can still collect results
+JOB_TTL = 600
+
+# Longest date range /api/occurrences will expand in one request
+MAX_OCCURRENCE_DAYS = 366
+# and /api/analytics - its busy matrix is a row of minutes per day
+MAX_ANALYTICS_DAYS = 10 * 366
+
+# Conflict index covers this window around today
+INDEX_PAST_DAYS = 30
+INDEX_FUTURE_DAYS = 365
+schedule_index = None
+index_versions = {}
+index_lock = threading.Lock()
+
+
+def index_task_file(filename, content, version):
+    """Feed a saved task file into the conflict index (only changed records are re-indexed)"""
+    if schedule_index and filename in (RECURRING_FILE, SINGLE_FILE):
+        with index_lock:
+            try:
+                schedule_index.update_tasks(filename, content, recurring=filename == RECURRING_FILE)
+            except Exception:
+                # The file is already saved - a broken index mustn't fail the save
+                log.exception("Failed to index task file", extra={"file": filename})
+                return
+            index_versions[filename] = version
+
+
+class ChangeBroadcaster:
+    """Fan-out of task file change events to /api/events subscribers"""
+
+    def __init__(self, history=200):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.history = deque(maxlen=history)
+        self.next_id = 1
+        self.versions = {}  # filename -> last published version
+
+    def publish(self, event):
+        with self.lock:
+            if self.versions.get(event["file"]) == event.get("version"):
+                return  # already announced (e.g. the watcher seeing our own save)
+            self.versions[event["file"]] = event.get("version")
+            event = {"id": self.next_id, "timestamp": time.time(), **event}
+            self.next_id += 1
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def subscribe(self, last_event_id=0, subscriber=None):
+        """New subscriber queue, pre-filled with events missed since last_event_id
+
+        subscriber can be any object with put(event); publish() calls it from
+        whichever thread saved the file.
+        """
+        if subscriber is None:
+            subscriber = queue.Queue()
+        with self.lock:
+            for event in self.history:
+                if event["id"] > last_event_id:
+                    subscriber.put(event)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+
+SCHEDULE_DIR = Path(__file__).parent
+TASKS_FILE = SCHEDULE_DIR / "tasks.json"
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PATCH, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-Match',
+}
+CORS_HEADERS = {**PREFLIGHT_HEADERS, 'Access-Control-Expose-Headers': 'ETag'}
+SSE_HEADERS = {'Content-type': 'text/event-stream', 'Cache-Control': 'no-cache', 'Access-Control-Allow-Origin': '*'}
+
+change_events = ChangeBroadcaster()
+static_files = StaticFiles(SCHEDULE_DIR)
+# Task files are read from disk once; handlers read and edit them in memory
+task_store = TaskStore(SCHEDULE_DIR)
+response_cache = ResponseCache()
+agenda_cache = AgendaCache(task_store.read)
+
+# Everything /api/metrics reports that isn't recorded by another module
+API_ROUTES = {'/api/claude', '/api/claude/jobs', '/api/occurrences', '/api/events', '/api/conflicts',
+              '/api/free-slot', '/api/analytics', '/api/save-tasks', '/api/save-file', '/api/metrics'}
+http_requests = counter('http_requests_total', 'HTTP requests handled', ['method', 'route', 'status'])
+http_duration = histogram('http_request_duration_seconds',
+                          'Time to handle an HTTP request (the whole stream for SSE)', ['method', 'route'])
+gauge('claude_queue_depth', 'Claude requests waiting for a free worker', lambda: claude_pool.queue_depth())
+gauge('claude_pending', 'Claude requests running or waiting', lambda: claude_pool.pending)
+gauge('claude_jobs', 'Claude jobs kept for polling', lambda: len(claude_jobs.jobs))
+gauge('event_subscribers', 'Connected /api/events clients', lambda: len(change_events.subscribers))
+gauge('task_file_unsaved', 'Task files with edits not yet written to disk',
+      lambda: {name: int(stored.dirty) for name, stored in task_store.files.items()}, ['file'])
+gauge('claude_cache_hits_total', 'Claude answers served from the response cache',
+      lambda: response_cache.hits, kind='counter')
+gauge('claude_cache_misses_total', 'Claude requests not in the response cache',
+      lambda: response_cache.misses, kind='counter')
+gauge('claude_cache_coalesced_total', 'Claude requests that joined an identical one already running',
+      lambda: response_cache.coalesced, kind='counter')
+gauge('agenda_cache_days', 'Days held in the agenda cache', lambda: len(agenda_cache.days))
+gauge('agenda_cache_hits_total', '/api/occurrences days served from the agenda cache',
+      lambda: agenda_cache.hits, kind='counter')
+gauge('agenda_cache_misses_total', '/api/occurrences days that had to be built',
+      lambda: agenda_cache.misses, kind='counter')
+gauge('agenda_cache_invalidated_total', 'Cached days dropped because an edit affected them',
+      lambda: agenda_cache.invalidated, kind='counter')
+
+
+def route_label(path):
+    """Route for metric labels - job ids and unknown paths are folded so the label set stays small"""
+    if path.startswith('/api/claude/jobs/'):
+        return '/api/claude/jobs/{id}/stream' if path.endswith('/stream') else '/api/claude/jobs/{id}'
+    if path.startswith('/api/tasks/'):
+        return path if path[len('/api/tasks/'):] in TASK_FILES else 'other'
+    if path.startswith('/api/'):
+        return path if path in API_ROUTES else 'other'
+    return 'static'
+
+
+def json_body(data):
+    """Response body for data, unless it is already JSON bytes (e.g. from the agenda cache)"""
+    if isinstance(data, bytes):
+        return data
+    with json_serialize_seconds.time(what='response'):
+        return json.dumps(data).encode()
+
+
+def parse_json(raw):
+    """Request body as JSON, timed for /api/metrics"""
+    with json_parse_seconds.time(what='request'):
+        return json.loads(raw.decode('utf-8'))
+
+
+def task_file_saved(filename, content, version, source, ops=None, base_version=None):
+    """Index a saved task file and tell connected clients about it"""
+    index_task_file(filename, content, version)
+    response_cache.invalidate()
+    event = {"file": filename, "version": version, "source": source}
+    if ops is not None:
+        # Clients at base_version can apply the ops instead of reloading the file
+        event["ops"] = ops
+        event["baseVersion"] = base_version
+    change_events.publish(event)
+
+
+def watch_task_files(schedule_dir):
+    """Reload and announce edits made outside the API, e.g. by the Claude CLI"""
+    watched = [schedule_dir / filename for filename in TASK_FILES]
+    change_events.versions.update(task_store.versions())
+    watcher = FileWatcher(watched)
+    while True:
+        for path in watcher.wait():
+            try:
+                if path.stat().st_size == 0:
+                    continue  # truncated by a writer that hasn't written yet
+                reloaded = task_store.reload(path.name)
+            except (ValueError, OSError):
+                continue  # mid-write or invalid JSON - the next event will catch it
+            if not reloaded:
+                continue  # our own save - announced by the endpoint that made it
+            announce_disk_change(path.name, *reloaded)
+
+
+def announce_disk_change(filename, content, version):
+    """Announce a change made on disk, by the Claude CLI if a Claude run is in progress"""
+    source = "claude" if claude_pool.pending else "external"
+    task_file_saved(filename, content, version, source)
+
+
+task_store.on_change = announce_disk_change
+
+
+def get_schedule_index():
+    """The conflict index, caught up with any edits made outside the API (e.g. by Claude)"""
+    global schedule_index
+    today = date.today()
+    with index_lock:
+        if not schedule_index or today - schedule_index.horizon_start > timedelta(days=INDEX_PAST_DAYS):
+            schedule_index = IntervalIndex(today - timedelta(days=INDEX_PAST_DAYS),
+                                           today + timedelta(days=INDEX_FUTURE_DAYS))
+            index_versions.clear()
+    for filename in (RECURRING_FILE, SINGLE_FILE):
+        content, version = task_store.read(filename)
+        if index_versions.get(filename) != version:
+            index_task_file(filename, content, version)
+    return schedule_index
+
+
+# Endpoint bodies shared by the threaded and asyncio servers. Each returns
+# the arguments for a JSON response: (data, status) or (data, status, headers),
+# where data may already be serialized to bytes
+
+def occurrences_for(query_params):
+    """Merged single + recurring tasks for every day in ?from=&to="""
+    try:
+        range_start = parse_date(query_params.get('from', [''])[0])
+        range_end = parse_date(query_params.get('to', [''])[0]) or range_start
+    except ValueError:
+        range_start = None
+    if not range_start or range_end < range_start:
+        return {"error": "Use from=YYYY-MM-DD&to=YYYY-MM-DD"}, 400
+    if (range_end - range_start).days >= MAX_OCCURRENCE_DAYS:
+        return {"error": f"Range is limited to {MAX_OCCURRENCE_DAYS} days"}, 400
+    try:
+        return agenda_cache.range_json(range_start, range_end), 200
+    except Exception as e:
+        log.exception("Error building agenda")
+        agenda_cache.invalidate()
+        return {"error": f"Failed to build agenda: {e}"}, 500
+
+
+def conflicts_for(query_params):
+    """Overlaps for a proposed time (?date=&startTime=&endTime=) or across ?from=&to="""
+    param = lambda name: query_params.get(name, [''])[0]
+    try:
+        index = get_schedule_index()
+        if param('date'):
+            interval = task_interval(date.fromisoformat(param('date')),
+                                     {"startTime": param('startTime'), "endTime": param('endTime')})
+            if not interval:
+                raise ValueError("startTime is required")
+            conflicts = index.overlapping(*interval, exclude=param('exclude') or None)
+            return {"conflicts": [index.describe(entry) for entry in conflicts]}, 200
+        range_start = date.fromisoformat(param('from'))
+        range_end = date.fromisoformat(param('to')) if param('to') else range_start
+        pairs = index.conflicts(range_start, range_end)
+        return {"conflicts": [[index.describe(a), index.describe(b)] for a, b in pairs]}, 200
+    except ValueError as e:
+        return {"error": f"Invalid query: {e}"}, 400
+
+
+def free_slot_for(query_params):
+    """Next free slot of ?minutes= starting at or after ?after=YYYY-MM-DDTHH:MM"""
+    param = lambda name, default='': query_params.get(name, [default])[0]
+    try:
+        index = get_schedule_index()
+        length = int(param('minutes', '30'))
+        if length <= 0:
+            raise ValueError("minutes must be positive")
+        start = index.next_free_slot(parse_datetime(param('after')), length,
+                                     param('dayStart', '00:00'), param('dayEnd', '24:00'))
+    except ValueError as e:
+        return {"error": f"Invalid query: {e}"}, 400
+    if start is None:
+        return {"slot": None}, 200
+    slot_date, start_time = from_absolute(start)
+    _, end_time = from_absolute(start + length)
+    return {"slot": {"date": slot_date, "startTime": start_time, "endTime": end_time}}, 200
+
+
+def analytics_for(query_params):
+    """Aggregates over a long range (up to several years) of expanded tasks"""
+    try:
+        # numpy is only needed for analytics, so the rest of the server runs without it
+        from occurrence_table import OccurrenceTable
+    except ImportError:
+        return {"error": "Analytics need numpy (pip install numpy)"}, 501
+
+    try:
+        range_start = parse_date(query_params.get('from', [''])[0])
+        range_end = parse_date(query_params.get('to', [''])[0])
+    except ValueError:
+        range_start = range_end = None
+    if not range_start or not range_end or range_end < range_start:
+        return {"error": "Use from=YYYY-MM-DD&to=YYYY-MM-DD"}, 400
+    if (range_end - range_start).days >= MAX_ANALYTICS_DAYS:
+        return {"error": f"Range is limited to {MAX_ANALYTICS_DAYS} days"}, 400
+    try:
+        slot_minutes = int(query_params.get('freeSlots', ['0'])[0] or 0)
+    except ValueError:
+        slot_minutes = -1
+    if slot_minutes < 0:
+        return {"error": "freeSlots must be a number of minutes"}, 400
+
+    table = OccurrenceTable.build(task_store.read(RECURRING_FILE)[0], task_store.read(SINGLE_FILE)[0],
+                                  task_store.read(COMPLETIONS_FILE)[0], range_start, range_end)
+    result = table.summary()
+    if slot_minutes:
+        result["freeSlots"] = table.free_slots(slot_minutes)
+    return result, 200
+
+
+def static_headers(entry, encoding, body):
+    """Headers for a 200 response with a static file's body (None: sent from disk)"""
+    headers = {
+        'Content-type': entry.content_type,
+        'Content-Length': str(len(body) if body is not None else entry.size),
+        'ETag': entry.etags[encoding],
+        'Last-Modified': entry.last_modified,
+        # Always revalidate - a 304 costs a round trip but no body
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return headers
+
+
+def task_file_for(filename):
+    """Current content of a task file, with its version as the ETag"""
+    if filename not in TASK_FILES:
+        return {"error": "Invalid filename"}, 404
+    content, version = task_store.read(filename)
+    return {"content": content, "version": version}, 200, {"ETag": f'"{version}"'}
+
+
+def if_match_version(value):
+    """Version from an If-Match header value, or None for an unconditional write"""
+    if not value or value.strip() == '*':
+        return None
+    return value.strip().removeprefix('W/').strip('"')
+
+
+def event_offset(value):
+    """Position from ?offset= or a Last-Event-ID header, None if it isn't a count"""
+    try:
+        offset = int(value or 0)
+    except ValueError:
+        return None
+    return offset if offset >= 0 else None
+
+
+def version_conflict(conflict):
+    return ({"error": str(conflict), "version": conflict.current_version}, 412,
+            {"ETag": f'"{conflict.current_version}"'})
+
+
+def save_tasks(body):
+    """POST /api/save-tasks: replace tasks.json"""
+    try:
+        data = parse_json(body)
+        tasks = data.get('tasks', [])
+        source = data.get('source', 'user')  # Track who is making the change
+
+        # Write tasks directly to file
+        atomic_write_json(TASKS_FILE, tasks)
+        log.info("Saved tasks.json", extra={"tasks": len(tasks), "source": source})
+        return {"success": True, "message": "Tasks saved successfully", "source": source}, 200
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON"}, 200
+    except Exception as e:
+        log.exception("Error saving tasks")
+        return {"error": f"Failed to save tasks: {e}"}, 200
+
+
+def save_file(body, expected_version=None):
+    """POST /api/save-file: replace a whole task file"""
+    try:
+        data = parse_json(body)
+        filename = data.get('filename', '')
+        content = data.get('content', [])
+
+        # Only allow saving specific task files
+        if filename not in TASK_FILES:
+            return {"error": "Invalid filename"}, 200
+        saved, version = task_store.replace(filename, content, expected_version)
+        task_file_saved(filename, saved, version, data.get('source', 'user'))
+        log.info("Saved task file", extra={"file": filename, "version": version})
+        # merged: the file had other edits since the client's version - it should reload
+        return ({"success": True, "message": f"{filename} saved successfully", "version": version,
+                 "merged": saved is not content}, 200, {"ETag": f'"{version}"'})
+    except VersionConflict as e:
+        return version_conflict(e)
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON"}, 200
+    except Exception as e:
+        log.exception("Error saving file")
+        return {"error": f"Failed to save file: {e}"}, 200
+
+
+def patch_file(filename, body, expected_version=None):
+    """PATCH /api/tasks/<file>: record-level edits to a task file"""
+    if filename not in TASK_FILES:
+        return {"error": "Invalid filename"}, 404
+    try:
+        data = parse_json(body)
+        # Either {"ops": [...]} or a single operation
+        operations = data.get('ops', [data])
+        content, version, base_version = task_store.patch(filename, operations, expected_version)
+        task_file_saved(filename, content, version, data.get('source', 'user'), operations, base_version)
+        log.info("Patched task file", extra={"file": filename, "version": version,
+                                             "ops": ",".join(op.get('op', '?') for op in operations)})
+        return {"success": True, "version": version}, 200, {"ETag": f'"{version}"'}
+    except VersionConflict as e:
+        return version_conflict(e)
+    except PatchError as e:
+        return {"error": str(e)}, 400
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON"}, 400
+    except Exception as e:
+        log.exception("Error patching task file", extra={"file": filename})
+        return {"error": f"Failed to patch file: {e}"}, 500
+
+
+def format_event(event, data, event_id=None):
+    """A single Server-Sent Event"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    message += f"data: {json.dumps(data)}\n\n"
+    return message.encode()
+
+
+def try_fast_path(message):
+    """Handle simple add/move/delete commands locally; returns the reply or None to use Claude"""
+    # The chat sends recent history ahead of the newest message - only that one matters here
+    latest = message.rsplit('\nUser: ', 1)[-1] if '\nUser: ' in message else message
+    started = time.perf_counter()
+    try:
+        single_tasks, _ = task_store.read(SINGLE_FILE)
+        recurring_tasks, _ = task_store.read(RECURRING_FILE)
+        plan = CommandRouter().plan(latest, single_tasks, recurring_tasks)
+        if not plan.confident:
+            if plan.action:
+                log.info("Fast path escalating to Claude",
+                         extra={"confidence": round(plan.confidence, 2), "reason": plan.reason or 'low confidence'})
+            return None
+        for filename, operations in plan.patches:
+            content, version, base_version = task_store.patch(filename, operations)
+            task_file_saved(filename, content, version, 'claude', operations, base_version)
+    except (PatchError, ValueError, OSError) as e:
+        log.warning("Fast path failed, escalating to Claude", extra={"error": str(e)})
+        return None
+    log.info("Fast path handled request",
+             extra={"action": plan.action, "ms": round((time.perf_counter() - started) * 1000, 1)})
+    return plan.reply
+
+
+def claude_reply(output, exit_code):
+    """The reply for a finished claude run - an error reply (never cached) if the CLI failed"""
+    if exit_code != 0:
+        return f"{CLAUDE_ERROR_REPLY}: {output.strip() or f'claude exited with status {exit_code}'}"
+    return output.strip()
+
+
+def claude_request_prompt(user_message):
+    """Today's date and the tasks the request is about, so Claude needn't read the files"""
+    return PromptBuilder().build(
+        user_message, task_store.read(SINGLE_FILE)[0], task_store.read(RECURRING_FILE)[0],
+        task_store.read(COMPLETIONS_FILE)[0])
+
+
+class ClaudeJob:
+    """A Claude request running in the background, with its output so far"""
+
+    def __init__(self, message):
+        self.id = uuid.uuid4().hex[:12]
+        self.message = message
+        self.status = "queued"  # queued -> running -> done | error
+        self.chunks = []
+        self.response = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.changed = threading.Condition()
+        self.watchers = []  # callbacks for waiters that can't block on the condition
+
+    def mark_running(self):
+        with self.changed:
+            self.status = "running"
+            self.started = time.time()
+            self._notify()
+
+    def add_output(self, chunk):
+        with self.changed:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, response, status="done"):
+        with self.changed:
+            self.response = response
+            self.status = status
+            self.finished = time.time()
+            self._notify()
+
+    def _notify(self):
+        self.changed.notify_all()
+        for watcher in self.watchers:
+            watcher()
+
+    def is_finished(self):
+        return self.status in ("done", "error")
+
+    def wait(self, timeout=None):
+        """Block until the job finishes"""
+        with self.changed:
+            return self.changed.wait_for(self.is_finished, timeout=timeout)
+
+    def wait_for_update(self, seen_chunks, timeout=15):
+        """Block until there are more than seen_chunks chunks or the job finishes"""
+        with self.changed:
+            self.changed.wait_for(
+                lambda: len(self.chunks) > seen_chunks or self.is_finished(),
+                timeout=timeout,
+            )
+
+    def to_dict(self, offset=0):
+        end = self.finished or time.time()
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "elapsed": round(end - self.created, 3),
+            "runTime": round(end - self.started, 3) if self.started else None,
+            "output": "".join(self.chunks[offset:]),
+            "offset": len(self.chunks),
+            "response": self.response,
+        }
+
+
+class ClaudeJobStore:
+    """Thread-safe registry of Claude jobs, pruned of old finished jobs"""
+
+    def __init__(self, ttl=JOB_TTL):
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def add(self, job):
+        with self.lock:
+            self.prune()
+            self.jobs[job.id] = job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def remove(self, job_id):
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.finished < cutoff:
+                del self.jobs[job_id]
+
+
+claude_jobs = ClaudeJobStore()
 
 class ScheduleAPIHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.schedule_dir = Path(__file__).parent
-        self.tasks_file = self.schedule_dir / "tasks.json"
-        super().__init__(*args, **kwargs)
+    schedule_dir = SCHEDULE_DIR
+    
+    def handle_one_request(self):
+        """Handle one request and record its route, status and latency"""
+        self.status = None
+        started = time.perf_counter()
+        try:
+            super().handle_one_request()
+        finally:
+            if self.status is not None:  # None: the connection closed without a request
+                route = route_label(urlparse(getattr(self, 'path', '')).path)
+                method = self.command or 'invalid'
+                http_requests.inc(method=method, route=route, status=self.status)
+                http_duration.observe(time.perf_counter() - started, method=method, route=route)
+    
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+    
+    def log_message(self, format, *args):
+        """Access log lines go to the debug log instead of stderr"""
+        log.debug(format % args, extra={"client": self.address_string()})
     
     def do_GET(self):
         """Handle GET requests"""
@@ -27,12 +688,79 @@ class ScheduleAPIHandler(BaseHTTPRequestHandler):
             message = query_params.get('message', [''])[0]
             
             if message:
-                response = self.process_claude_request(message)
-                self.send_json_response({"response": response})
+                self.handle_claude_message(message)
             else:
                 self.send_json_response({"error": "No message provided"})
+        elif parsed_path.path.startswith('/api/claude/jobs/'):
+            # /api/claude/jobs/<id> for status, /api/claude/jobs/<id>/stream for SSE
+            parts = parsed_path.path[len('/api/claude/jobs/'):].split('/')
+            job = claude_jobs.get(parts[0])
+            if not job:
+                self.send_json_response({"error": "Unknown job"}, status=404)
+            elif len(parts) == 1:
+                query_params = parse_qs(parsed_path.query)
+                offset = event_offset(query_params.get('offset', [''])[0])
+                if offset is None:
+                    self.send_json_response({"error": "offset must be a non-negative integer"}, status=400)
+                else:
+                    self.send_json_response(job.to_dict(offset))
+            elif parts[1:] == ['stream']:
+                self.stream_claude_job(job)
+            else:
+                self.send_error(404)
+        elif parsed_path.path == '/api/occurrences':
+            self.send_json_response(*occurrences_for(parse_qs(parsed_path.query)))
+        elif parsed_path.path == '/api/events':
+            self.stream_change_events()
+        elif parsed_path.path == '/api/conflicts':
+            self.send_json_response(*conflicts_for(parse_qs(parsed_path.query)))
+        elif parsed_path.path == '/api/free-slot':
+            self.send_json_response(*free_slot_for(parse_qs(parsed_path.query)))
+        elif parsed_path.path == '/api/analytics':
+            self.send_json_response(*analytics_for(parse_qs(parsed_path.query)))
+        elif parsed_path.path == '/api/metrics':
+            self.send_metrics()
+        elif parsed_path.path.startswith('/api/tasks/'):
+            self.send_json_response(*task_file_for(parsed_path.path[len('/api/tasks/'):]))
         else:
+            self.serve_static(parsed_path.path)
+    
+    def do_HEAD(self):
+        """Handle HEAD requests for static files"""
+        self.serve_static(urlparse(self.path).path, head_only=True)
+    
+    def serve_static(self, url_path, head_only=False):
+        """Serve the app's own files with ETags, precompressed bodies and 304s"""
+        name = static_files.resolve(url_path)
+        entry = static_files.get(name) if name else None
+        if not entry:
             self.send_error(404)
+            return
+        
+        encoding = entry.choose(self.headers.get('Accept-Encoding'))
+        if entry.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', entry.etags[encoding])
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+        
+        body = entry.bodies.get(encoding)
+        self.send_response(200)
+        for name, value in static_headers(entry, encoding, body).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if head_only:
+            return
+        
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            # Too big to keep in memory - let the kernel copy it to the socket
+            self.wfile.flush()
+            with open(entry.path, 'rb') as f:
+                self.connection.sendfile(f, count=entry.size)
     
     def do_POST(self):
         """Handle POST requests"""
@@ -41,306 +769,766 @@ class ScheduleAPIHandler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             
             try:
-                data = json.loads(post_data.decode('utf-8'))
+                data = parse_json(post_data)
                 message = data.get('message', '')
                 
                 if message:
-                    response = self.process_claude_request(message)
-                    self.send_json_response({"response": response})
+                    self.handle_claude_message(message)
                 else:
                     self.send_json_response({"error": "No message provided"})
             except json.JSONDecodeError:
                 self.send_json_response({"error": "Invalid JSON"})
-        elif self.path == '/api/save-tasks':
+        elif self.path == '/api/claude/jobs':
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             
             try:
-                data = json.loads(post_data.decode('utf-8'))
-                tasks = data.get('tasks', [])
-                source = data.get('source', 'user')  # Track who is making the change
-                
-                # Write tasks directly to file
-                self.tasks_file.write_text(json.dumps(tasks, indent=2))
-                self.send_json_response({"success": True, "message": "Tasks saved successfully", "source": source})
-                print(f"Saved {len(tasks)} tasks to file (source: {source})")
-                
-            except json.JSONDecodeError:
-                self.send_json_response({"error": "Invalid JSON"})
-            except Exception as e:
-                print(f"Error saving tasks: {e}")
-                self.send_json_response({"error": f"Failed to save tasks: {e}"})
-        elif self.path == '/api/save-file':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            
-            try:
-                data = json.loads(post_data.decode('utf-8'))
-                filename = data.get('filename', '')
-                content = data.get('content', [])
+                data = parse_json(post_data)
+                message = data.get('message', '')
                 
-                # Only allow saving specific task files
-                allowed_files = ['recurring-tasks.json', 'task-completions.json', 'single-tasks.json']
-                if filename in allowed_files:
-                    file_path = self.schedule_dir / filename
-                    file_path.write_text(json.dumps(content, indent=2))
-                    self.send_json_response({"success": True, "message": f"{filename} saved successfully"})
-                    print(f"Saved {filename}")
+                if message:
+                    self.start_claude_job(message)
                 else:
-                    self.send_json_response({"error": "Invalid filename"})
-                
+                    self.send_json_response({"error": "No message provided"})
             except json.JSONDecodeError:
                 self.send_json_response({"error": "Invalid JSON"})
-            except Exception as e:
-                print(f"Error saving file: {e}")
-                self.send_json_response({"error": f"Failed to save file: {e}"})
+        elif self.path == '/api/save-tasks':
+            self.send_json_response(*save_tasks(self.read_body()))
+        elif self.path == '/api/save-file':
+            self.send_json_response(*save_file(self.read_body(), if_match_version(self.headers.get('If-Match'))))
         else:
             self.send_error(404)
     
-    def process_claude_request(self, user_message):
-        """Process request through Claude terminal"""
-        print(f"Processing Claude request: {user_message}")
-        
+    def do_PATCH(self):
+        """Handle record-level edits to a task file"""
+        parsed_path = urlparse(self.path)
+        if not parsed_path.path.startswith('/api/tasks/'):
+            self.send_error(404)
+            return
+        self.send_json_response(*patch_file(parsed_path.path[len('/api/tasks/'):], self.read_body(),
+                                            if_match_version(self.headers.get('If-Match'))))
+    
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+    
+    def send_metrics(self):
+        """Counters, gauges and histograms in Prometheus text format"""
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def handle_claude_message(self, message):
+        """Run a Claude request on the worker pool and send the result"""
+        reply = try_fast_path(message)
+        if reply:
+            self.send_json_response({"response": reply})
+            return
         try:
-            # Call Claude directly with context
-            initial_context = f"""You are integrated into a Schedule app with a new efficient file structure:
-- {self.schedule_dir}/recurring-tasks.json - Stores recurring task templates
-- {self.schedule_dir}/single-tasks.json - Stores one-time tasks  
-- {self.schedule_dir}/task-completions.json - Stores completion states for recurring tasks
+            job = self.submit_claude_job(message)
+        except ClaudeBusyError as e:
+            log.warning("Rejecting Claude request", extra={"reason": str(e)})
+            self.send_claude_busy()
+            return
+        job.wait()
+        self.send_json_response({"response": job.response})
 
-DO NOT edit tasks.json anymore - it's deprecated. Use the new files above.
+    def start_claude_job(self, message):
+        """Queue a Claude request as a background job and return its id immediately"""
+        reply = try_fast_path(message)
+        if reply:
+            # Answered locally - hand back an already finished job
+            job = ClaudeJob(message)
+            job.add_output(reply)
+            job.finish(reply)
+            claude_jobs.add(job)
+            self.send_json_response(job.to_dict(), status=202)
+            return
+        try:
+            job = self.submit_claude_job(message)
+        except ClaudeBusyError as e:
+            log.warning("Rejecting Claude job", extra={"reason": str(e)})
+            self.send_claude_busy()
+            return
+        self.send_json_response(job.to_dict(), status=202)
 
-Single task format: {{"id": "claude_timestamp", "title": "Task Name", "description": "Brief markdown description", "type": "work|exercise|meal|meeting|personal|health|social|other", "date": "YYYY-MM-DD", "completed": false, "startTime": "HH:MM", "endTime": "HH:MM"}}
+    def submit_claude_job(self, message):
+        """Job answering a message: a cached answer, the same request already running, or a new run"""
+        versions = task_store.versions()
+        key = response_cache.key(message, versions)
+        cached = response_cache.get(key)
+        if cached is not None:
+            job = ClaudeJob(message)
+            job.add_output(cached)
+            job.finish(cached)
+            claude_jobs.add(job)
+            log.info("Answered Claude request from cache", extra={"job": job.id})
+            return job
 
-Recurring task format: {{"id": "claude_timestamp", "title": "Task Name", "description": "...", "type": "...", "startTime": "HH:MM", "endTime": "HH:MM", "recurrence": {{"type": "daily|weekly|monthly", "interval": 1, "frequency": "days", "startDate": "YYYY-MM-DD", "end": "never"}}}}
+        def start():
+            job = ClaudeJob(message)
 
-Current date: 2025-06-27
+            def run_job():
+                job.mark_running()
+                try:
+                    reply = self.process_claude_request(message, on_output=job.add_output)
+                except Exception as e:
+                    response_cache.finish(key)
+                    job.finish(f"{CLAUDE_ERROR_REPLY}: {e}", status="error")
+                    return
+                # Only answers that left the task files alone are safe to replay
+                if (not reply.startswith((CLAUDE_TIMEOUT_REPLY, CLAUDE_ERROR_REPLY))
+                        and task_store.versions() == versions and not task_store.changed_on_disk()):
+                    response_cache.put(key, reply)
+                response_cache.finish(key)
+                job.finish(reply)
 
-User request: {user_message}
+            claude_jobs.add(job)
+            try:
+                claude_pool.submit(run_job)
+            except ClaudeBusyError:
+                claude_jobs.remove(job.id)
+                raise
+            log.info("Queued Claude job", extra={"job": job.id, "queue_depth": claude_pool.queue_depth()})
+            return job
 
-Execute now and respond briefly with what you did:"""
+        job, started = response_cache.single_flight(key, start)
+        if not started:
+            log.info("Joined Claude job already running for the same request", extra={"job": job.id})
+        return job
 
-            # Call Claude directly with context using communicate()
-            process = subprocess.Popen([
-                'claude', '--dangerously-skip-permissions'
-            ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, 
-               cwd=self.schedule_dir.parent)
-            
+    def send_claude_busy(self):
+        self.send_json_response(
+            {"error": "Claude is busy, try again shortly"},
+            status=503,
+            headers={"Retry-After": "10"},
+        )
+
+    def stream_claude_job(self, job):
+        """Stream a job's output as Server-Sent Events until it finishes"""
+        # EventSource resends the last event id on reconnect so we can resume
+        sent = event_offset(self.headers.get('Last-Event-ID'))
+        if sent is None:
+            self.send_json_response({"error": "Invalid Last-Event-ID"}, status=400)
+            return
+        self.send_response(200)
+        for name, value in SSE_HEADERS.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        last_status = None
+        try:
+            while True:
+                if job.status != last_status:
+                    last_status = job.status
+                    self.send_event('status', job.to_dict(offset=sent))
+                chunks = job.chunks[sent:]
+                if chunks:
+                    sent += len(chunks)
+                    self.send_event('output', {"text": "".join(chunks)}, event_id=sent)
+                if job.is_finished() and sent >= len(job.chunks):
+                    self.send_event('done', job.to_dict(offset=sent))
+                    break
+                job.wait_for_update(sent)
+                if len(job.chunks) == sent and job.status == last_status:
+                    # Keep idle proxies and mobile radios from dropping the stream
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away - the job keeps running and can be polled later
+            pass
+
+    def stream_change_events(self):
+        """Push task file changes to the browser as Server-Sent Events"""
+        last_event_id = event_offset(self.headers.get('Last-Event-ID'))
+        if last_event_id is None:
+            self.send_json_response({"error": "Invalid Last-Event-ID"}, status=400)
+            return
+        self.send_response(200)
+        for name, value in SSE_HEADERS.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        subscriber = change_events.subscribe(last_event_id)
+        try:
+            self.send_event('hello', {"versions": change_events.versions})
+            while True:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                self.send_event('change', event, event_id=event["id"])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            change_events.unsubscribe(subscriber)
+
+    def send_event(self, event, data, event_id=None):
+        """Write a single Server-Sent Event"""
+        self.wfile.write(format_event(event, data, event_id))
+        self.wfile.flush()
+
+    def process_claude_request(self, user_message, on_output=None):
+        """Process request through Claude terminal"""
+        log.info("Processing Claude request", extra={"text": user_message})
+        
+        request_prompt = claude_request_prompt(user_message)
+
+        if USE_CLAUDE_SESSIONS:
+            # Warm session already has the schedule context - send only the request
+            sessions = get_claude_sessions(self.build_claude_context(), self.schedule_dir.parent)
             try:
-                # Send the context and get the output
-                full_output, _ = process.communicate(input=initial_context, timeout=120)
-                
-                print(f"Claude output: {full_output}")
-                return full_output.strip()
-                
-            except subprocess.TimeoutExpired:
-                process.kill()
-                return "Claude request timed out"
-                
+                return sessions.ask(request_prompt, on_output=on_output)
+            except TimeoutError:
+                return CLAUDE_TIMEOUT_REPLY
+            except ClaudeReplyError as e:
+                return f"{CLAUDE_ERROR_REPLY}: {e}"
+            except (ClaudeSessionError, OSError) as e:
+                log.warning("Claude session unavailable, spawning one-shot process", extra={"error": str(e)})
+
+        try:
+            return self.run_claude(self.build_claude_context() + "\n\n" + request_prompt, on_output=on_output)
         except Exception as e:
-            print(f"Error calling Claude: {e}")
-            return f"Error communicating with Claude: {e}"
-    
-    def build_claude_context(self, user_message):
-        """Build context prompt for Claude"""
-        return self.process_claude_request(user_message)
+            log.exception("Error calling Claude")
+            return f"{CLAUDE_ERROR_REPLY}: {e}"
 
-    def simulate_claude_response(self, user_message):
-        """Actually process and execute the user's request"""
-        import time
-        
-        # Load current tasks
+    def run_claude(self, prompt, on_output=None, timeout=120):
+        """Run the claude CLI, passing each line of stdout to on_output as it arrives"""
+        process = subprocess.Popen([
+            'claude', '--dangerously-skip-permissions'
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+           cwd=self.schedule_dir.parent)
+        claude_spawns.inc(mode='oneshot')
+        started = time.perf_counter()
+
+        # Kill the process from a timer so the line-by-line read below can't hang
+        timed_out = threading.Event()
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.start()
+
+        output = []
         try:
-            tasks = json.loads(self.tasks_file.read_text()) if self.tasks_file.exists() else []
-        except:
-            tasks = []
-        
-        message_lower = user_message.lower()
-        
-        # ADD COMMANDS
-        if "add" in message_lower:
-            task_id = f"claude_{int(time.time())}"
-            
-            # Parse what to add
-            if "coffee" in message_lower:
-                title = "Coffee ☕"
-                task_type = "personal"
-                start_time = "07:30"
-                end_time = "08:00"
-            elif "lunch" in message_lower:
-                title = "Lunch"
-                task_type = "meal"
-                start_time = "12:00"
-                end_time = "13:00"
-            elif "dinner" in message_lower:
-                title = "Dinner"
-                task_type = "meal"
-                start_time = "18:00"
-                end_time = "19:00"
-            elif "workout" in message_lower:
-                title = "Workout 💪"
-                task_type = "exercise"
-                start_time = "07:00"
-                end_time = "08:00"
-            elif "meeting" in message_lower:
-                title = "Meeting"
-                task_type = "meeting"
-                start_time = "10:00"
-                end_time = "11:00"
-            else:
-                # Generic task
-                words = user_message.split()
-                if len(words) > 1:
-                    title = " ".join(words[1:]).title()
-                else:
-                    title = "New Task"
-                task_type = "other"
-                start_time = None
-                end_time = None
-            
-            # Parse time if specified
-            if "at" in message_lower:
-                words = user_message.split()
-                for i, word in enumerate(words):
-                    if word.lower() == "at" and i + 1 < len(words):
-                        time_str = words[i + 1].replace("pm", "").replace("am", "")
-                        try:
-                            hour = int(time_str)
-                            if "pm" in words[i + 1] and hour != 12:
-                                hour += 12
-                            elif "am" in words[i + 1] and hour == 12:
-                                hour = 0
-                            start_time = f"{hour:02d}:00"
-                            end_time = f"{(hour + 1) % 24:02d}:00"
-                        except ValueError:
-                            pass
-            
-            # Parse date
-            date = "2025-06-26"  # today
-            if "tomorrow" in message_lower:
-                date = "2025-06-27"
-            elif "27" in user_message or "june 27" in message_lower:
-                date = "2025-06-27"
-            elif "28" in user_message or "june 28" in message_lower:
-                date = "2025-06-28"
-            elif "29" in user_message or "june 29" in message_lower:
-                date = "2025-06-29"
-            
-            # Create task
-            task = {
-                "id": task_id,
-                "title": title,
-                "type": task_type,
-                "date": date,
-                "completed": False
-            }
-            
-            if start_time:
-                task["startTime"] = start_time
-            if end_time:
-                task["endTime"] = end_time
-                
-            tasks.append(task)
-            self.tasks_file.write_text(json.dumps(tasks, indent=2))
-            
-            date_text = "today" if date == "2025-06-26" else ("tomorrow" if date == "2025-06-27" else f"on {date}")
-            time_text = f" at {start_time}" if start_time else ""
-            return f"Added '{title}' {date_text}{time_text}!"
-        
-        # MOVE COMMANDS
-        elif "move" in message_lower:
-            # Find task to move
-            task_to_move = None
-            for task in tasks:
-                if any(word in task["title"].lower() for word in ["coffee", "lunch", "dinner", "workout"]):
-                    if any(word in message_lower for word in task["title"].lower().split()):
-                        task_to_move = task
-                        break
-            
-            if task_to_move:
-                # Parse new date/time
-                if "tomorrow" in message_lower:
-                    task_to_move["date"] = "2025-06-27"
-                elif "27" in user_message:
-                    task_to_move["date"] = "2025-06-27"
-                elif "28" in user_message:
-                    task_to_move["date"] = "2025-06-28"
-                
-                if "at" in message_lower:
-                    words = user_message.split()
-                    for i, word in enumerate(words):
-                        if word.lower() == "at" and i + 1 < len(words):
-                            time_str = words[i + 1].replace("pm", "").replace("am", "")
-                            try:
-                                hour = int(time_str)
-                                if "pm" in words[i + 1] and hour != 12:
-                                    hour += 12
-                                task_to_move["startTime"] = f"{hour:02d}:00"
-                            except ValueError:
-                                pass
-                
-                self.tasks_file.write_text(json.dumps(tasks, indent=2))
-                return f"Moved '{task_to_move['title']}' to {task_to_move['date']}!"
-            else:
-                return "Couldn't find that task to move."
-        
-        # DELETE COMMANDS
-        elif "delete" in message_lower or "remove" in message_lower:
-            original_count = len(tasks)
-            
-            if "test" in message_lower:
-                tasks = [t for t in tasks if "test" not in t["title"].lower()]
-            elif "coffee" in message_lower:
-                tasks = [t for t in tasks if "coffee" not in t["title"].lower()]
-            else:
-                # Delete by partial title match
-                words = user_message.split()
-                for word in words:
-                    if word.lower() not in ["delete", "remove", "the"]:
-                        tasks = [t for t in tasks if word.lower() not in t["title"].lower()]
-            
-            deleted_count = original_count - len(tasks)
-            if deleted_count > 0:
-                self.tasks_file.write_text(json.dumps(tasks, indent=2))
-                return f"Deleted {deleted_count} task(s)!"
-            else:
-                return "No matching tasks found to delete."
-        
-        # TEST COMMAND
-        elif "test" in message_lower:
-            return "Claude integration is working! Try: 'add coffee tomorrow', 'move workout to 6pm', 'delete test task'"
-        
-        else:
-            return f"I don't understand '{user_message}'. Try: 'add [item] [date] [time]', 'move [item] to [date/time]', or 'delete [item]'"
+            process.stdin.write(prompt)
+            process.stdin.close()
+            for line in process.stdout:
+                output.append(line)
+                if on_output:
+                    on_output(line)
+            process.wait()
+        finally:
+            timer.cancel()
+            outcome = 'timeout' if timed_out.is_set() else 'ok' if process.returncode == 0 else 'error'
+            claude_run_seconds.observe(time.perf_counter() - started, mode='oneshot', outcome=outcome)
+
+        if timed_out.is_set():
+            claude_timeouts.inc(mode='oneshot')
+            return CLAUDE_TIMEOUT_REPLY
+        full_output = "".join(output)
+        log.info("Claude finished", extra={"exit_code": process.returncode, "output_chars": len(full_output)})
+        log.debug("Claude output", extra={"output": full_output})
+        return claude_reply(full_output, process.returncode)
     
-    def send_json_response(self, data):
+    def build_claude_context(self):
+        """Standing instructions for Claude; the date and tasks come with each request"""
+        return claude_instructions(self.schedule_dir)
+
+    def send_json_response(self, data, status=200, headers=None):
         """Send JSON response with CORS headers"""
-        self.send_response(200)
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in {**(headers or {}), **CORS_HEADERS}.items():
+            self.send_header(name, value)
         self.end_headers()
         
-        response = json.dumps(data)
-        self.wfile.write(response.encode())
+        self.wfile.write(json_body(data))
     
     def do_OPTIONS(self):
         """Handle preflight CORS requests"""
         self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in PREFLIGHT_HEADERS.items():
+            self.send_header(name, value)
         self.end_headers()
 
 def run_api_server(port=8001, host='0.0.0.0'):
     """Run the API server"""
     server_address = (host, port)
-    httpd = HTTPServer(server_address, ScheduleAPIHandler)
-    print(f"Claude API server running on:")
-    print(f"  Local: http://localhost:{port}")
-    print(f"  Network: http://10.0.0.43:{port}")
-    httpd.serve_forever()
+    # One thread per connection so saves and CORS preflights never wait
+    # behind a Claude run; Claude calls themselves go through claude_pool
+    httpd = ThreadingHTTPServer(server_address, ScheduleAPIHandler)
+    httpd.daemon_threads = True
+    log.info("Schedule app and Claude API server running",
+             extra={"local": f"http://localhost:{port}", "network": f"http://10.0.0.43:{port}",
+                    "claude_workers": claude_pool.workers, "queue_limit": claude_pool.max_queue})
+
+    threading.Thread(target=watch_task_files, args=(SCHEDULE_DIR,), daemon=True).start()
+    # Exit through the finally below on `kill` too, so pending task edits get written
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    def check_sessions():
+        while True:
+            time.sleep(60)
+            if claude_sessions:
+                claude_sessions.health_check()
+    threading.Thread(target=check_sessions, daemon=True).start()
+
+    try:
+        httpd.serve_forever()
+    finally:
+        task_store.close()
+        if claude_sessions:
+            claude_sessions.close()
+
+
+
+class AsyncClaudeLimiter:
+    """Semaphore on concurrent claude processes for the asyncio server
+
+    Same limits and ClaudeBusyError as ClaudeWorkerPool, but a queued run
+    waits on the semaphore instead of holding a thread.
+    """
+
+    def __init__(self, workers=CLAUDE_WORKERS, max_queue=CLAUDE_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(workers)
+        self.pending = 0  # running + queued
+
+    def submit(self, fn, *args):
+        """Task running fn(*args) once a slot is free, raising ClaudeBusyError if the queue is full"""
+        if self.pending >= self.workers + self.max_queue:
+            raise ClaudeBusyError(f"{self.pending} Claude requests already pending")
+        self.pending += 1
+        task = asyncio.ensure_future(self._run(fn, *args))
+        task.add_done_callback(self._release)
+        return task
+
+    async def _run(self, fn, *args):
+        async with self.semaphore:
+            return await fn(*args)
+
+    def _release(self, _task):
+        self.pending -= 1
+
+    def queue_depth(self):
+        """Number of requests waiting for a free slot"""
+        return max(0, self.pending - self.workers)
+
+
+async def run_claude_async(prompt, on_output=None, timeout=120):
+    """run_claude on the event loop - the process is killed if the calling task is cancelled"""
+    process = await asyncio.create_subprocess_exec(
+        'claude', '--dangerously-skip-permissions',
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        cwd=SCHEDULE_DIR.parent, limit=1024 * 1024)
+    claude_spawns.inc(mode='async')
+    started = time.perf_counter()
+    outcome = 'error'
+
+    output = []
+    async def communicate():
+        process.stdin.write(prompt.encode())
+        await process.stdin.drain()
+        process.stdin.close()
+        async for line in process.stdout:
+            line = line.decode('utf-8', errors='replace')
+            output.append(line)
+            if on_output:
+                on_output(line)
+        await process.wait()
+
+    try:
+        await asyncio.wait_for(communicate(), timeout)
+        outcome = 'ok' if process.returncode == 0 else 'error'
+    except asyncio.TimeoutError:
+        outcome = 'timeout'
+        claude_timeouts.inc(mode='async')
+        return CLAUDE_TIMEOUT_REPLY
+    except asyncio.CancelledError:
+        outcome = 'cancelled'
+        raise
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        claude_run_seconds.observe(time.perf_counter() - started, mode='async', outcome=outcome)
+
+    full_output = "".join(output)
+    log.info("Claude finished", extra={"exit_code": process.returncode, "output_chars": len(full_output)})
+    log.debug("Claude output", extra={"output": full_output})
+    return claude_reply(full_output, process.returncode)
+
+
+class AsyncClaudeRun:
+    """A Claude request on the asyncio server, shared by identical requests
+
+    The job records its output for /api/claude/jobs. The run is cancelled -
+    killing its claude process - once every /api/claude client waiting on it
+    has disconnected, unless it was started as a background job.
+    """
+
+    def __init__(self, job, task):
+        self.job = job
+        self.task = task
+        self.waiters = 0
+        self.background = False
+
+    @classmethod
+    def start(cls, message, key, versions):
+        run = cls(ClaudeJob(message), None)
+        run.task = claude_pool.submit(run.answer, key, versions)
+        run.task.add_done_callback(lambda task: run.finished(task, key))
+        claude_jobs.add(run.job)
+        log.info("Queued Claude job", extra={"job": run.job.id, "queue_depth": claude_pool.queue_depth()})
+        return run
+
+    @classmethod
+    def answered(cls, message, reply):
+        """An already finished run, for answers from the fast path or the cache"""
+        job = ClaudeJob(message)
+        job.add_output(reply)
+        job.finish(reply)
+        claude_jobs.add(job)
+        task = asyncio.get_running_loop().create_future()
+        task.set_result(reply)
+        return cls(job, task)
+
+    async def answer(self, key, versions):
+        job = self.job
+        job.mark_running()
+        log.info("Processing Claude request", extra={"text": job.message, "job": job.id})
+        try:
+            request_prompt = await asyncio.to_thread(claude_request_prompt, job.message)
+            reply = await run_claude_async(claude_instructions(SCHEDULE_DIR) + "\n\n" + request_prompt,
+                                           on_output=job.add_output)
+        except Exception as e:
+            log.exception("Error calling Claude")
+            job.finish(f"{CLAUDE_ERROR_REPLY}: {e}", status="error")
+            return job.response
+        # Only answers that left the task files alone are safe to replay
+        if (not reply.startswith((CLAUDE_TIMEOUT_REPLY, CLAUDE_ERROR_REPLY))
+                and task_store.versions() == versions and not task_store.changed_on_disk()):
+            response_cache.put(key, reply)
+        job.finish(reply)
+        return reply
+
+    def finished(self, task, key):
+        response_cache.finish(key)
+        if task.cancelled():
+            self.job.finish(CLAUDE_CANCELLED_REPLY, status="error")
+        elif task.exception():
+            # answer() failed outside its own error handling - don't leave the job running
+            self.job.finish(f"{CLAUDE_ERROR_REPLY}: {task.exception()}", status="error")
+
+    async def wait(self, request):
+        """The reply, or None if request's client disconnected first"""
+        self.waiters += 1
+        disconnected = asyncio.ensure_future(request.wait_disconnected())
+        try:
+            await asyncio.wait({self.task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
+            self.waiters -= 1
+        if self.task.done():
+            return self.job.response if self.task.cancelled() or self.task.exception() else self.task.result()
+        if not self.waiters and not self.background:
+            log.info("Cancelling Claude request, client disconnected", extra={"job": self.job.id})
+            self.task.cancel()
+        return None
+
+
+class AsyncSubscriber:
+    """ChangeBroadcaster subscriber handing events to a coroutine on the event loop"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+class AsyncScheduleAPI:
+    """The ScheduleAPIHandler endpoints for the asyncio server
+
+    File and CPU work goes to worker threads so the event loop only ever
+    waits on sockets and claude processes.
+    """
+
+    computed = {
+        '/api/occurrences': occurrences_for,
+        '/api/conflicts': conflicts_for,
+        '/api/free-slot': free_slot_for,
+        '/api/analytics': analytics_for,
+    }
+
+    async def __call__(self, request):
+        """Handle one request and record its route, status and latency"""
+        started = time.perf_counter()
+        try:
+            await self.dispatch(request)
+        finally:
+            if request.status is not None:  # None: the client left before a response was started
+                route = route_label(request.path)
+                http_requests.inc(method=request.method, route=route, status=request.status)
+                http_duration.observe(time.perf_counter() - started, method=request.method, route=route)
+
+    async def dispatch(self, request):
+        if request.method == 'OPTIONS':
+            await request.respond(200, headers=PREFLIGHT_HEADERS)
+        elif request.method == 'HEAD':
+            await self.serve_static(request, head_only=True)
+        elif request.method == 'GET':
+            await self.do_GET(request)
+        elif request.method == 'POST':
+            await self.do_POST(request)
+        elif request.method == 'PATCH' and request.path.startswith('/api/tasks/'):
+            await self.send_json(request, *await asyncio.to_thread(
+                patch_file, request.path[len('/api/tasks/'):], request.body,
+                if_match_version(request.header('If-Match'))))
+        elif request.method == 'PATCH':
+            await self.send_error(request, 404)
+        else:
+            await self.send_error(request, 501)
+
+    async def do_GET(self, request):
+        path = request.path
+        if path == '/api/claude':
+            message = request.query.get('message', [''])[0]
+            if message:
+                await self.handle_claude_message(request, message)
+            else:
+                await self.send_json(request, {"error": "No message provided"})
+        elif path.startswith('/api/claude/jobs/'):
+            # /api/claude/jobs/<id> for status, /api/claude/jobs/<id>/stream for SSE
+            parts = path[len('/api/claude/jobs/'):].split('/')
+            job = claude_jobs.get(parts[0])
+            if not job:
+                await self.send_json(request, {"error": "Unknown job"}, status=404)
+            elif len(parts) == 1:
+                offset = event_offset(request.query.get('offset', [''])[0])
+                if offset is None:
+                    await self.send_json(request, {"error": "offset must be a non-negative integer"}, status=400)
+                else:
+                    await self.send_json(request, job.to_dict(offset))
+            elif parts[1:] == ['stream']:
+                await self.stream_claude_job(request, job)
+            else:
+                await self.send_error(request, 404)
+        elif path in self.computed:
+            await self.send_json(request, *await asyncio.to_thread(self.computed[path], request.query))
+        elif path == '/api/events':
+            await self.stream_change_events(request)
+        elif path == '/api/metrics':
+            await request.respond(200, render().encode(), {'Content-type': METRICS_CONTENT_TYPE})
+        elif path.startswith('/api/tasks/'):
+            await self.send_json(request, *task_file_for(path[len('/api/tasks/'):]))
+        else:
+            await self.serve_static(request)
+
+    async def do_POST(self, request):
+        path = request.path
+        if path in ('/api/claude', '/api/claude/jobs'):
+            try:
+                message = parse_json(request.body).get('message', '')
+            except json.JSONDecodeError:
+                await self.send_json(request, {"error": "Invalid JSON"})
+                return
+            if not message:
+                await self.send_json(request, {"error": "No message provided"})
+            elif path == '/api/claude':
+                await self.handle_claude_message(request, message)
+            else:
+                await self.start_claude_job(request, message)
+        elif path == '/api/save-tasks':
+            await self.send_json(request, *await asyncio.to_thread(save_tasks, request.body))
+        elif path == '/api/save-file':
+            await self.send_json(request, *await asyncio.to_thread(
+                save_file, request.body, if_match_version(request.header('If-Match'))))
+        else:
+            await self.send_error(request, 404)
+
+    async def serve_static(self, request, head_only=False):
+        """Serve the app's own files with ETags, precompressed bodies and 304s"""
+        name = static_files.resolve(request.path)
+        entry = static_files.get(name) if name else None
+        if not entry:
+            await self.send_error(request, 404)
+            return
+
+        encoding = entry.choose(request.header('Accept-Encoding'))
+        if entry.matches(request.header('If-None-Match')):
+            await request.respond(304, headers={'ETag': entry.etags[encoding], 'Cache-Control': 'no-cache',
+                                                'Vary': 'Accept-Encoding'})
+            return
+
+        body = entry.bodies.get(encoding)
+        headers = static_headers(entry, encoding, body)
+        if body is not None:
+            await request.respond(200, body, headers, head_only=head_only)
+            return
+        # Too big to keep in memory - let the kernel copy it to the socket
+        await request.respond(200, headers=headers, head_only=True)
+        if not head_only:
+            with open(entry.path, 'rb') as f:
+                await request.sendfile(f, entry.size)
+
+    def claude_run(self, message):
+        """A cached answer, the same request already running, or a new run"""
+        versions = task_store.versions()
+        key = response_cache.key(message, versions)
+        cached = response_cache.get(key)
+        if cached is not None:
+            run = AsyncClaudeRun.answered(message, cached)
+            log.info("Answered Claude request from cache", extra={"job": run.job.id})
+            return run
+        run, started = response_cache.single_flight(key, lambda: AsyncClaudeRun.start(message, key, versions))
+        if not started:
+            log.info("Joined Claude job already running for the same request", extra={"job": run.job.id})
+        return run
+
+    async def handle_claude_message(self, request, message):
+        """Answer a Claude request, giving up on it if the client disconnects"""
+        reply = await asyncio.to_thread(try_fast_path, message)
+        if reply:
+            await self.send_json(request, {"response": reply})
+            return
+        try:
+            run = self.claude_run(message)
+        except ClaudeBusyError as e:
+            log.warning("Rejecting Claude request", extra={"reason": str(e)})
+            await self.send_claude_busy(request)
+            return
+        reply = await run.wait(request)
+        if reply is not None:
+            await self.send_json(request, {"response": reply})
+
+    async def start_claude_job(self, request, message):
+        """Queue a Claude request as a background job and return its id immediately"""
+        reply = await asyncio.to_thread(try_fast_path, message)
+        try:
+            run = AsyncClaudeRun.answered(message, reply) if reply else self.claude_run(message)
+        except ClaudeBusyError as e:
+            log.warning("Rejecting Claude job", extra={"reason": str(e)})
+            await self.send_claude_busy(request)
+            return
+        run.background = True  # the client polls or streams it, possibly after reconnecting
+        await self.send_json(request, run.job.to_dict(), status=202)
+
+    async def send_claude_busy(self, request):
+        await self.send_json(request, {"error": "Claude is busy, try again shortly"}, status=503,
+                             headers={"Retry-After": "10"})
+
+    async def stream_claude_job(self, request, job):
+        """Stream a job's output as Server-Sent Events until it finishes"""
+        # EventSource resends the last event id on reconnect so we can resume
+        sent = event_offset(request.header('Last-Event-ID'))
+        if sent is None:
+            await self.send_json(request, {"error": "Invalid Last-Event-ID"}, status=400)
+            return
+        await request.start_stream(200, SSE_HEADERS)
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        def watcher():
+            loop.call_soon_threadsafe(changed.set)
+        with job.changed:
+            job.watchers.append(watcher)
+
+        last_status = None
+        try:
+            while not request.disconnected():
+                changed.clear()
+                if job.status != last_status:
+                    last_status = job.status
+                    await request.write(format_event('status', job.to_dict(offset=sent)))
+                chunks = job.chunks[sent:]
+                if chunks:
+                    sent += len(chunks)
+                    await request.write(format_event('output', {"text": "".join(chunks)}, event_id=sent))
+                if job.is_finished() and sent >= len(job.chunks):
+                    await request.write(format_event('done', job.to_dict(offset=sent)))
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), 15)
+                except asyncio.TimeoutError:
+                    # Keep idle proxies and mobile radios from dropping the stream
+                    await request.write(b": keep-alive\n\n")
+        except ConnectionError:
+            pass  # client went away - the job keeps running and can be polled later
+        finally:
+            with job.changed:
+                job.watchers.remove(watcher)
+
+    async def stream_change_events(self, request):
+        """Push task file changes to the browser as Server-Sent Events"""
+        last_event_id = event_offset(request.header('Last-Event-ID'))
+        if last_event_id is None:
+            await self.send_json(request, {"error": "Invalid Last-Event-ID"}, status=400)
+            return
+        await request.start_stream(200, SSE_HEADERS)
+        subscriber = change_events.subscribe(last_event_id, AsyncSubscriber())
+        try:
+            await request.write(format_event('hello', {"versions": change_events.versions}))
+            while not request.disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), 15)
+                except asyncio.TimeoutError:
+                    await request.write(b": keep-alive\n\n")
+                    continue
+                await request.write(format_event('change', event, event_id=event["id"]))
+        except ConnectionError:
+            pass
+        finally:
+            change_events.unsubscribe(subscriber)
+
+    async def send_json(self, request, data, status=200, headers=None):
+        """Send JSON response with CORS headers"""
+        await request.respond(status, json_body(data),
+                              {'Content-type': 'application/json', **(headers or {}), **CORS_HEADERS})
+
+    async def send_error(self, request, status):
+        await request.respond(status, HTTPStatus(status).phrase.encode(), {'Content-type': 'text/plain'})
+
+
+def run_async_server(port=8001, host='0.0.0.0'):
+    """Run the API server on asyncio
+
+    One event loop serves every connection, so idle keep-alive and SSE
+    clients cost a coroutine each, and a Claude request whose client
+    disconnects is cancelled along with its claude process.
+    """
+    async def serve_until_stopped():
+        global claude_pool
+        claude_pool = AsyncClaudeLimiter()
+        server = await async_http.serve(AsyncScheduleAPI(), host, port)
+        log.info("Schedule app and Claude API server running on asyncio",
+                 extra={"local": f"http://localhost:{port}", "network": f"http://10.0.0.43:{port}",
+                        "claude_workers": claude_pool.workers, "queue_limit": claude_pool.max_queue})
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Exit through the finally below on `kill` too, so pending task edits get written
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+        # Open connections and Claude runs are cancelled by asyncio.run on the way out
+        server.close()
+
+    threading.Thread(target=watch_task_files, args=(SCHEDULE_DIR,), daemon=True).start()
+    try:
+        asyncio.run(serve_until_stopped())
+    finally:
+        task_store.close()
 
 if __name__ == "__main__":
-    run_api_server()
\ No newline at end of file
+    configure_logging()
+    port = int(os.environ.get("PORT", "8001"))
+    if SERVER_MODE == "async":
+        run_async_server(port)
+    else:
+        run_api_server(port)
\ No newline at end of file
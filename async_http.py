@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Async HTTP - A small HTTP/1.1 server on asyncio streams
+
+Just enough HTTP for the API's asyncio serving mode: keep-alive
+connections, Content-Length request bodies (with Expect: 100-continue),
+and streamed responses for Server-Sent Events. An idle keep-alive
+connection is one suspended coroutine and a socket, so thousands of them
+cost very little.
+
+Each request goes to an async handler:
+
+    async def handle(request):
+        await request.respond(200, b'{}', {'Content-type': 'application/json'})
+
+    server = await serve(handle, '0.0.0.0', 8001)
+
+A handler doing long work can await request.wait_disconnected() to learn
+that the client went away.
+"""
+import asyncio
+import logging
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 75
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 128 * 1024 * 1024
+DISCONNECT_POLL_INTERVAL = 0.25
+
+log = logging.getLogger(__name__)
+
+
+class BadRequest(Exception):
+    """A request that can't be parsed - answered with status and the connection closed"""
+
+    def __init__(self, status, message=""):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+class Request:
+    """One parsed request and the means to answer it"""
+
+    def __init__(self, method, target, version, headers, reader, writer):
+        self.method = method
+        self.target = target
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = parse_qs(url.query)
+        self.version = version
+        self.headers = headers  # lower-cased names
+        self.body = b""
+        self.reader = reader
+        self.writer = writer
+        self.status = None  # set once a response has been started
+        connection = headers.get('connection', '').lower()
+        self.keep_alive = ('close' not in connection if version == 'HTTP/1.1'
+                           else 'keep-alive' in connection)
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def disconnected(self):
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    async def wait_disconnected(self):
+        """Return once the client has closed the connection"""
+        # The stream sees the client's FIN without anyone reading, so polling is enough
+        while not self.disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    def _head(self, status, headers):
+        self.status = status
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Date: {formatdate(usegmt=True)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if self.keep_alive else 'close'}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+    async def respond(self, status, body=b"", headers=None, head_only=False):
+        """Send a complete response"""
+        headers = dict(headers or {})
+        if status not in (204, 304):
+            headers.setdefault('Content-Length', str(len(body)))
+        self.writer.write(self._head(status, headers) + (b"" if head_only else body))
+        await self.writer.drain()
+
+    async def sendfile(self, file, count):
+        """Send count bytes of an open file after respond() sent the headers"""
+        await asyncio.get_running_loop().sendfile(self.writer.transport, file, 0, count)
+
+    async def start_stream(self, status, headers=None):
+        """Send the headers of a response whose body runs until the connection closes"""
+        self.keep_alive = False
+        self.writer.write(self._head(status, dict(headers or {})))
+        await self.writer.drain()
+
+    async def write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+async def _read_request(reader, writer):
+    """The next request on a connection, or None once the client closes it"""
+    line = await reader.readline()
+    while line in (b"\r\n", b"\n"):
+        line = await reader.readline()  # stray newlines between requests are allowed
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise BadRequest(400)
+    method, target, version = parts
+
+    headers, size = {}, 0
+    while True:
+        line = await reader.readline()
+        size += len(line)
+        if size > MAX_HEADER_BYTES:
+            raise BadRequest(431)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    request = Request(method, target, version, headers, reader, writer)
+    if 'transfer-encoding' in headers:
+        raise BadRequest(411, "Send a Content-Length")
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise BadRequest(400, "Bad Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise BadRequest(413)
+    if length:
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        request.body = await reader.readexactly(length)
+    return request
+
+
+async def _serve_connection(handler, reader, writer):
+    try:
+        while True:
+            try:
+                request = await asyncio.wait_for(_read_request(reader, writer), KEEPALIVE_TIMEOUT)
+            except BadRequest as e:
+                writer.write(f"HTTP/1.1 {e.status} {HTTPStatus(e.status).phrase}\r\n"
+                             f"Content-Length: 0\r\nConnection: close\r\n\r\n".encode())
+                break
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+                break  # idle too long, closed mid-request, or a header line over the limit
+            if request is None:
+                break
+
+            try:
+                await handler(request)
+            except ConnectionError:
+                break
+            except Exception:
+                log.exception("Error handling request", extra={"path": request.path})
+                if request.status is None:
+                    request.keep_alive = False
+                    await request.respond(500, b'{"error": "Internal server error"}',
+                                          {'Content-type': 'application/json'})
+                break
+            if not request.keep_alive:
+                break
+    except (ConnectionError, asyncio.CancelledError):
+        pass  # cancelled: the server is shutting down
+    finally:
+        writer.close()
+
+
+async def serve(handler, host, port, backlog=1024):
+    """Start serving; returns the asyncio Server"""
+    return await asyncio.start_server(lambda reader, writer: _serve_connection(handler, reader, writer),
+                                      host, port, limit=MAX_HEADER_BYTES, backlog=backlog)
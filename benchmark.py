@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Load test the API server and the bridge against a stub Claude CLI
+
+Each dataset size gets a scratch copy of the app with synthetic task files
+(N single tasks, a few hundred recurring templates), and api-server.py is
+started there with a stub `claude` first on PATH. The stub sleeps for
+--claude-delay seconds and echoes, in one-shot, stream-json session and
+bridge (--message) modes, so no real Claude calls are made.
+
+Measured per dataset, with --clients concurrent clients:
+
+    save-tasks  - POST /api/save-tasks with every task
+    save-file   - POST /api/save-file of single-tasks.json
+    claude      - POST /api/claude with distinct messages (503s are counted,
+                  not timed)
+
+and once per run, the time from appending a request to
+claude_requests.jsonl until ClaudeBridge.watch_requests hands it to
+call_claude ("bridge-pickup").
+
+Results are printed (or written with --output) as JSON. --compare flags
+any scenario whose p99 or throughput got worse than a saved result by
+more than --tolerance, and exits 1.
+
+Usage:
+    python3 benchmark.py                                # 1k, 10k and 100k tasks
+    python3 benchmark.py --sizes 1000 --requests 50 --output base.json
+    python3 benchmark.py --sizes 1000 --requests 50 --compare base.json
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from file_watcher import FileWatcher
+from jsonl_log import JsonlLog
+from task_files import COMPLETIONS_FILE, RECURRING_FILE, SINGLE_FILE
+
+APP_DIR = Path(__file__).parent
+APP_FILES = ('*.py', '*.html', '*.js', '*.css')
+TYPES = ['work', 'exercise', 'meal', 'meeting', 'personal', 'health', 'social', 'other']
+TITLES = ['Standup', 'Workout', 'Lunch', 'Review', 'Call', 'Groceries', 'Reading', 'Dentist',
+          'Planning', 'Walk', 'Dinner', 'Study', 'Laundry', 'Yoga', 'Sync', 'Errands']
+
+STUB_CLAUDE = '''#!/usr/bin/env python3
+import json, os, sys, time
+delay = float(os.environ.get("CLAUDE_STUB_DELAY", "0"))
+args = sys.argv[1:]
+if "stream-json" in args:
+    for line in sys.stdin:
+        time.sleep(delay)
+        text = "stub answer"
+        print(json.dumps({"type": "assistant", "message": {"content": [{"type": "text", "text": text}]}}))
+        print(json.dumps({"type": "result", "result": text}), flush=True)
+else:
+    prompt = args[args.index("--message") + 1] if "--message" in args else sys.stdin.read()
+    time.sleep(delay)
+    print(f"stub answer ({len(prompt)} prompt chars)")
+'''
+
+
+def make_dataset(single_count, template_count, seed=0, today=None):
+    """(recurring, single, completions) - the same for the same arguments and day"""
+    rng = random.Random(seed)
+    today = today or date.today()
+
+    def times():
+        start = rng.randrange(6 * 4, 21 * 4) * 15
+        end = start + rng.choice([15, 30, 45, 60, 90])
+        return f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"
+
+    recurring, completions = [], {}
+    for i in range(template_count):
+        start_time, end_time = times()
+        kind = rng.choice(['daily', 'weekly', 'weekly', 'monthly'])
+        recurrence = {"type": kind, "interval": rng.choice([1, 1, 1, 2, 3]),
+                      "frequency": {'daily': 'days', 'weekly': 'weeks', 'monthly': 'months'}[kind],
+                      "startDate": (today - timedelta(days=rng.randrange(0, 180))).isoformat(), "end": "never"}
+        if rng.random() < 0.2:
+            recurrence.update(end="on", endDate=(today + timedelta(days=rng.randrange(30, 365))).isoformat())
+        template_id = f"bench_template_{i}"
+        recurring.append({"id": template_id, "title": f"{rng.choice(TITLES)} {i}",
+                          "description": "Synthetic benchmark template", "type": rng.choice(TYPES),
+                          "startTime": start_time, "endTime": end_time, "recurrence": recurrence})
+        if rng.random() < 0.3:
+            completions[template_id] = {(today - timedelta(days=d)).isoformat(): True
+                                        for d in rng.sample(range(1, 60), 5)}
+
+    single = []
+    for i in range(single_count):
+        start_time, end_time = times()
+        single.append({"id": f"bench_task_{i}", "title": f"{rng.choice(TITLES)} {i}",
+                       "description": "Synthetic benchmark task", "type": rng.choice(TYPES),
+                       "date": (today + timedelta(days=rng.randrange(-365, 365))).isoformat(),
+                       "completed": rng.random() < 0.3, "startTime": start_time, "endTime": end_time})
+    return recurring, single, completions
+
+
+def prepare_workdir(root, recurring, single, completions):
+    """Scratch copy of the app with the dataset and the stub claude on bin/"""
+    workdir = Path(tempfile.mkdtemp(prefix="bench-", dir=root))
+    for pattern in APP_FILES:
+        for path in APP_DIR.glob(pattern):
+            shutil.copy2(path, workdir / path.name)
+    for filename, content in ((RECURRING_FILE, recurring), (SINGLE_FILE, single),
+                              (COMPLETIONS_FILE, completions)):
+        (workdir / filename).write_text(json.dumps(content, indent=2))
+    (workdir / "bin").mkdir()
+    stub = workdir / "bin" / "claude"
+    stub.write_text(STUB_CLAUDE)
+    stub.chmod(0o755)
+    return workdir
+
+
+def stub_env(workdir, claude_delay, **extra):
+    env = dict(os.environ, PATH=f"{workdir / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+               CLAUDE_STUB_DELAY=str(claude_delay), LOG_LEVEL="WARNING")
+    env.update({key: str(value) for key, value in extra.items()})
+    return env
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """api-server.py running in a scratch directory"""
+
+    def __init__(self, workdir, env):
+        self.port = free_port()
+        self.log = open(workdir / "server.log", "w")
+        self.process = subprocess.Popen([sys.executable, "api-server.py"], cwd=workdir,
+                                        env={**env, "PORT": str(self.port)},
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"api-server.py exited, see {workdir / 'server.log'}")
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("api-server.py did not start within 30 s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+def summarize(latencies, statuses, elapsed, clients):
+    """Throughput and latency of the successful (2xx) responses; the rest are only counted"""
+    ok = sorted(latency for latency, status in zip(latencies, statuses) if 200 <= status < 300)
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": len(statuses),
+        "clients": clients,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(ok, 0.50)),
+        "p99_ms": ms(percentile(ok, 0.99)),
+        "max_ms": ms(ok[-1] if ok else None),
+        "mean_ms": ms(sum(ok) / len(ok) if ok else None),
+        "statuses": counts,
+    }
+
+
+def run_load(port, make_request, requests, clients, timeout=300):
+    """Send `requests` requests from `clients` threads; make_request(i) -> (method, path, body)"""
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    next_index = iter(range(requests))
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                break
+            method, path, body = make_request(i)
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status = 0
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - started, clients)
+
+
+def bench_server(workdir, env, dataset, args):
+    """save-tasks, save-file and claude results for one dataset"""
+    recurring, single, completions = dataset
+    save_tasks = json.dumps({"tasks": single, "source": "benchmark"}).encode()
+    save_file = json.dumps({"filename": SINGLE_FILE, "content": single, "source": "benchmark"}).encode()
+    claude = lambda i: json.dumps({"message": f"Summarize what I have planned this week (run {i})"}).encode()
+
+    server = Server(workdir, env)
+    try:
+        return {
+            "save-tasks": run_load(server.port, lambda i: ("POST", "/api/save-tasks", save_tasks),
+                                   args.requests, args.clients),
+            "save-file": run_load(server.port, lambda i: ("POST", "/api/save-file", save_file),
+                                  args.requests, args.clients),
+            "claude": run_load(server.port, lambda i: ("POST", "/api/claude", claude(i)),
+                               args.claude_requests, args.clients),
+        }
+    finally:
+        server.stop()
+
+
+def bench_bridge(workdir, env, samples, interval):
+    """Latency from appending a request to ClaudeBridge.watch_requests picking it up"""
+    os.environ["PATH"] = env["PATH"]
+    spec = importlib.util.spec_from_file_location("claude_bridge", workdir / "claude-bridge.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    bridge = module.ClaudeBridge()
+
+    picked = {}
+    arrived = threading.Condition()
+
+    def call_claude(message):
+        with arrived:
+            picked[message] = time.perf_counter()
+            arrived.notify_all()
+        return "stub answer"
+    bridge.call_claude = call_claude
+    threading.Thread(target=bridge.watch_requests, daemon=True).start()
+    time.sleep(0.5)  # let the watcher start
+
+    requests = JsonlLog(bridge.requests_file)
+    latencies, statuses = [], []
+    started = time.perf_counter()
+    for i in range(samples):
+        message = f"benchmark request {i}"
+        sent = time.perf_counter()
+        requests.append({"id": f"bench_{i}", "message": message, "timestamp": time.time()})
+        with arrived:
+            found = arrived.wait_for(lambda: message in picked, timeout=10)
+        latencies.append((picked[message] if found else time.perf_counter()) - sent)
+        statuses.append(200 if found else 0)
+        time.sleep(interval)
+    requests.close()
+    result = summarize(latencies, statuses, time.perf_counter() - started, 1)
+    result["watcher"] = FileWatcher([bridge.requests_file]).mode
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios that got slower than the baseline by more than tolerance"""
+    pairs = [(f"{dataset} {scenario}", result, baseline.get("datasets", {}).get(dataset, {}).get(scenario))
+             for dataset, scenarios in results["datasets"].items() for scenario, result in scenarios.items()]
+    pairs.append(("bridge-pickup", results["bridge-pickup"], baseline.get("bridge-pickup")))
+
+    regressions = []
+    for name, result, old in pairs:
+        if not old:
+            continue
+        if old.get("p99_ms") and result["p99_ms"] and result["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {old['p99_ms']} -> {result['p99_ms']} ms")
+        if (old.get("throughput_rps") and result["throughput_rps"] is not None
+                and result["throughput_rps"] < old["throughput_rps"] * (1 - tolerance)):
+            regressions.append(f"{name}: throughput {old['throughput_rps']} -> {result['throughput_rps']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API server and bridge against a stub Claude CLI")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="single task counts, comma separated")
+    parser.add_argument('--templates', type=int, default=300, help="recurring templates per dataset")
+    parser.add_argument('--requests', type=int, default=100, help="requests per save scenario")
+    parser.add_argument('--claude-requests', type=int, default=40, help="requests for the claude scenario")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent clients")
+    parser.add_argument('--claude-delay', type=float, default=0.2, help="seconds the stub claude takes")
+    parser.add_argument('--sessions', action='store_true', help="use warm claude sessions (CLAUDE_SESSIONS=1)")
+    parser.add_argument('--server-mode', choices=['threaded', 'async'], default='threaded',
+                        help="api-server.py serving mode (SERVER_MODE)")
+    parser.add_argument('--bridge-samples', type=int, default=50, help="requests for bridge-pickup")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="earlier results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown for --compare (0.2 = 20%%)")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch directories")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="schedule-bench-"))
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "datasets": {},
+    }
+    try:
+        for size in (int(value) for value in args.sizes.split(',')):
+            dataset = make_dataset(size, args.templates, args.seed)
+            workdir = prepare_workdir(root, *dataset)
+            env = stub_env(workdir, args.claude_delay, CLAUDE_SESSIONS=int(args.sessions),
+                           SERVER_MODE=args.server_mode)
+            print(f"Benchmarking {size} single tasks, {args.templates} templates...", file=sys.stderr)
+            results["datasets"][f"{size}x{args.templates}"] = bench_server(workdir, env, dataset, args)
+
+        workdir = prepare_workdir(root, *make_dataset(100, 10, args.seed))
+        print("Benchmarking bridge pickup...", file=sys.stderr)
+        results["bridge-pickup"] = bench_bridge(workdir, stub_env(workdir, 0), args.bridge_samples, 0.02)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,55 +3,119 @@
 Claude Bridge - Handles communication between Schedule app and Claude terminal
 """
 import json
+import logging
 import subprocess
 import time
 import os
 from pathlib import Path
 
+from file_watcher import FileWatcher
+from jsonl_log import JsonlLog
+from log_setup import configure_logging
+from prompt_builder import PromptBuilder, claude_instructions
+from task_files import COMPLETIONS_FILE, RECURRING_FILE, SINGLE_FILE
+from task_store import TaskStore
+
+# Drop processed requests from the queue once this many bytes have been handled
+REQUESTS_COMPACT_BYTES = 64 * 1024
+
+log = logging.getLogger('claude-bridge')
+
 class ClaudeBridge:
     def __init__(self):
         self.schedule_dir = Path(__file__).parent
-        self.requests_file = self.schedule_dir / "claude_requests.json"
-        self.responses_file = self.schedule_dir / "claude_responses.json"
-        self.tasks_file = self.schedule_dir / "tasks.json"
+        self.requests_file = self.schedule_dir / "claude_requests.jsonl"
+        self.responses_file = self.schedule_dir / "claude_responses.jsonl"
+        self.cursor_file = self.schedule_dir / "claude_bridge_cursor.json"
+        self.task_store = TaskStore(self.schedule_dir)
         
         # Initialize files
         self.init_files()
         
     def init_files(self):
         """Initialize communication files"""
-        if not self.requests_file.exists():
-            self.requests_file.write_text("[]")
-        if not self.responses_file.exists():
-            self.responses_file.write_text("[]")
+        self.requests_log = JsonlLog(self.requests_file)
+        self.responses_log = JsonlLog(self.responses_file)
+        
+        # Carry over queues from the old JSON array files
+        self.requests_log.migrate_from_json(self.schedule_dir / "claude_requests.json")
+        self.responses_log.migrate_from_json(self.schedule_dir / "claude_responses.json")
+            
+    def read_requests(self):
+        """All queued requests, for consumers that want the old list view"""
+        return self.requests_log.read_all()
+
+    def read_responses(self):
+        """All saved responses, for consumers that want the old list view"""
+        return self.responses_log.read_all()
+
+    def load_cursor(self):
+        """Load the byte offset of the first unprocessed request"""
+        try:
+            cursor = json.loads(self.cursor_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        if "offset" in cursor:
+            return cursor["offset"]
+        
+        # Cursor from the JSON array days - skip past the last processed id
+        for request, offset in self.requests_log.iter_from(0):
+            if request.get('id') == cursor.get("lastId"):
+                return offset
+        return 0
+
+    def save_cursor(self, offset):
+        """Persist the cursor so a restart resumes after the last processed request"""
+        tmp_file = self.cursor_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({"offset": offset, "timestamp": time.time()}))
+        tmp_file.replace(self.cursor_file)
+
+    def process_new_requests(self, offset):
+        """Handle requests appended after offset and return the new offset"""
+        for request, offset in self.requests_log.iter_from(offset):
+            # A bad request gets an error response - it mustn't hold up the ones behind it
+            request_id = request.get('id') if isinstance(request, dict) else None
+            if not isinstance(request, dict) or not request.get('message'):
+                log.warning("Skipping request without a message", extra={"request": request_id})
+                response = "Error: request has no message"
+            else:
+                log.info("Processing request", extra={"request": request_id, "text": request['message']})
+                try:
+                    # Call Claude with the request
+                    response = self.call_claude(request['message'])
+                except Exception as e:
+                    log.exception("Failed to process request", extra={"request": request_id})
+                    response = f"Error: {e}"
             
+            # Save response
+            self.save_response(request_id, response)
+            self.save_cursor(offset)
+
+        if offset >= REQUESTS_COMPACT_BYTES:
+            self.requests_log.compact(keep_from=offset)
+            offset = 0
+            self.save_cursor(offset)
+        if self.responses_log.needs_rotation():
+            self.responses_log.rotate()
+        return offset
+
     def watch_requests(self):
         """Watch for new requests from the app"""
-        last_request_count = 0
-        print("Claude Bridge started - watching for schedule requests...")
+        offset = self.load_cursor()
+        watcher = FileWatcher([self.requests_file])
+        log.info("Claude Bridge started - watching for schedule requests", extra={"watcher": watcher.mode})
         
+        # Pick up anything that arrived while we were stopped, then sleep until the file changes
+        changed = True
         while True:
-            try:
-                requests = json.loads(self.requests_file.read_text())
-                
-                if len(requests) > last_request_count:
-                    # Process new requests
-                    for i in range(last_request_count, len(requests)):
-                        request = requests[i]
-                        print(f"Processing: {request['message']}")
-                        
-                        # Call Claude with the request
-                        response = self.call_claude(request['message'])
-                        
-                        # Save response
-                        self.save_response(request['id'], response)
-                        
-                    last_request_count = len(requests)
-                    
-            except Exception as e:
-                print(f"Error: {e}")
-                
-            time.sleep(1)
+            if changed:
+                try:
+                    offset = self.process_new_requests(offset)
+                except Exception as e:
+                    log.exception("Failed to process requests")
+                    # Resume after the last request that was answered, not from a stale offset
+                    offset = self.load_cursor()
+            changed = watcher.wait()
             
     def call_claude(self, user_message):
         """Call Claude via terminal with context"""
@@ -77,20 +141,12 @@ class ClaudeBridge:
             
     def build_context(self, user_message):
         """Build context prompt for Claude"""
-        tasks = json.loads(self.tasks_file.read_text()) if self.tasks_file.exists() else []
-        
-        return f"""You are a schedule assistant with full authority to edit {self.tasks_file} immediately.
-
-Current tasks: {len(tasks)}
-User request: "{user_message}"
-
-Instructions:
-1. Edit {self.tasks_file} directly based on the request
-2. Respond with what you did (e.g., "Added workout tomorrow at 7am!")
-
-Task format: {{"id": "unique", "title": "...", "type": "work|exercise|meal|meeting|personal|health|social|other", "date": "YYYY-MM-DD", "completed": false, "startTime": "HH:MM", "endTime": "HH:MM"}}
-
-Execute the request now!"""
+        # Only files whose mtime changed since the last request are re-read
+        self.task_store.refresh()
+        request = PromptBuilder().build(
+            user_message, self.task_store.read(SINGLE_FILE)[0], self.task_store.read(RECURRING_FILE)[0],
+            self.task_store.read(COMPLETIONS_FILE)[0])
+        return f"{claude_instructions(self.schedule_dir)}\n\n{request}"
 
     def simulate_claude_response(self, user_message):
         """Simulate Claude response for testing when CLI not available"""
@@ -107,17 +163,17 @@ Execute the request now!"""
     def save_response(self, request_id, response):
         """Save Claude's response"""
         try:
-            responses = json.loads(self.responses_file.read_text())
-            responses.append({
+            self.responses_log.append({
                 "id": request_id,
                 "response": response,
                 "timestamp": time.time()
             })
-            self.responses_file.write_text(json.dumps(responses, indent=2))
-            print(f"Response saved: {response}")
-        except Exception as e:
-            print(f"Error saving response: {e}")
+            log.info("Response saved", extra={"request": request_id})
+            log.debug("Response text", extra={"request": request_id, "response": response})
+        except Exception:
+            log.exception("Error saving response", extra={"request": request_id})
 
 if __name__ == "__main__":
+    configure_logging()
     bridge = ClaudeBridge()
     bridge.watch_requests()
\ No newline at end of file
@@ -8,11 +8,13 @@ import time
 import json
 from pathlib import Path
 
+from claude_sessions import ClaudeSessionPool, ClaudeSessionError
+
 class ClaudeTerminal:
     def __init__(self):
         self.schedule_dir = Path(__file__).parent
         self.tasks_file = self.schedule_dir / "tasks.json"
-        self.claude_process = None
+        self.claude_sessions = None
         self.setup_claude()
         
     def setup_claude(self):
@@ -36,10 +38,22 @@ You have access to read and edit files. Always respond with what you accomplishe
 Ready to help with schedule management!
 
 """
+        # Warm session that keeps the context above loaded between requests
+        self.claude_sessions = ClaudeSessionPool(self.initial_context, self.schedule_dir, size=1)
         print("Claude context prepared")
     
     def process_request(self, user_message):
         """Process user request through Claude using --print mode"""
+        request_prompt = f"User request: {user_message}\n\nExecute this request now and respond with what you accomplished:"
+        try:
+            response = self.claude_sessions.ask(request_prompt, timeout=30)
+            print(f"Claude response: {response}")
+            return response
+        except TimeoutError:
+            return "Claude took too long to respond."
+        except (ClaudeSessionError, OSError) as e:
+            print(f"Claude session unavailable, falling back to one-shot call: {e}")
+
         try:
             # Combine context with user message
             full_prompt = self.initial_context + f"\n\nUser request: {user_message}\n\nExecute this request now and respond with what you accomplished:"
@@ -66,9 +80,8 @@ Ready to help with schedule management!
         
     def cleanup(self):
         """Clean up Claude process"""
-        if self.claude_process:
-            self.claude_process.terminate()
-            self.claude_process.wait()
+        if self.claude_sessions:
+            self.claude_sessions.close()
 
 # Global instance
 claude_terminal = None
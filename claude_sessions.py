@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Claude Sessions - Pool of long-lived Claude CLI processes
+
+Each session runs `claude` in stream-json mode so one process can answer
+many requests. The schedule context is sent once when the session starts
+instead of with every message.
+"""
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+from metrics import counter, histogram
+
+log = logging.getLogger(__name__)
+
+# Recycle a session after this many requests or once it grows past this RSS
+SESSION_MAX_REQUESTS = int(os.environ.get("CLAUDE_SESSION_MAX_REQUESTS", "20"))
+SESSION_MAX_MEMORY_MB = int(os.environ.get("CLAUDE_SESSION_MAX_MEMORY_MB", "600"))
+
+# mode is 'session' for warm sessions, 'oneshot' for a claude process per request
+claude_spawns = counter('claude_spawns_total', 'Claude CLI processes started', ['mode'])
+claude_run_seconds = histogram('claude_run_seconds', 'Time to answer a Claude request', ['mode', 'outcome'])
+claude_timeouts = counter('claude_timeouts_total', 'Claude requests that timed out', ['mode'])
+
+
+class ClaudeSessionError(Exception):
+    """Raised when a session dies or stops speaking the stream-json protocol"""
+
+
+class ClaudeReplyError(Exception):
+    """Raised when Claude answers with an error result (e.g. the API is overloaded)"""
+
+
+class ClaudeSession:
+    """A single long-lived claude process"""
+
+    def __init__(self, context, cwd):
+        self.requests = 0
+        self.started = time.time()
+        self.broken = False
+        self.process = subprocess.Popen([
+            'claude', '--print', '--verbose',
+            '--input-format', 'stream-json',
+            '--output-format', 'stream-json',
+            '--dangerously-skip-permissions',
+            '--append-system-prompt', context,
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+           cwd=cwd, bufsize=1)
+        claude_spawns.inc(mode='session')
+
+    def ask(self, message, on_output=None, timeout=120):
+        """Send one user message and return Claude's final result text"""
+        self.requests += 1
+        started = time.perf_counter()
+        outcome = 'error'
+
+        # A stuck session is killed, which ends the read loop below
+        timed_out = threading.Event()
+        def kill_on_timeout():
+            timed_out.set()
+            self.process.kill()
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.start()
+        try:
+            self.process.stdin.write(json.dumps({
+                "type": "user",
+                "message": {"role": "user", "content": message},
+            }) + "\n")
+            self.process.stdin.flush()
+
+            for line in self.process.stdout:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if event.get("type") == "assistant" and on_output:
+                    for block in event.get("message", {}).get("content", []):
+                        if block.get("type") == "text":
+                            on_output(block["text"] + "\n")
+                elif event.get("type") == "result":
+                    if event.get("is_error"):
+                        raise ClaudeReplyError(event.get("result") or "Claude returned an error")
+                    outcome = 'ok'
+                    return event.get("result", "").strip()
+        except (BrokenPipeError, OSError) as e:
+            self.broken = True
+            raise ClaudeSessionError(f"Claude session failed: {e}")
+        finally:
+            timer.cancel()
+            if timed_out.is_set():
+                outcome = 'timeout'
+                claude_timeouts.inc(mode='session')
+            claude_run_seconds.observe(time.perf_counter() - started, mode='session', outcome=outcome)
+
+        # stdout closed without a result - the process exited or was killed
+        self.broken = True
+        if timed_out.is_set():
+            raise TimeoutError("Claude request timed out")
+        raise ClaudeSessionError("Claude session exited unexpectedly")
+
+    def is_healthy(self):
+        return not self.broken and self.process.poll() is None
+
+    def memory_mb(self):
+        """Resident memory of the claude process in MB (0 if unknown)"""
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return 0
+
+    def needs_recycle(self, max_requests, max_memory_mb):
+        return (not self.is_healthy()
+                or self.requests >= max_requests
+                or self.memory_mb() > max_memory_mb)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+class ClaudeSessionPool:
+    """Managed pool of warm Claude sessions
+
+    Sessions are started lazily up to `size`, health-checked when taken from
+    the pool and recycled after `max_requests` requests or when their memory
+    grows past `max_memory_mb`. Callers should fall back to a one-shot claude
+    call when ask() raises.
+    """
+
+    def __init__(self, context, cwd, size=2, max_requests=SESSION_MAX_REQUESTS,
+                 max_memory_mb=SESSION_MAX_MEMORY_MB):
+        self.context = context
+        self.cwd = cwd
+        self.size = size
+        self.max_requests = max_requests
+        self.max_memory_mb = max_memory_mb
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.total = 0
+        self.closed = False
+
+    def acquire(self, timeout=None):
+        """Take a healthy session from the pool, starting one if there is room"""
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    if self.total < self.size:
+                        self.total += 1
+                        break
+                try:
+                    session = self.idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No Claude session free within {timeout}s") from None
+
+            if session.needs_recycle(self.max_requests, self.max_memory_mb):
+                self.discard(session)
+                continue
+            return session
+
+        try:
+            log.info("Starting warm Claude session")
+            return ClaudeSession(self.context, self.cwd)
+        except Exception:
+            with self.lock:
+                self.total -= 1
+            raise
+
+    def release(self, session):
+        """Return a session to the pool, or retire it if it is worn out"""
+        if self.closed or session.needs_recycle(self.max_requests, self.max_memory_mb):
+            self.discard(session)
+        else:
+            self.idle.put(session)
+
+    def discard(self, session):
+        log.info("Recycling Claude session", extra={"requests": session.requests})
+        session.close()
+        with self.lock:
+            self.total -= 1
+
+    def ask(self, message, on_output=None, timeout=120):
+        """Answer a message on a pooled session"""
+        session = self.acquire(timeout=timeout)
+        try:
+            return session.ask(message, on_output=on_output, timeout=timeout)
+        finally:
+            self.release(session)
+
+    def health_check(self):
+        """Retire idle sessions that have died or grown too large"""
+        healthy = []
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if session.needs_recycle(self.max_requests, self.max_memory_mb):
+                self.discard(session)
+            else:
+                healthy.append(session)
+        for session in healthy:
+            self.idle.put(session)
+
+    def close(self):
+        """Shut down every idle session"""
+        self.closed = True
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Command Parser - Answer simple schedule commands without calling Claude
+
+Handles the common one-liners ("add lunch tomorrow at noon", "move dentist
+to friday 3pm", "delete coffee tomorrow", "add gym every monday at 6am")
+with a small date/time grammar. Every parse gets a confidence score; only
+confident plans are executed locally, everything else goes to Claude.
+"""
+import re
+import time
+from datetime import date, timedelta
+
+FAST_PATH_MIN_CONFIDENCE = 0.75
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+WEEKDAY_RE = r'(mon(?:day)?|tue(?:s|sday)?|wed(?:nesday)?|thu(?:rs|rsday)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)'
+# A bare "sat" or "wed" is only a date after on/next/this or before a time or the end ("sat exam prep" is a title)
+WEEKDAY_CONTEXT_RE = (r'(?:(?<=\bon\s)|(?<=\bnext\s)|(?<=\bthis\s)|(?=(?:mon|tues|wednes|thurs|fri|satur|sun)day\b)'
+                      r'|(?=\w+\s*(?:$|,|\bat\b|@|\bfrom\b|\bbetween\b|\d|\b(?:morning|afternoon|evening|night)\b)))')
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+MONTH_RE = r'(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t|tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)'
+TIME_RE = r'(?:(?:\d{1,2})(?::\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)?|noon|midnight)'
+
+ACTIONS = {
+    'add': 'add', 'schedule': 'add', 'create': 'add', 'put': 'add', 'book': 'add',
+    'move': 'move', 'reschedule': 'move', 'push': 'move', 'shift': 'move',
+    'delete': 'delete', 'remove': 'delete', 'cancel': 'delete', 'clear': 'delete',
+}
+ACTION_RE = re.compile(r'^(?:hey\s+|ok\s+|okay\s+)?(?:please\s+)?(?:can you\s+|could you\s+)?(?:please\s+)?'
+                       r'(' + '|'.join(ACTIONS) + r')\b\s*', re.I)
+
+# Default times and types for things people add all the time
+KNOWN_ITEMS = [
+    ('breakfast', 'meal', '08:00', '08:30'),
+    ('coffee', 'personal', '07:30', '08:00'),
+    ('lunch', 'meal', '12:00', '13:00'),
+    ('dinner', 'meal', '18:00', '19:00'),
+    ('workout', 'exercise', '07:00', '08:00'),
+    ('gym', 'exercise', '07:00', '08:00'),
+    ('meeting', 'meeting', '10:00', '11:00'),
+]
+TYPE_KEYWORDS = {
+    'meal': ['breakfast', 'lunch', 'dinner', 'brunch', 'snack', 'eat'],
+    'exercise': ['workout', 'gym', 'run', 'running', 'walk', 'yoga', 'swim', 'bike', 'lift', 'exercise'],
+    'meeting': ['meeting', 'standup', 'call', 'sync', '1:1', 'interview'],
+    'health': ['doctor', 'dentist', 'therapy', 'meds', 'medication', 'bedtime', 'sleep', 'appointment'],
+    'social': ['party', 'drinks', 'friends', 'date', 'birthday', 'hangout'],
+    'work': ['work', 'deadline', 'report', 'review', 'project', 'email'],
+}
+
+# Words that mean the request needs real reasoning, not a one-line edit
+ESCALATE_WORDS = {'and', 'also', 'then', 'every', 'each', 'other', 'routine', 'plan', 'week', 'weeks',
+                  'month', 'months', 'suggest', 'optimize', 'best', 'free', 'should', 'could', 'would',
+                  'what', 'when', 'which', 'how', 'why', 'all', 'everything', 'it', 'that', 'them'}
+FILLER_WORDS = {'a', 'an', 'the', 'my', 'some', 'for', 'at', 'on', 'in', 'to', 'from', 'by', 'new', 'task', 'event'}
+
+
+class FastPathPlan:
+    """What the fast path would do for a message, and how sure it is"""
+
+    def __init__(self, action, confidence=0.0, reply=None, patches=None, reason=None):
+        self.action = action
+        self.confidence = confidence
+        self.reply = reply
+        self.patches = patches or []  # [(filename, [operation, ...])]
+        self.reason = reason
+
+    @property
+    def confident(self):
+        return self.confidence >= FAST_PATH_MIN_CONFIDENCE
+
+
+class ParsedWhen:
+    """Date, time and recurrence pulled out of a piece of text"""
+
+    def __init__(self):
+        self.date = None
+        self.start = None
+        self.end = None
+        self.duration = None
+        self.recurrence = None
+        self.ambiguous = False
+        self.bare_hour = False  # a time like "at 7" with no am/pm
+
+
+def _hhmm(minutes):
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_time(text, evening=False):
+    """'5pm', '5:30 pm', '17:00', 'noon' -> ('HH:MM', ambiguous)
+
+    '5' and '5:30' could be morning or afternoon; '05:30' and '17:30' are read as 24-hour times.
+    """
+    text = text.strip().lower().replace('.', '')
+    if text == 'noon':
+        return '12:00', False
+    if text == 'midnight':
+        return '00:00', False
+    match = re.fullmatch(r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)?', text)
+    if not match:
+        return None, False
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if hour > 23 or minute > 59:
+        return None, False
+    ambiguous = False
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    elif not meridiem and hour <= 12 and not (match.group(2) and match.group(1).startswith('0')):
+        # "at 5" or "at 5:30" - guess the waking-hours reading
+        ambiguous = True
+        if hour < 7 or (evening and hour < 12):
+            hour += 12
+    return f"{hour:02d}:{minute:02d}", ambiguous
+
+
+def _next_weekday(today, name, qualifier):
+    weekday = next(i for i, day in enumerate(WEEKDAYS) if day.startswith(name[:3]))
+    days_ahead = (weekday - today.weekday()) % 7
+    if days_ahead == 0 and qualifier != 'this':
+        days_ahead = 7
+    return today + timedelta(days=days_ahead)
+
+
+def _month_number(name):
+    return next(i + 1 for i, month in enumerate(MONTHS) if month.startswith(name[:3]))
+
+
+def _future_date(today, month, day, year=None):
+    try:
+        result = date(year or today.year, month, day)
+    except ValueError:
+        return None
+    if not year and result < today:
+        result = result.replace(year=result.year + 1)
+    return result
+
+
+def extract_when(text, today):
+    """Pull date/time/recurrence phrases out of text; returns (ParsedWhen, leftover text)
+
+    Phrases are matched case-insensitively; the leftover keeps the case it had.
+    """
+    when = ParsedWhen()
+    original, text = text, text.lower()
+    if len(original) != len(text):
+        original = text  # lowercasing changed the length, so slices wouldn't line up
+    evening = bool(re.search(r'\b(tonight|evening)\b', text))
+
+    def take(pattern, handler):
+        nonlocal text, original
+        match = re.search(pattern, text)
+        if match and handler(match) is not False:
+            text = (text[:match.start()] + ' ' + text[match.end():]).strip()
+            original = (original[:match.start()] + ' ' + original[match.end():]).strip()
+
+    # Recurrence
+    def daily(match):
+        when.recurrence = {"type": "daily", "interval": 1, "frequency": "days", "end": "never"}
+    def weekly_on(match):
+        when.recurrence = {"type": "weekly", "interval": 1, "frequency": "weeks", "end": "never"}
+        when.date = _next_weekday(today, match.group(1), 'this')
+    def weekly(match):
+        when.recurrence = {"type": "weekly", "interval": 1, "frequency": "weeks", "end": "never"}
+    take(r'\b(?:every\s*day|daily|each\s+day)\b', daily)
+    take(r'\bevery\s+' + WEEKDAY_RE + r'\b(?!\s+and)', weekly_on)
+    take(r'\bweekly\b', weekly)
+
+    # Dates
+    def relative(days):
+        def handler(match):
+            when.date = today + timedelta(days=days)
+        return handler
+    take(r'\b(?:on\s+)?(?:the\s+)?day after tomorrow\b', relative(2))
+    take(r'\b(?:on\s+)?tomorrow(?:\s+(?:morning|afternoon|evening|night))?\b', relative(1))
+    take(r'\b(?:today|tonight|this\s+(?:morning|afternoon|evening))\b', relative(0))
+    def in_days(match):
+        when.date = today + timedelta(days=int(match.group(1)))
+    take(r'\bin\s+(\d{1,3})\s+days?\b', in_days)
+    def iso(match):
+        try:
+            when.date = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return False
+    take(r'\b(?:on\s+)?(\d{4})-(\d{2})-(\d{2})\b', iso)
+    def month_day(match):
+        when.date = _future_date(today, _month_number(match.group(1)), int(match.group(2)),
+                                 int(match.group(3)) if match.group(3) else None)
+        return False if not when.date else None
+    take(r'\b(?:on\s+)?' + MONTH_RE + r'\.?\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b', month_day)
+    def day_month(match):
+        when.date = _future_date(today, _month_number(match.group(2)), int(match.group(1)))
+        return False if not when.date else None
+    take(r'\b(?:on\s+)?(?:the\s+)?(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?' + MONTH_RE + r'\b', day_month)
+    def slash(match):
+        year = int(match.group(3)) if match.group(3) else None
+        if year and year < 100:
+            year += 2000
+        when.date = _future_date(today, int(match.group(1)), int(match.group(2)), year)
+        return False if not when.date else None
+    take(r'\b(?:on\s+)?(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b', slash)
+    def weekday(match):
+        when.date = _next_weekday(today, match.group(2), (match.group(1) or '').strip())
+        if not match.group(1) and when.date - today == timedelta(days=7):
+            when.ambiguous = True
+    take(r'\b(?:on\s+)?(next\s+|this\s+)?' + WEEKDAY_CONTEXT_RE + WEEKDAY_RE + r'\b', weekday)
+    def ordinal(match):
+        # "on the 1st": this month if that day is still ahead, otherwise next month
+        day = int(match.group(1))
+        when.date = _future_date(today, today.month, day, today.year)
+        if when.date is None or when.date < today:
+            month = today.month % 12 + 1
+            when.date = _future_date(today, month, day, today.year + (month == 1))
+        return False if not when.date else None
+    take(r'\bon\s+the\s+(\d{1,2})(?:st|nd|rd|th)\b', ordinal)
+
+    # Times - ranges first so "5-6pm" isn't read as two separate times
+    def time_range(match):
+        if when.start:
+            return False
+        end, end_ambiguous = parse_time(match.group(2), evening)
+        start_text = match.group(1)
+        if end and not re.search(r'am|pm|:|noon|midnight', start_text):
+            # "5-6pm": the start shares the end's am/pm - but "10-12" ends at noon, so starts in the morning
+            start_text += ' pm' if end >= '13:00' else ' am'
+        start, start_ambiguous = parse_time(start_text, evening)
+        if not start or not end:
+            return False
+        when.start, when.end = start, end
+        when.ambiguous |= start_ambiguous and end_ambiguous
+        when.bare_hour |= end_ambiguous
+    # "and" only joins a range after "between" - "at 8 am and 8 pm" is two times
+    take(r'\bbetween\s+(' + TIME_RE + r')\s*(?:-|–|to|until|till|and)\s*(' + TIME_RE + r')(?!\d)', time_range)
+    take(r'\b(?:from\s+)?(' + TIME_RE + r')\s*(?:-|–|to|until|till)\s*(' + TIME_RE + r')(?!\d)', time_range)
+    def single_time(match):
+        start, ambiguous = parse_time(match.group(1), evening)
+        if not start or when.start:
+            return False
+        when.start = start
+        when.ambiguous |= ambiguous
+        when.bare_hour |= ambiguous
+    take(r'(?:\bat\s+|@\s*)(' + TIME_RE + r')(?!\d)', single_time)
+    take(r'\b(\d{1,2}(?::\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)|\d{1,2}:\d{2}|noon|midnight)(?!\d)', single_time)
+    def duration(match):
+        amount = match.group(1)
+        amount = 1 if amount in ('an', 'a', 'one') else (0.5 if amount.startswith('half') else float(amount))
+        when.duration = int(amount * (1 if match.group(2).startswith('m') else 60))
+    take(r'\bfor\s+(an|a|one|half an|half a|\d+(?:\.\d+)?)\s*(minutes?|mins?|m|hours?|hrs?|h)\b', duration)
+    return when, original
+
+
+def clean_title(text):
+    words = re.findall(r"[\w'&+/-]+|[?]", text)
+    while words and words[0].lower() in FILLER_WORDS:
+        words.pop(0)
+    while words and words[-1].lower() in FILLER_WORDS:
+        words.pop()
+    return ' '.join(words)
+
+
+def infer_type(title):
+    words = set(re.findall(r'[\w:]+', title.lower()))
+    for task_type, keywords in TYPE_KEYWORDS.items():
+        if words & set(keywords):
+            return task_type
+    return 'other'
+
+
+def known_item(title):
+    words = set(re.findall(r'\w+', title.lower()))
+    for name, task_type, start, end in KNOWN_ITEMS:
+        if name in words:
+            return task_type, start, end
+    return None
+
+
+def title_tokens(title):
+    return set(re.findall(r'\w+', title.lower())) - FILLER_WORDS
+
+
+def describe_when(task_date, start, today):
+    if task_date == today:
+        day_text = "today"
+    elif task_date == today + timedelta(days=1):
+        day_text = "tomorrow"
+    else:
+        day_text = f"on {task_date.strftime('%A %b')} {task_date.day}"
+    return day_text + (f" at {start}" if start else "")
+
+
+class CommandRouter:
+    """First stage for chat messages: plan simple edits locally, escalate the rest"""
+
+    def __init__(self, today=None):
+        self.today = today or date.today()
+
+    def plan(self, message, single_tasks, recurring_tasks):
+        text = ' '.join(message.strip().split())
+        match = ACTION_RE.match(text)
+        if not match:
+            return FastPathPlan(None, reason="no leading command verb")
+        action = ACTIONS[match.group(1).lower()]
+        rest = text[match.end():].rstrip('.!')
+        if '?' in rest or len(rest) > 120:
+            return FastPathPlan(action, reason="question or long request")
+        if action == 'add':
+            return self.plan_add(rest)  # keeps the case the user typed for the title
+        rest = rest.lower()
+        if action == 'move':
+            return self.plan_move(rest, single_tasks, recurring_tasks)
+        return self.plan_delete(rest, single_tasks, recurring_tasks)
+
+    def _escalation_penalty(self, title):
+        words = set(re.findall(r'\w+', title.lower()))
+        penalty = 0.0
+        if words & ESCALATE_WORDS:
+            penalty += 0.4
+        if len(words) > 6:
+            penalty += 0.3
+        return penalty
+
+    def plan_add(self, rest):
+        when, leftover = extract_when(rest, self.today)
+        title = clean_title(leftover)
+        if not title:
+            return FastPathPlan('add', reason="nothing to add")
+
+        confidence = 0.95 - self._escalation_penalty(title)
+        defaults = known_item(title)
+        task_type = defaults[0] if defaults else infer_type(title)
+        start, end = when.start, when.end
+        if when.bare_hour and defaults and not end:
+            # "dinner at 7": take the reading nearest the usual time (19:00, not 07:00)
+            hour_of_day = _minutes(start) % (12 * 60)
+            start = _hhmm(min((hour_of_day, hour_of_day + 12 * 60),
+                              key=lambda minutes: abs(minutes - _minutes(defaults[1]))))
+        elif when.bare_hour:
+            # "movie at 7" could be either - Claude can ask
+            confidence -= 0.25
+        if when.ambiguous:
+            confidence -= 0.1
+        if not when.date and not start:
+            confidence -= 0.1
+        if not start and defaults:
+            start, end = defaults[1], defaults[2]
+        if start and not end:
+            if when.duration:
+                end = _hhmm(_minutes(start) + when.duration)
+            elif defaults:
+                end = _hhmm(_minutes(start) + _minutes(defaults[2]) - _minutes(defaults[1]))
+            else:
+                end = _hhmm(_minutes(start) + 60)
+        elif start and end <= start:
+            return FastPathPlan('add', reason="end time is not after the start time")
+        task_date = when.date or self.today
+        if task_date < self.today:
+            confidence -= 0.3
+
+        title = title[0].upper() + title[1:]
+        task = {
+            "id": f"claude_{int(time.time() * 1000)}",
+            "title": title,
+            "description": "",
+            "type": task_type,
+        }
+        if start:
+            task["startTime"] = start
+            task["endTime"] = end
+        if when.recurrence:
+            task["recurrence"] = {**when.recurrence, "startDate": task_date.isoformat()}
+            every = "every day" if when.recurrence["type"] == "daily" else f"every {task_date.strftime('%A')}"
+            reply = f"Added '{title}' {every}" + (f" at {start}" if start else "") + "!"
+            patches = [('recurring-tasks.json', [{"op": "add", "task": task}])]
+        else:
+            task["date"] = task_date.isoformat()
+            task["completed"] = False
+            reply = f"Added '{title}' {describe_when(task_date, start, self.today)}!"
+            patches = [('single-tasks.json', [{"op": "add", "task": task}])]
+        return FastPathPlan('add', round(confidence, 2), reply, patches)
+
+    def find_tasks(self, title, single_tasks, recurring_tasks, on_date=None):
+        """(single matches, recurring matches) whose titles contain every word of title"""
+        wanted = title_tokens(title)
+        if not wanted:
+            return [], []
+        today = self.today.isoformat()
+        singles = [t for t in single_tasks
+                   if wanted <= title_tokens(t.get('title', ''))
+                   and (t.get('date') == on_date.isoformat() if on_date else (t.get('date') or '') >= today)]
+        recurring = [t for t in recurring_tasks if wanted <= title_tokens(t.get('title', ''))]
+        return singles, recurring
+
+    def plan_move(self, rest, single_tasks, recurring_tasks):
+        # "<task> [source date] to <new date/time>"
+        split = re.search(r'\s+(?:to|until|till)\s+(?=' + TIME_RE + r'\b|tomorrow|today|tonight|next|this|on\b|'
+                          + WEEKDAY_RE + r'|' + MONTH_RE + r'|\d)', rest)
+        if not split:
+            return FastPathPlan('move', reason="no target date/time")
+        source_when, source_text = extract_when(rest[:split.start()], self.today)
+        target_when, target_leftover = extract_when(rest[split.end():], self.today)
+        title = clean_title(source_text)
+        if clean_title(target_leftover) or not (target_when.date or target_when.start) or target_when.recurrence:
+            return FastPathPlan('move', reason="could not read the new date/time")
+
+        singles, recurring = self.find_tasks(title, single_tasks, recurring_tasks, source_when.date)
+        if len(singles) != 1 or recurring:
+            return FastPathPlan('move', reason=f"{len(singles)} single / {len(recurring)} recurring matches")
+
+        task = singles[0]
+        changes = {}
+        if target_when.date:
+            changes["date"] = target_when.date.isoformat()
+        if target_when.start:
+            changes["startTime"] = target_when.start
+            if target_when.end:
+                changes["endTime"] = target_when.end
+            elif task.get('startTime') and task.get('endTime'):
+                # Keep the task's length
+                length = (_minutes(task['endTime']) - _minutes(task['startTime'])) % (24 * 60)
+                changes["endTime"] = _hhmm(_minutes(target_when.start) + length)
+        new_date = target_when.date or date.fromisoformat(task['date'])
+        confidence = 0.9 - self._escalation_penalty(title) - (0.1 if target_when.ambiguous else 0)
+        new_when = describe_when(new_date, changes.get('startTime'), self.today).removeprefix('on ')
+        reply = f"Moved '{task['title']}' to {new_when}!"
+        return FastPathPlan('move', round(confidence, 2), reply,
+                            [('single-tasks.json', [{"op": "update", "id": task['id'], "changes": changes}])])
+
+    def plan_delete(self, rest, single_tasks, recurring_tasks):
+        when, leftover = extract_when(rest, self.today)
+        title = clean_title(leftover)
+        singles, recurring = self.find_tasks(title, single_tasks, recurring_tasks, when.date)
+        if len(singles) != 1 or recurring or when.start:
+            return FastPathPlan('delete', reason=f"{len(singles)} single / {len(recurring)} recurring matches")
+        task = singles[0]
+        confidence = 0.9 - self._escalation_penalty(title)
+        reply = f"Deleted '{task['title']}' {describe_when(date.fromisoformat(task['date']), None, self.today)}!"
+        return FastPathPlan('delete', round(confidence, 2), reply,
+                            [('single-tasks.json', [{"op": "delete", "id": task['id']}])])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+File Watcher - Wait for changes to a set of files
+
+Uses Linux inotify when available so an idle watcher costs no CPU and picks
+up writes within milliseconds. Elsewhere it falls back to comparing
+mtime/size, which only stats the files and never reads them.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+from pathlib import Path
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+
+def _load_inotify():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """Report which of `paths` changed since the last call to wait()"""
+
+    def __init__(self, paths, poll_interval=1.0, use_inotify=True):
+        self.paths = {Path(p).resolve() for p in paths}
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.stats = {path: self._stat(path) for path in self.paths}
+
+        libc = _load_inotify() if use_inotify else None
+        if libc:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+                # Watch directories, not files, so replace-by-rename writes are seen
+                mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+                for directory in {path.parent for path in self.paths}:
+                    if libc.inotify_add_watch(fd, str(directory).encode(), mask) < 0:
+                        os.close(fd)
+                        self.fd = None
+                        break
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else "polling"
+
+    def _stat(self, path):
+        try:
+            st = path.stat()
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            return None
+
+    def _changed_by_stat(self):
+        changed = set()
+        for path in self.paths:
+            current = self._stat(path)
+            if current != self.stats[path]:
+                self.stats[path] = current
+                changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Block until a watched file changes (or timeout) and return the changed paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if self.fd is not None:
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+                if ready:
+                    self._drain_events()
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+            # Events only say "something in this directory"; stat confirms which file
+            changed = self._changed_by_stat()
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def _drain_events(self):
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Interval Index - Overlap and free-slot queries over expanded task occurrences
+
+Every timed occurrence in the horizon becomes an interval of absolute
+minutes (days since 1970-01-01 * 1440 + minute of day). Intervals are kept
+in a list sorted by start; because no task is longer than MAX_DURATION an
+overlap query only has to look at starts in [query_start - MAX_DURATION,
+query_end), which bisect finds in O(log n). Inserting or removing an entry
+shifts the list and costs O(n), which is cheap at a year of one person's
+tasks.
+
+The index is updated per record: saving a file only re-expands the tasks
+whose content changed, instead of rebuilding everything. Records whose
+times or recurrence don't parse are left out rather than failing the whole
+file.
+"""
+import bisect
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+from recurrence import template_dates
+
+MINUTES_PER_DAY = 24 * 60
+MAX_DURATION = 2 * MINUTES_PER_DAY
+DEFAULT_DURATION = 30  # same default the day view uses for tasks without an endTime
+EPOCH = date(1970, 1, 1)
+
+
+def parse_minutes(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def to_absolute(day, minutes=0):
+    return (day - EPOCH).days * MINUTES_PER_DAY + minutes
+
+
+def from_absolute(value):
+    day = EPOCH + timedelta(days=value // MINUTES_PER_DAY)
+    minutes = value % MINUTES_PER_DAY
+    return day.isoformat(), f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def task_interval(day, task):
+    """(start, end) in absolute minutes for a task on a day, None if untimed"""
+    if not task.get('startTime'):
+        return None
+    start = to_absolute(day, parse_minutes(task['startTime']))
+    if task.get('endTime'):
+        end = to_absolute(day, parse_minutes(task['endTime']))
+        if end < start:
+            end += MINUTES_PER_DAY  # runs past midnight
+    else:
+        end = start + DEFAULT_DURATION
+    return start, min(end, start + MAX_DURATION)
+
+
+class IntervalIndex:
+    """Sorted interval index over single and recurring task occurrences"""
+
+    def __init__(self, horizon_start, horizon_end):
+        self.horizon_start = horizon_start
+        self.horizon_end = horizon_end
+        self.entries = []        # sorted (start, end, occurrence_id, record_id)
+        self.by_record = {}      # record_id -> (fingerprint, [entries])
+        self.file_records = {}   # filename -> set of record ids
+        self.lock = threading.RLock()
+
+    def _expand(self, task, recurring):
+        if recurring:
+            try:
+                days = template_dates(task, self.horizon_start, self.horizon_end)
+            except (ValueError, TypeError):
+                return []  # recurrence rule doesn't parse
+        else:
+            try:
+                day = date.fromisoformat(task.get('date') or '')
+            except ValueError:
+                return []
+            days = [day] if self.horizon_start <= day <= self.horizon_end else []
+
+        entries = []
+        for day in days:
+            try:
+                interval = task_interval(day, task)
+            except (ValueError, AttributeError):
+                return []  # startTime/endTime isn't HH:MM
+            if interval:
+                occurrence_id = f"{task['id']}_{day.isoformat()}" if recurring else task['id']
+                entries.append((interval[0], interval[1], occurrence_id, task['id']))
+        return entries
+
+    def _remove_record(self, record_id):
+        _, entries = self.by_record.pop(record_id, (None, []))
+        for entry in entries:
+            i = bisect.bisect_left(self.entries, entry)
+            if i < len(self.entries) and self.entries[i] == entry:
+                del self.entries[i]
+
+    def _add_record(self, task, recurring, fingerprint):
+        entries = self._expand(task, recurring)
+        for entry in entries:
+            bisect.insort(self.entries, entry)
+        self.by_record[task['id']] = (fingerprint, entries)
+
+    def update_tasks(self, filename, tasks, recurring):
+        """Sync the index with a file's task list, touching only changed records"""
+        with self.lock:
+            seen = set()
+            changed = 0
+            for task in tasks:
+                if not task.get('id') or (recurring and not task.get('recurrence')):
+                    continue
+                seen.add(task['id'])
+                fingerprint = json.dumps(task, sort_keys=True)
+                current = self.by_record.get(task['id'])
+                if current and current[0] == fingerprint:
+                    continue
+                self._remove_record(task['id'])
+                self._add_record(task, recurring, fingerprint)
+                changed += 1
+
+            for record_id in self.file_records.get(filename, set()) - seen:
+                self._remove_record(record_id)
+                changed += 1
+            self.file_records[filename] = seen
+            return changed
+
+    def overlapping(self, start, end, exclude=None):
+        """Entries overlapping [start, end) in absolute minutes"""
+        with self.lock:
+            i = bisect.bisect_left(self.entries, (start - MAX_DURATION,))
+            j = bisect.bisect_left(self.entries, (end,))
+            return [entry for entry in self.entries[i:j]
+                    if entry[1] > start and entry[0] < end
+                    and entry[0] != entry[1] and entry[2] != exclude]
+
+    def conflicts(self, range_start, range_end):
+        """Pairs of overlapping occurrences starting between two dates (inclusive)"""
+        start, end = to_absolute(range_start), to_absolute(range_end + timedelta(days=1))
+        with self.lock:
+            i = bisect.bisect_left(self.entries, (start,))
+            j = bisect.bisect_left(self.entries, (end,))
+            pairs = []
+            active = []
+            for entry in self.entries[i:j]:
+                if entry[0] == entry[1]:
+                    continue
+                active = [other for other in active if other[1] > entry[0]]
+                pairs.extend((other, entry) for other in active)
+                active.append(entry)
+            return pairs
+
+    def next_free_slot(self, after, length, day_start='00:00', day_end='24:00', limit_days=365):
+        """Start of the first gap of `length` minutes at or after `after`, within each day's window"""
+        window_start, window_end = parse_minutes(day_start), parse_minutes(day_end)
+        candidate = after
+        with self.lock:
+            last = min(to_absolute(self.horizon_end + timedelta(days=1)), after + limit_days * MINUTES_PER_DAY)
+            while candidate + length <= last:
+                # Clamp the candidate into the allowed part of its day
+                day_offset = candidate % MINUTES_PER_DAY
+                day_base = candidate - day_offset
+                if day_offset < window_start:
+                    candidate = day_base + window_start
+                    continue
+                if day_offset + length > window_end:
+                    candidate = day_base + MINUTES_PER_DAY + window_start
+                    continue
+
+                blocking = self.overlapping(candidate, candidate + length)
+                if not blocking:
+                    return candidate
+                candidate = max(entry[1] for entry in blocking)
+        return None
+
+    def describe(self, entry):
+        start_date, start_time = from_absolute(entry[0])
+        end_date, end_time = from_absolute(entry[1])
+        return {"id": entry[2], "recordId": entry[3], "date": start_date,
+                "startTime": start_time, "endTime": end_time,
+                **({"endDate": end_date} if end_date != start_date else {})}
+
+
+def parse_datetime(value):
+    """'YYYY-MM-DDTHH:MM' (or a bare date) -> absolute minutes"""
+    moment = datetime.fromisoformat(value)
+    return to_absolute(moment.date(), moment.hour * 60 + moment.minute)
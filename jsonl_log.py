@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+JSONL Log - Append-only JSON-lines file used for the bridge request/response queues
+
+Appending a record is O(1) no matter how big the log is, and a crash can at
+worst leave one partial last line, which readers skip. fsync is batched so
+a burst of appends costs one disk flush.
+"""
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class JsonlLog:
+    """Append-only log of JSON records, one per line"""
+
+    def __init__(self, path, fsync_interval=0.5, max_bytes=1024 * 1024):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.handle = None
+        self.dirty = False
+        self.sync_timer = None
+        self.lock = threading.Lock()
+        self.path.touch(exist_ok=True)
+
+    @contextmanager
+    def file_lock(self):
+        """Advisory lock shared with other processes using the same log"""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open(self):
+        # Another process may have compacted the log (new inode) - reopen if so
+        if self.handle:
+            try:
+                if os.fstat(self.handle.fileno()).st_ino == self.path.stat().st_ino:
+                    return self.handle
+            except FileNotFoundError:
+                pass
+            self.handle.close()
+        self.handle = open(self.path, "a", encoding="utf-8")
+        return self.handle
+
+    def append(self, record):
+        """Append one record; durable on disk within fsync_interval seconds"""
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock, self.file_lock():
+            handle = self._open()
+            handle.write(line)
+            handle.flush()
+            self.dirty = True
+            if self.fsync_interval <= 0:
+                self._sync()
+            elif not self.sync_timer:
+                self.sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+    def sync(self):
+        """fsync any appends that are not yet on disk"""
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        self.sync_timer = None
+        if self.dirty and self.handle:
+            os.fsync(self.handle.fileno())
+            self.dirty = False
+
+    def iter_from(self, offset=0):
+        """Yield (record, end_offset) for each complete line starting at byte offset"""
+        with open(self.path, "rb") as f:
+            if offset > os.fstat(f.fileno()).st_size:
+                offset = 0  # log was truncated or compacted - start over
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line still being written
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn write from a crash
+                yield record, offset
+
+    def read_from(self, offset=0):
+        """Return (records, new_offset) for complete lines starting at byte offset"""
+        records = []
+        for record, offset in self.iter_from(offset):
+            records.append(record)
+        return records, offset
+
+    def read_all(self):
+        """All records as a list, like the old JSON array files"""
+        return self.read_from(0)[0]
+
+    def compact(self, keep_from=0):
+        """Rewrite the log keeping only records from byte offset keep_from onwards
+
+        A reader whose cursor was at keep_from should continue from offset 0.
+        """
+        with self.lock, self.file_lock():
+            self._sync()
+            records, _ = self.read_from(keep_from)
+            self._rewrite(self.path, records)
+
+    def retain(self, keep):
+        """Rewrite the log with only the records keep(records) returns"""
+        with self.lock, self.file_lock():
+            self._sync()
+            self._rewrite(self.path, keep(self.read_all()))
+
+    def _rewrite(self, path, records):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def rotate(self, keep_last=100):
+        """Move the full log to <name>.1 and start a new one holding the last records"""
+        with self.lock, self.file_lock():
+            self._sync()
+            records = self.read_all()[-keep_last:] if keep_last else []
+            os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            self._rewrite(self.path, records)
+
+    def needs_rotation(self):
+        try:
+            return self.path.stat().st_size > self.max_bytes
+        except FileNotFoundError:
+            return False
+
+    def migrate_from_json(self, legacy_path):
+        """Import records from an old JSON array file, once"""
+        legacy_path = Path(legacy_path)
+        if not legacy_path.exists() or self.path.stat().st_size:
+            return 0
+        try:
+            records = json.loads(legacy_path.read_text())
+        except json.JSONDecodeError:
+            return 0
+        for record in records:
+            self.append(record)
+        self.sync()
+        legacy_path.rename(legacy_path.with_suffix(".json.migrated"))
+        return len(records)
+
+    def close(self):
+        with self.lock:
+            if self.sync_timer:
+                self.sync_timer.cancel()
+            self._sync()
+            if self.handle:
+                self.handle.close()
+                self.handle = None
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Log Setup - Leveled, structured logging for the server and the bridge
+
+LOG_LEVEL picks the level (default INFO). Fields passed as
+extra={"job": job_id} are written after the message as key=value pairs,
+or as JSON objects (one per line) with LOG_FORMAT=json.
+"""
+import json
+import logging
+import os
+import sys
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD}
+
+
+def _quote(value):
+    text = str(value)
+    return json.dumps(text) if not text or any(c in text for c in ' "=\n') else text
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        line = (f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')} {record.levelname:<7} "
+                f"{record.name}: {record.getMessage()}")
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={_quote(value)}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'), "level": record.levelname,
+                 "logger": record.name, "message": record.getMessage(), **_fields(record)}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    """Send all logging to stdout in the chosen format"""
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    fmt = fmt or os.environ.get("LOG_FORMAT", "text")
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
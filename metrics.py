@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Metrics - Counters, gauges and histograms rendered in Prometheus text format
+
+A small stand-in for prometheus_client, so the server has no extra
+dependency. Modules create their metrics at import time:
+
+    requests = counter('http_requests_total', 'HTTP requests', ['route', 'status'])
+    requests.inc(route='/api/claude', status='200')
+
+    latency = histogram('http_request_duration_seconds', 'Request latency', ['route'])
+    with latency.time(route='/api/claude'):
+        ...
+
+and /api/metrics serves render().
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds - covers everything from a cached answer to a full 120 s Claude run
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metrics = []
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [f"{self.name}{_labels(self.label_names, key)} {value}"
+                    for key, value in sorted(self.values.items())]
+
+
+class Gauge(Metric):
+    """Read from a callback at scrape time - a number, or {label values: number}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, fn, labels=(), kind='gauge'):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+        self.kind = kind  # 'counter' for totals another object already keeps
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [f"{self.name} {value}"]
+        return [f"{self.name}{_labels(self.label_names, key if isinstance(key, tuple) else (key,))} {v}"
+                for key, v in sorted(value.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            for key, state in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {state[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {state[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {state[-1]}")
+        return lines
+
+
+def _register(metric):
+    with _lock:
+        _metrics.append(metric)
+    return metric
+
+
+def counter(name, help_text, labels=()):
+    return _register(Counter(name, help_text, labels))
+
+
+def gauge(name, help_text, fn, labels=(), kind='gauge'):
+    return _register(Gauge(name, help_text, fn, labels, kind))
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, labels, buckets))
+
+
+def render():
+    """Every registered metric in Prometheus text exposition format"""
+    with _lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# JSON work shows up in several modules, so its timers live here
+json_parse_seconds = histogram('json_parse_seconds', 'Time spent parsing JSON', ['what'])
+json_serialize_seconds = histogram('json_serialize_seconds', 'Time spent serializing JSON', ['what'])
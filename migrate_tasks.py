@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Migrate Tasks - Convert the legacy tasks.json files to the split task files
+
+tasks.json and tasks-backup.json hold every recurring instance as its own
+object. The migrator folds those instances back into templates:
+
+- instances sharing a recurrenceId become one template in
+  recurring-tasks.json, starting on the first instance's date
+- completed instances become entries in task-completions.json
+- instances the template wouldn't produce (moved or edited copies) and
+  tasks without a recurrenceId go to single-tasks.json
+
+Templates and tasks whose id is already in the split files are left alone.
+With --archive, every legacy task is also kept in a compact task_archive
+file, so the history survives after the legacy files are removed.
+
+Usage:
+    python3 migrate_tasks.py                    # dry run, prints what would change
+    python3 migrate_tasks.py --write            # update the split files
+    python3 migrate_tasks.py --write --archive tasks-archive.bin
+"""
+import argparse
+import json
+from collections import Counter, defaultdict
+from datetime import date
+from pathlib import Path
+
+from recurrence import template_dates
+from task_archive import write_archive
+from task_files import COMPLETIONS_FILE, RECURRING_FILE, SINGLE_FILE, read_task_file, write_task_file
+
+LEGACY_FILES = ['tasks.json', 'tasks-backup.json']
+INSTANCE_FIELDS = ('id', 'date', 'completed', 'recurrenceId')
+
+
+def _fingerprint(task):
+    """What an instance shares with its template"""
+    return json.dumps({k: v for k, v in task.items() if k not in INSTANCE_FIELDS}, sort_keys=True)
+
+
+def load_legacy(paths):
+    """Legacy tasks from every file, deduplicated by id (earlier files win)"""
+    tasks = {}
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            continue
+        for task in json.loads(path.read_text() or '[]'):
+            if task.get('id'):
+                tasks.setdefault(task['id'], task)
+    return list(tasks.values())
+
+
+def split_legacy(tasks):
+    """(templates, single_tasks, completions) for a list of legacy tasks"""
+    series = defaultdict(list)
+    single_tasks = []
+    for task in tasks:
+        if task.get('recurrenceId') and task.get('recurrence') and task.get('date'):
+            series[task['recurrenceId']].append(task)
+        else:
+            single_tasks.append({k: v for k, v in task.items() if k not in ('recurrence', 'recurrenceId')})
+
+    templates, completions = [], {}
+    for series_id, instances in series.items():
+        # The same date can appear twice when both legacy files have the series
+        by_date = {}
+        for task in sorted(instances, key=lambda t: t['date']):
+            by_date.setdefault(task['date'], task)
+        instances = list(by_date.values())
+
+        # The most common shape is the template; the rest were edited by hand
+        shape = Counter(_fingerprint(task) for task in instances).most_common(1)[0][0]
+        first = instances[0]
+        exemplar = next(task for task in instances if _fingerprint(task) == shape)
+        template = {'id': series_id, **{k: v for k, v in exemplar.items() if k not in INSTANCE_FIELDS}}
+        template['recurrence'] = {**template['recurrence'],
+                                  'startDate': template['recurrence'].get('startDate') or first['date']}
+        last = date.fromisoformat(instances[-1]['date'])
+        produced = {day.isoformat() for day in template_dates(template, date.fromisoformat(first['date']), last)}
+
+        done = {}
+        for task in instances:
+            if task['date'] in produced and _fingerprint(task) == shape:
+                if task.get('completed'):
+                    done[task['date']] = True
+            else:
+                single_tasks.append({k: v for k, v in task.items() if k not in ('recurrence', 'recurrenceId')})
+        templates.append(template)
+        if done:
+            completions[series_id] = done
+    return templates, single_tasks, completions
+
+
+def migrate(schedule_dir, legacy_files=LEGACY_FILES, write=False, archive=None):
+    """Merge the legacy files into the split files; returns a summary dict"""
+    schedule_dir = Path(schedule_dir)
+    legacy = load_legacy(schedule_dir / name for name in legacy_files)
+    templates, singles, completions = split_legacy(legacy)
+
+    recurring, recurring_version = read_task_file(schedule_dir / RECURRING_FILE)
+    single, single_version = read_task_file(schedule_dir / SINGLE_FILE)
+    done, done_version = read_task_file(schedule_dir / COMPLETIONS_FILE)
+    recurring_ids = {t.get('id') for t in recurring}
+    single_ids = {t.get('id') for t in single}
+    new_templates = [t for t in templates if t['id'] not in recurring_ids]
+    new_singles = [t for t in singles if t['id'] not in single_ids]
+    # Completions of a template that was skipped belong to the existing one - leave them alone
+    new_completions = {series_id: dates for series_id, dates in completions.items()
+                       if series_id not in recurring_ids}
+
+    summary = {
+        "legacyTasks": len(legacy),
+        "templates": len(new_templates),
+        "singleTasks": len(new_singles),
+        "completions": sum(len(dates) for dates in new_completions.values()),
+        "skipped": len(templates) - len(new_templates) + len(singles) - len(new_singles),
+    }
+    if write:
+        # Raises VersionConflict if the server or Claude wrote a file since it was read
+        write_task_file(schedule_dir / RECURRING_FILE, recurring + new_templates, recurring_version)
+        write_task_file(schedule_dir / SINGLE_FILE, single + new_singles, single_version)
+        for series_id, dates in new_completions.items():
+            done.setdefault(series_id, {}).update(dates)
+        write_task_file(schedule_dir / COMPLETIONS_FILE, done, done_version)
+    if archive:
+        summary["archiveBytes"] = write_archive(archive, legacy)
+        summary["legacyBytes"] = sum((schedule_dir / name).stat().st_size
+                                     for name in legacy_files if (schedule_dir / name).exists())
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert legacy tasks.json files to the split task files")
+    parser.add_argument('files', nargs='*', default=LEGACY_FILES, help="legacy files to read")
+    parser.add_argument('--write', action='store_true', help="update the split files (default: dry run)")
+    parser.add_argument('--archive', help="also write every legacy task to this archive file")
+    args = parser.parse_args()
+    print(json.dumps(migrate(Path(__file__).parent, args.files, args.write, args.archive), indent=2))
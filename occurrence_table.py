@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Occurrence Table - Bulk, column-oriented expansion of tasks for long date ranges
+
+recurrence.py is built for rendering a screen of days. For analytics over
+months or years ("workout hours in Q3", "free 30-minute slots in the next
+90 days") this expands every template at once with NumPy date arithmetic
+into parallel arrays:
+
+    day       - days since 1970-01-01
+    start     - start minute of the day (-1 if the task has no time)
+    end       - end minute of the day (-1 if the task has no time)
+    record    - index into table.records (templates first, then single tasks)
+    completed - completion flag from task-completions.json / single tasks
+
+Requires numpy (pip install numpy).
+
+Usage: python3 occurrence_table.py 2025-07-01 2025-09-30
+"""
+import json
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from recurrence import UNIT_BY_TYPE, parse_date
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_epoch_day(value):
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def from_epoch_day(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def parse_minutes(value):
+    """'HH:MM' -> minutes after midnight, -1 if missing"""
+    if not value:
+        return -1
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def template_days(recurrence, first_day, last_day):
+    """Epoch days a recurrence occurs on within [first_day, last_day]"""
+    unit = UNIT_BY_TYPE.get(recurrence.get('type'), recurrence.get('frequency', 'days'))
+    interval = max(1, int(recurrence.get('interval') or 1))
+    start = parse_date(recurrence.get('startDate'))
+    if not start:
+        return np.empty(0, dtype=np.int64)
+    start_day = to_epoch_day(start)
+
+    end = recurrence.get('end', 'never')
+    if end == 'on' and recurrence.get('endDate'):
+        last_day = min(last_day, to_epoch_day(recurrence['endDate']))
+    count = int(recurrence.get('count') or 0) if end == 'after' else None
+    if last_day < max(start_day, first_day) or count == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if unit in ('days', 'weeks'):
+        step = interval * (7 if unit == 'weeks' else 1)
+        first_index = max(0, -(-(first_day - start_day) // step))
+        last_index = (last_day - start_day) // step
+        if count is not None:
+            last_index = min(last_index, count - 1)
+        return start_day + step * np.arange(first_index, last_index + 1, dtype=np.int64)
+
+    # Month-based: candidate dates share the start's day of month; drop months
+    # that don't have that day (they overflow into the next month)
+    months = interval * (12 if unit == 'years' else 1)
+    start_month = np.datetime64(start, 'M')
+    span = (np.datetime64(int(last_day), 'D').astype('datetime64[M]') - start_month).astype(np.int64)
+    month_starts = start_month + months * np.arange(span // months + 1)
+    days = month_starts.astype('datetime64[D]') + (start.day - 1)
+    days = days[days.astype('datetime64[M]') == month_starts].astype(np.int64)
+    if count is not None:
+        days = days[:count]
+    return days[(days >= first_day) & (days <= last_day)]
+
+
+class OccurrenceTable:
+    """Expanded occurrences of every task in a date range, stored as columns"""
+
+    def __init__(self, records, day, start, end, record, completed, first_day, last_day):
+        self.records = records
+        self.day = day
+        self.start = start
+        self.end = end
+        self.record = record
+        self.completed = completed
+        self.first_day = first_day
+        self.last_day = last_day
+
+    @classmethod
+    def build(cls, recurring_tasks, single_tasks, completions, range_start, range_end):
+        first_day, last_day = to_epoch_day(range_start), to_epoch_day(range_end)
+        records = [t for t in recurring_tasks if t.get('recurrence')]
+        days, record_ids, done = [], [], []
+
+        for index, template in enumerate(records):
+            occurrences = template_days(template['recurrence'], first_day, last_day)
+            days.append(occurrences)
+            record_ids.append(np.full(len(occurrences), index, dtype=np.int32))
+            completed_dates = [d for d, value in completions.get(template['id'], {}).items() if value]
+            if completed_dates:
+                done.append(np.isin(occurrences, np.array(completed_dates, dtype='datetime64[D]').astype(np.int64)))
+            else:
+                done.append(np.zeros(len(occurrences), dtype=bool))
+
+        singles = [t for t in single_tasks
+                   if t.get('date') and first_day <= to_epoch_day(t['date']) <= last_day]
+        if singles:
+            days.append(np.array([to_epoch_day(t['date']) for t in singles], dtype=np.int64))
+            record_ids.append(np.arange(len(records), len(records) + len(singles), dtype=np.int32))
+            done.append(np.array([bool(t.get('completed')) for t in singles]))
+        records = records + singles
+
+        record = np.concatenate(record_ids) if record_ids else np.empty(0, dtype=np.int32)
+        starts = np.array([parse_minutes(r.get('startTime')) for r in records] or [0], dtype=np.int16)
+        ends = np.array([parse_minutes(r.get('endTime')) for r in records] or [0], dtype=np.int16)
+        return cls(
+            records,
+            day=np.concatenate(days).astype(np.int32) if days else np.empty(0, dtype=np.int32),
+            start=starts[record] if len(record) else np.empty(0, dtype=np.int16),
+            end=ends[record] if len(record) else np.empty(0, dtype=np.int16),
+            record=record,
+            completed=np.concatenate(done) if done else np.empty(0, dtype=bool),
+            first_day=first_day,
+            last_day=last_day,
+        )
+
+    @classmethod
+    def from_files(cls, schedule_dir, range_start, range_end):
+        schedule_dir = Path(schedule_dir)
+        def load(name, default):
+            path = schedule_dir / name
+            return json.loads(path.read_text()) if path.exists() else default
+        return cls.build(
+            load('recurring-tasks.json', []),
+            load('single-tasks.json', []),
+            load('task-completions.json', {}),
+            range_start,
+            range_end,
+        )
+
+    def __len__(self):
+        return len(self.day)
+
+    def field_mask(self, field, values):
+        """Mask of occurrences whose record has `field` in values"""
+        values = set(values)
+        matches = np.array([r.get(field) in values for r in self.records] or [False])
+        return matches[self.record] if len(self.record) else np.zeros(0, dtype=bool)
+
+    def select(self, types=None, titles=None, range_start=None, range_end=None, completed=None):
+        mask = np.ones(len(self), dtype=bool)
+        if types is not None:
+            mask &= self.field_mask('type', types)
+        if titles is not None:
+            mask &= self.field_mask('title', titles)
+        if range_start is not None:
+            mask &= self.day >= to_epoch_day(range_start)
+        if range_end is not None:
+            mask &= self.day <= to_epoch_day(range_end)
+        if completed is not None:
+            mask &= self.completed == completed
+        return mask
+
+    def durations(self):
+        """Minutes per occurrence (0 for untimed tasks, wraps past midnight)"""
+        timed = (self.start >= 0) & (self.end >= 0)
+        minutes = (self.end.astype(np.int32) - self.start) % MINUTES_PER_DAY
+        return np.where(timed, minutes, 0)
+
+    def total_minutes(self, **filters):
+        return int(self.durations()[self.select(**filters)].sum())
+
+    def minutes_by(self, field, **filters):
+        """Total minutes grouped by a record field such as 'type' or 'title'"""
+        mask = self.select(**filters)
+        per_record = np.bincount(self.record[mask], weights=self.durations()[mask],
+                                 minlength=len(self.records))
+        totals = {}
+        for record, minutes in zip(self.records, per_record):
+            key = record.get(field) or 'other'
+            totals[key] = totals.get(key, 0) + int(minutes)
+        return {key: minutes for key, minutes in totals.items() if minutes}
+
+    def count_by_record(self, **filters):
+        mask = self.select(**filters)
+        counts = np.bincount(self.record[mask], minlength=len(self.records))
+        return {record['id']: int(n) for record, n in zip(self.records, counts) if n}
+
+    def completion_rate(self, **filters):
+        mask = self.select(**filters)
+        return float(self.completed[mask].mean()) if mask.any() else 0.0
+
+    def busy_matrix(self):
+        """days x minutes boolean matrix of time taken by timed occurrences"""
+        ndays = self.last_day - self.first_day + 1
+        diff = np.zeros((ndays, MINUTES_PER_DAY + 1), dtype=np.int32)
+        timed = (self.start >= 0) & (self.end >= 0)
+        same_day = timed & (self.end > self.start)
+        # Overnight occurrences (end before start, as durations() wraps them) run to
+        # midnight and go on from 00:00 the next day
+        overnight = timed & (self.end < self.start)
+        rows = self.day - self.first_day
+        row = np.concatenate([rows[same_day], rows[overnight], rows[overnight] + 1])
+        start = np.concatenate([self.start[same_day], self.start[overnight],
+                                np.zeros(overnight.sum(), dtype=self.start.dtype)])
+        end = np.concatenate([self.end[same_day], np.full(overnight.sum(), MINUTES_PER_DAY, dtype=self.end.dtype),
+                              self.end[overnight]])
+        inside = row < ndays
+        np.add.at(diff, (row[inside], start[inside]), 1)
+        np.add.at(diff, (row[inside], end[inside]), -1)
+        return np.cumsum(diff, axis=1)[:, :MINUTES_PER_DAY] > 0
+
+    def free_slots(self, minutes, day_start='08:00', day_end='22:00'):
+        """Free gaps of at least `minutes` between day_start and day_end on every day"""
+        window_start, window_end = parse_minutes(day_start), parse_minutes(day_end)
+        free = ~self.busy_matrix()[:, window_start:window_end]
+
+        # Pad with busy columns so every free run has a start and an end edge
+        padded = np.pad(free, ((0, 0), (1, 1))).astype(np.int8)
+        edges = np.diff(padded, axis=1)
+        run_rows, run_starts = np.nonzero(edges == 1)
+        _, run_ends = np.nonzero(edges == -1)
+        long_enough = (run_ends - run_starts) >= minutes
+
+        return [
+            {"date": from_epoch_day(self.first_day + row),
+             "start": f"{(window_start + s) // 60:02d}:{(window_start + s) % 60:02d}",
+             "end": f"{(window_start + e) // 60:02d}:{(window_start + e) % 60:02d}"}
+            for row, s, e in zip(run_rows[long_enough], run_starts[long_enough], run_ends[long_enough])
+        ]
+
+    def summary(self):
+        """Aggregates served by /api/analytics"""
+        return {
+            "from": from_epoch_day(self.first_day),
+            "to": from_epoch_day(self.last_day),
+            "occurrences": len(self),
+            "totalMinutes": self.total_minutes(),
+            "minutesByType": self.minutes_by('type'),
+            "minutesByTitle": self.minutes_by('title'),
+            "completionRate": round(self.completion_rate(), 3),
+        }
+
+
+if __name__ == "__main__":
+    range_start = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else date.today()
+    range_end = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else date(range_start.year, 12, 31)
+    table = OccurrenceTable.from_files(Path(__file__).parent, range_start, range_end)
+    print(json.dumps(table.summary(), indent=2))
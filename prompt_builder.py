@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Prompt Builder - The part of the schedule a Claude request is about
+
+Instead of telling Claude to go and read the task files, each request is
+sent with the real current date and a small, bounded slice of the schedule:
+
+- every occurrence on the dates the request mentions (today and tomorrow
+  when it mentions none, the whole week for "this week"/"next week")
+- other single tasks and recurring templates whose title or type matches
+  the words in the request
+- anything overlapping a time the request asks for
+
+One line per task keeps the slice compact. Claude still edits the files
+itself, but it only needs to open a file when it is about to change it.
+"""
+import re
+from datetime import date, datetime, timedelta
+
+from command_parser import TYPE_KEYWORDS, extract_when, title_tokens
+from interval_index import task_interval
+from recurrence import expand_occurrences
+
+MAX_DATES = 8
+MAX_MATCHES = 15
+MAX_PROMPT_CHARS = 6000
+
+CLAUDE_INSTRUCTIONS = """You are integrated into a Schedule app. Its data lives in three files:
+- {schedule_dir}/recurring-tasks.json - Stores recurring task templates
+- {schedule_dir}/single-tasks.json - Stores one-time tasks
+- {schedule_dir}/task-completions.json - Stores completion states for recurring tasks: {{"templateId": {{"YYYY-MM-DD": true}}}}
+
+DO NOT edit tasks.json anymore - it's deprecated. Use the files above.
+
+Every request comes with the current date and the part of the schedule it is about, so answer questions from that. Only open a file when you are about to change it, and change only the records you need.
+
+Single task format: {{"id": "claude_timestamp", "title": "Task Name", "description": "Brief markdown description", "type": "work|exercise|meal|meeting|personal|health|social|other", "date": "YYYY-MM-DD", "completed": false, "startTime": "HH:MM", "endTime": "HH:MM"}}
+
+Recurring task format: {{"id": "claude_timestamp", "title": "Task Name", "description": "...", "type": "...", "startTime": "HH:MM", "endTime": "HH:MM", "recurrence": {{"type": "daily|weekly|monthly", "interval": 1, "frequency": "days", "startDate": "YYYY-MM-DD", "end": "never"}}}}"""
+
+
+def claude_instructions(schedule_dir):
+    """Standing instructions - the same for every request, so warm sessions get them once"""
+    return CLAUDE_INSTRUCTIONS.format(schedule_dir=schedule_dir)
+
+
+def _times(task):
+    if not task.get('startTime'):
+        return "all day"
+    return task['startTime'] + (f"-{task['endTime']}" if task.get('endTime') else "")
+
+
+def describe_task(task, with_date=False):
+    """One compact line per task"""
+    parts = [task['date']] if with_date and task.get('date') else []
+    parts += [_times(task), task.get('title') or '(untitled)', f"[{task.get('type') or 'other'}]"]
+    if task.get('recurrenceId'):
+        parts.append(f"recurring id={task['recurrenceId']}")
+    else:
+        parts.append(f"id={task.get('id')}")
+    if task.get('completed'):
+        parts.append("done")
+    return ' '.join(parts)
+
+
+def describe_template(template):
+    recurrence = template.get('recurrence') or {}
+    every = recurrence.get('type', 'custom')
+    if int(recurrence.get('interval') or 1) > 1:
+        every += f" x{recurrence['interval']}"
+    if recurrence.get('startDate'):
+        every += f" from {recurrence['startDate']}"
+    if recurrence.get('end') == 'on' and recurrence.get('endDate'):
+        every += f" until {recurrence['endDate']}"
+    elif recurrence.get('end') == 'after':
+        every += f" for {recurrence.get('count')} times"
+    return (f"{_times(template)} {template.get('title') or '(untitled)'} "
+            f"[{template.get('type') or 'other'}] id={template.get('id')} {every}")
+
+
+def _stems(words):
+    """Crude plural folding, so 'workouts' finds a task titled 'Workout'"""
+    return {word[:-1] if len(word) > 3 and word.endswith('s') else word for word in words}
+
+
+def _runs(dates):
+    """Sorted dates grouped into runs of consecutive days"""
+    runs = []
+    for day in sorted(dates):
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+class PromptBuilder:
+    """Builds the per-request prompt from the current task data"""
+
+    def __init__(self, now=None, max_chars=MAX_PROMPT_CHARS):
+        self.now = now or datetime.now()
+        self.today = self.now.date()
+        self.max_chars = max_chars
+
+    def requested_dates(self, text):
+        """Dates the text mentions, plus the time window of the first one that has a time"""
+        dates, window = [], None
+        text = text.lower()
+        for _ in range(MAX_DATES):
+            when, rest = extract_when(text, self.today)
+            if not when.date or rest == text:
+                break
+            dates.append(when.date)
+            if when.start and not window:
+                window = (when.date, when.start, when.end)
+            text = rest
+
+        words = set(re.findall(r'\w+', text))
+        if 'week' in words:
+            first = self.today + timedelta(days=7 - self.today.weekday()) if 'next' in words else self.today
+            dates += [first + timedelta(days=i) for i in range(7)]
+        if not dates:
+            dates = [self.today, self.today + timedelta(days=1)]
+        return sorted(set(dates))[:MAX_DATES], window
+
+    def matching(self, text, single_tasks, templates):
+        """Tasks and templates whose title shares a word with the text, else those whose type it names"""
+        words = _stems(title_tokens(text))
+        by_title = lambda tasks: [task for task in tasks
+                                  if _stems(title_tokens(task.get('title') or '')) & words]
+        singles, recurring = by_title(single_tasks), by_title(templates)
+        if singles or recurring:
+            return singles, recurring
+        types = {task_type for task_type, keywords in TYPE_KEYWORDS.items()
+                 if words & _stems(keywords) or task_type in words}
+        by_type = lambda tasks: [task for task in tasks if task.get('type') in types]
+        return by_type(single_tasks), by_type(templates)
+
+    def build(self, message, single_tasks, recurring_tasks, completions):
+        # The chat sends recent history ahead of the newest message; names in the history
+        # still help ("move it"), but only the newest message's time is being asked for
+        latest = message.rsplit('\nUser: ', 1)[-1]
+        dates, _ = self.requested_dates(message)
+        _, window = self.requested_dates(latest)
+
+        days = {}
+        for run in _runs(dates):
+            expanded = expand_occurrences(recurring_tasks, single_tasks, completions, run[0], run[-1])
+            days.update((day, tasks) for day, tasks in expanded.items() if date.fromisoformat(day) in dates)
+
+        sections = [f"Current date: {self.now.strftime('%A')} {self.today.isoformat()}, {self.now.strftime('%H:%M')}"]
+
+        lines = []
+        for day, tasks in days.items():
+            lines.append(f"{day} {date.fromisoformat(day).strftime('%a')}")
+            lines += [f"  {describe_task(task)}" for task in tasks] or ["  (nothing scheduled)"]
+        sections.append("Schedule on the dates in this request:\n" + "\n".join(lines))
+
+        if window:
+            day, start, end = window
+            requested = task_interval(day, {"startTime": start, "endTime": end})
+            overlapping = [task for task in days.get(day.isoformat(), [])
+                           if (interval := task_interval(day, task))
+                           and interval[0] < requested[1] and requested[0] < interval[1]]
+            if overlapping:
+                sections.append(f"Already scheduled around {day.isoformat()} {start}:\n"
+                                + "\n".join(f"  {describe_task(task)}" for task in overlapping))
+
+        listed = {task.get('id') for tasks in days.values() for task in tasks}
+        singles, templates = self.matching(message, single_tasks,
+                                           [t for t in recurring_tasks if t.get('recurrence')])
+        upcoming = sorted(
+            (task for task in singles
+             if task.get('id') not in listed and task.get('date', '') >= self.today.isoformat()),
+            key=lambda task: (task.get('date', ''), task.get('startTime') or ''))
+        if upcoming:
+            sections.append("Other upcoming tasks matching the request:\n" + "\n".join(
+                f"  {describe_task(task, with_date=True)}" for task in upcoming[:MAX_MATCHES]))
+        if templates:
+            sections.append("Recurring templates matching the request:\n" + "\n".join(
+                f"  {describe_template(template)}" for template in templates[:MAX_MATCHES]))
+
+        context = self._bounded("\n\n".join(sections))
+        return f"""{context}
+
+User request: {message}
+
+Execute now and respond briefly with what you did:"""
+
+    def _bounded(self, text):
+        if len(text) <= self.max_chars:
+            return text
+        cut = text.rfind('\n', 0, self.max_chars)
+        omitted = text.count('\n', cut + 1) + 1
+        return text[:cut] + f"\n  ... {omitted} more lines not shown (read the files if you need them)"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Recurrence - Expand recurring task templates into dated occurrences
+
+Handles the recurrence objects stored in recurring-tasks.json:
+  {"type": "daily|weekly|monthly|yearly|custom", "interval": 1,
+   "frequency": "days|weeks|months|years", "startDate": "YYYY-MM-DD",
+   "end": "never|after|on", "count": 10, "endDate": "YYYY-MM-DD"}
+
+Rules match TaskManager.shouldShowTaskOnDate in task-manager.js: monthly and
+yearly tasks land on the start date's day of month and skip months that
+don't have it (e.g. the 31st). A rule that doesn't parse (a bad date,
+interval or count) is logged and has no dates.
+"""
+import json
+import logging
+from datetime import date, timedelta
+from functools import lru_cache
+
+log = logging.getLogger(__name__)
+
+UNIT_BY_TYPE = {'daily': 'days', 'weekly': 'weeks', 'monthly': 'months', 'yearly': 'years'}
+
+
+def parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def add_months(start, months):
+    """start + months, or None if that month has no such day"""
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    try:
+        return start.replace(year=year, month=month)
+    except ValueError:
+        return None
+
+
+class RecurrenceRule:
+    """A parsed recurrence object that can list its dates in a range"""
+
+    def __init__(self, recurrence):
+        self.unit, self.interval, self.start, self.end_date, self.count = 'days', 1, None, None, None
+        try:
+            self.unit = UNIT_BY_TYPE.get(recurrence.get('type'), recurrence.get('frequency', 'days'))
+            self.interval = max(1, int(recurrence.get('interval') or 1))
+            self.start = parse_date(recurrence.get('startDate'))
+            end = recurrence.get('end', 'never')
+            self.end_date = parse_date(recurrence.get('endDate')) if end == 'on' else None
+            self.count = int(recurrence.get('count') or 0) if end == 'after' else None
+            if self.count is not None and self.count < 0:
+                raise ValueError(f"count {self.count} is negative")
+        except (ValueError, TypeError, AttributeError) as e:
+            log.warning("Ignoring invalid recurrence rule", extra={"recurrence": recurrence, "error": str(e)})
+            self.start = None  # no dates
+
+    def _step_days(self):
+        return self.interval * (7 if self.unit == 'weeks' else 1)
+
+    def dates_between(self, range_start, range_end):
+        """Occurrence dates d with range_start <= d <= range_end, in order"""
+        if not self.start or self.count == 0:
+            return []
+        last = range_end if not self.end_date else min(range_end, self.end_date)
+        if last < self.start or last < range_start:
+            return []
+
+        if self.unit in ('days', 'weeks'):
+            # Constant step - jump straight to the first occurrence in range
+            step = self._step_days()
+            first_index = max(0, -(-(range_start - self.start).days // step))
+            last_index = (last - self.start).days // step
+            if self.count is not None:
+                last_index = min(last_index, self.count - 1)
+            return [self.start + timedelta(days=step * i) for i in range(first_index, last_index + 1)]
+
+        # Months/years - skipped months don't count towards `count`, so walk from the start
+        months = self.interval * (12 if self.unit == 'years' else 1)
+        dates = []
+        produced = 0
+        n = 0
+        while True:
+            current = add_months(self.start, months * n)
+            n += 1
+            if current is None:
+                if n > 12 * 400:
+                    break
+                continue
+            if current > last:
+                break
+            produced += 1
+            if current >= range_start:
+                dates.append(current)
+            if self.count is not None and produced >= self.count:
+                break
+        return dates
+
+
+@lru_cache(maxsize=512)
+def _rule_for(recurrence_key):
+    return RecurrenceRule(json.loads(recurrence_key))
+
+
+@lru_cache(maxsize=4096)
+def _cached_dates(recurrence_key, range_start, range_end):
+    return tuple(_rule_for(recurrence_key).dates_between(range_start, range_end))
+
+
+def template_dates(template, range_start, range_end):
+    """Dates a recurring template occurs on, cached per template recurrence and range"""
+    key = json.dumps(template.get('recurrence') or {}, sort_keys=True)
+    return _cached_dates(key, range_start, range_end)
+
+
+def make_instance(template, date_str, completions):
+    """Build a dated instance the same way TaskManager.createTaskInstance does"""
+    return {
+        **template,
+        'id': f"{template['id']}_{date_str}",
+        'date': date_str,
+        'completed': bool(completions.get(template['id'], {}).get(date_str, False)),
+        'recurrenceId': template['id'],
+    }
+
+
+def expand_occurrences(recurring_tasks, single_tasks, completions, range_start, range_end):
+    """Merged single + recurring tasks per day, each day sorted by startTime"""
+    days = {}
+    for offset in range((range_end - range_start).days + 1):
+        days[(range_start + timedelta(days=offset)).isoformat()] = []
+
+    start_str, end_str = range_start.isoformat(), range_end.isoformat()
+    for task in single_tasks:
+        task_date = task.get('date')
+        if task_date and start_str <= task_date <= end_str:
+            days[task_date].append(task)
+
+    for template in recurring_tasks:
+        if not template.get('recurrence'):
+            continue
+        try:
+            instances = [make_instance(template, occurrence.isoformat(), completions)
+                         for occurrence in template_dates(template, range_start, range_end)]
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            # One broken template mustn't take every other task's occurrences with it
+            log.warning("Skipping recurring template", extra={"template": template.get('id'), "error": str(e)})
+            continue
+        for instance in instances:
+            days[instance['date']].append(instance)
+
+    for tasks in days.values():
+        tasks.sort(key=lambda t: str(t.get('startTime') or ''))
+    return days
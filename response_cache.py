@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Response Cache - Reuse Claude answers and share identical requests in flight
+
+Answers are keyed on the normalized message, today's date and the version
+of every task file, so any save makes old answers unreachable; saves also
+clear the cache outright. Entries expire after a TTL and the least
+recently used are dropped past a size limit.
+
+single_flight() makes identical requests that arrive while one is still
+running share it instead of starting another claude process.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+CACHE_TTL = int(os.environ.get("CLAUDE_CACHE_TTL", "600"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CLAUDE_CACHE_MAX_ENTRIES", "128"))
+
+
+def normalize_message(message):
+    """Case, whitespace and trailing punctuation don't change the question"""
+    return re.sub(r'\s+', ' ', message).strip().lower().rstrip('?!. ')
+
+
+class ResponseCache:
+    """TTL + LRU cache of Claude answers with single-flight request sharing"""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires, response)
+        self.in_flight = {}           # key -> whatever single_flight's start() returned
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def key(self, message, versions):
+        return (normalize_message(message), date.today().isoformat(), tuple(sorted(versions.items())))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+    def single_flight(self, key, start):
+        """(value, started): the in-flight value for key, or start() registered as it"""
+        with self.lock:
+            if key in self.in_flight:
+                self.coalesced += 1
+                return self.in_flight[key], False
+            value = self.in_flight[key] = start()
+            return value, True
+
+    def finish(self, key):
+        with self.lock:
+            self.in_flight.pop(key, None)
@@ -12,20 +12,11 @@ if [ ! -f "$HTML_FILE" ]; then
     exit 1
 fi
 
-# Function to find available port
-find_available_port() {
-    local port=8000
-    while netstat -ln 2>/dev/null | grep -q ":$port "; do
-        port=$((port + 1))
-    done
-    echo $port
-}
-
 # Get local IP address
 LOCAL_IP=$(ip addr show | grep "inet " | grep -v "127.0.0.1" | head -1 | awk '{print $2}' | cut -d'/' -f1)
 
-# Start local web server
-PORT=$(find_available_port)
+# The API server also serves the app itself
+PORT=8001
 echo "Starting Schedule app server on port $PORT..."
 echo "Access URLs:"
 echo "  Local: http://localhost:$PORT"
@@ -33,15 +24,10 @@ if [ ! -z "$LOCAL_IP" ]; then
     echo "  Network: http://$LOCAL_IP:$PORT"
 fi
 
-# Start Claude API server in background
 cd "$SCRIPT_DIR"
 python3 api-server.py &
 API_PID=$!
 
-# Start server in background
-python3 -m http.server $PORT --bind 0.0.0.0 &
-SERVER_PID=$!
-
 # Wait a moment for server to start
 sleep 2
 
@@ -62,8 +48,7 @@ else
 fi
 
 echo "Schedule app is running with Claude integration!"
-echo "Web Server PID: $SERVER_PID (port $PORT)"
-echo "Claude API PID: $API_PID (port 8001)"
+echo "Server PID: $API_PID (port $PORT)"
 if [ ! -z "$LOCAL_IP" ]; then
     echo ""
     echo "📱 Phone access: http://$LOCAL_IP:$PORT"
@@ -73,8 +58,7 @@ echo "Press Ctrl+C to stop all servers"
 # Function to cleanup on exit
 cleanup() {
     echo ""
-    echo "Stopping web server and Claude API..."
-    kill $SERVER_PID 2>/dev/null
+    echo "Stopping server..."
     kill $API_PID 2>/dev/null
     exit 0
 }
@@ -83,4 +67,4 @@ cleanup() {
 trap cleanup SIGINT SIGTERM
 
 # Keep script running
-wait $SERVER_PID
\ No newline at end of file
+wait $API_PID
\ No newline at end of file
@@ -18,7 +18,11 @@ class ScheduleApp {
     }
 
     getApiBaseUrl() {
-        // Use the same host as the current page but port 8001 for API
+        // The API server also serves the app, so normally it's the page's own origin;
+        // pages opened some other way still reach it on the same host at port 8001
+        if (window.location.port === '8001') {
+            return window.location.origin;
+        }
         const host = window.location.hostname;
         return `http://${host}:8001`;
     }
@@ -115,6 +119,34 @@ class ScheduleApp {
         this.render();
     }
 
+    visibleRange() {
+        // First and last dates shown by the current view
+        if (this.currentView === 'month') {
+            const start = new Date(this.currentDate.getFullYear(), this.currentDate.getMonth(), 1);
+            start.setDate(start.getDate() - start.getDay());
+            const end = new Date(start);
+            end.setDate(start.getDate() + 41);
+            return [start, end];
+        } else if (this.currentView === 'week') {
+            const start = new Date(this.selectedDate);
+            start.setDate(this.selectedDate.getDate() - this.selectedDate.getDay());
+            const end = new Date(start);
+            end.setDate(start.getDate() + 6);
+            return [start, end];
+        }
+        return [new Date(this.selectedDate), new Date(this.selectedDate)];
+    }
+
+    async prefetchOccurrences() {
+        // Render locally first, then swap in the server's expansion for the visible range
+        const [start, end] = this.visibleRange();
+        if (this.taskManager.hasOccurrences(start, end)) return;
+        const loaded = await this.taskManager.loadOccurrences(start, end);
+        if (loaded && this.taskManager.hasOccurrences(start, end)) {
+            this.render();
+        }
+    }
+
     render() {
         // Save scroll position for day view
         const timeTable = document.getElementById('timeTable');
@@ -129,6 +161,7 @@ class ScheduleApp {
             this.renderDayView();
         }
         this.renderTasks();
+        this.prefetchOccurrences();
         
         // Re-render time table tasks if in day view and restore scroll
         if (this.currentView === 'day') {
@@ -1043,7 +1076,33 @@ class ScheduleApp {
     startFileWatcher() {
         this.lastModified = null;
         this.isWatching = true;
-        this.watchFile();
+        if (window.EventSource) {
+            this.watchEvents();
+        } else {
+            this.watchFile();
+        }
+    }
+
+    watchEvents() {
+        // The API server pushes an event whenever a task file changes
+        this.eventSource = new EventSource(`${this.apiBaseUrl}/api/events`);
+        this.eventSource.addEventListener('change', async (message) => {
+            const event = JSON.parse(message.data);
+            console.log(`File ${event.file} changed (${event.source})`);
+            const result = this.taskManager.applyChange(event);
+            if (result === 'current') return;
+            if (!result) {
+                await this.taskManager.loadTasks();
+            }
+            this.render();
+            if (event.source === 'claude') {
+                this.showNotification('🤖 Claude updated your schedule!');
+            }
+        });
+        this.eventSource.onerror = () => {
+            // EventSource reconnects by itself and replays what we missed
+            console.log('Change stream interrupted, reconnecting...');
+        };
     }
 
     async watchFile() {
@@ -1055,7 +1114,7 @@ class ScheduleApp {
             let hasChanges = false;
             
             for (const file of files) {
-                const response = await fetch(`./${file}?t=` + Date.now(), { method: 'HEAD' });
+                const response = await fetch(`./${file}`, { method: 'HEAD', cache: 'no-cache' });
                 if (response.ok) {
                     const lastModified = response.headers.get('Last-Modified');
                     const fileKey = `lastModified_${file.replace('.json', '').replace('-', '_')}`;
@@ -1092,6 +1151,10 @@ class ScheduleApp {
 
     stopFileWatcher() {
         this.isWatching = false;
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
     }
 
     toggleChat() {
@@ -1162,7 +1225,10 @@ class ScheduleApp {
         this.userIsEditing = false; // Ensure Claude changes will show notifications
         
         // Send request to Claude API and get response (with chat history)
-        const response = await this.sendToBridge(requestId, userMessage);
+        const response = await this.sendToBridge(requestId, userMessage, (partial) => {
+            loadingDiv.innerHTML = `<strong>Claude:</strong> ${this.formatClaudeOutput(partial)}`;
+            messages.scrollTop = messages.scrollHeight;
+        });
         
         // Calculate final response time
         const finalTime = ((Date.now() - startTime) / 1000).toFixed(1);
@@ -1184,12 +1250,13 @@ class ScheduleApp {
         messages.scrollTop = messages.scrollHeight;
     }
 
-    async sendToBridge(requestId, message) {
+    async sendToBridge(requestId, message, onOutput = null) {
         try {
             // Build context with recent chat history
             const contextWithHistory = this.buildContextWithHistory(message);
             
-            const response = await fetch(`${this.apiBaseUrl}/api/claude`, {
+            // Start a background job - the server answers right away with its id
+            const response = await fetch(`${this.apiBaseUrl}/api/claude/jobs`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -1198,8 +1265,14 @@ class ScheduleApp {
             });
             
             if (response.ok) {
-                const data = await response.json();
-                return data.response;
+                const job = await response.json();
+                if (job.status === 'done') {
+                    // Simple commands are answered without starting Claude
+                    return job.response;
+                }
+                return await this.followClaudeJob(job.jobId, onOutput);
+            } else if (response.status === 503) {
+                return 'Claude is busy with other requests. Try again in a few seconds.';
             } else {
                 throw new Error('API request failed');
             }
@@ -1209,6 +1282,47 @@ class ScheduleApp {
         }
     }
 
+    followClaudeJob(jobId, onOutput) {
+        // Stream output with Server-Sent Events, falling back to polling if the stream drops
+        return new Promise((resolve) => {
+            let output = '';
+            const source = new EventSource(`${this.apiBaseUrl}/api/claude/jobs/${jobId}/stream`);
+            
+            source.addEventListener('output', (event) => {
+                output += JSON.parse(event.data).text;
+                if (onOutput) onOutput(output);
+            });
+            source.addEventListener('done', (event) => {
+                source.close();
+                resolve(JSON.parse(event.data).response);
+            });
+            source.onerror = () => {
+                source.close();
+                this.pollClaudeJob(jobId).then(resolve);
+            };
+        });
+    }
+
+    async pollClaudeJob(jobId) {
+        while (true) {
+            try {
+                const response = await fetch(`${this.apiBaseUrl}/api/claude/jobs/${jobId}`);
+                if (response.status === 404) {
+                    return 'Error: Claude request was lost. Please try again.';
+                }
+                if (response.ok) {
+                    const job = await response.json();
+                    if (job.status === 'done' || job.status === 'error') {
+                        return job.response;
+                    }
+                }
+            } catch (error) {
+                console.log('Claude job poll failed, retrying:', error.message);
+            }
+            await new Promise(r => setTimeout(r, 2000));
+        }
+    }
+
     async waitForResponse(requestId) {
         // Not needed anymore - we get immediate response from API
         return 'API response should be immediate';
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Static Files - In-memory, precompressed static assets for the API server
+
+Each asset is read once, hashed for a strong ETag and compressed ahead of
+time (gzip, plus brotli if the brotli module is installed). Entries are
+refreshed when the file's mtime or size changes, so editing script.js
+doesn't need a restart. Large files that aren't worth holding in memory
+are sent straight from disk with sendfile.
+"""
+import gzip
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files the app serves; anything else is a 404
+STATIC_FILES = ['index.html', 'script.js', 'task-manager.js', 'styles.css',
+                'recurring-tasks.json', 'single-tasks.json', 'task-completions.json', 'tasks.json']
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json')
+MIN_COMPRESS_BYTES = 1024
+SENDFILE_BYTES = 256 * 1024  # bigger files are streamed from disk, not cached
+
+
+class StaticEntry:
+    """One file's bytes and its precompressed variants"""
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.key = (stat.st_mtime_ns, stat.st_size)
+        self.size = stat.st_size
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type.endswith(('javascript', 'json')):
+            self.content_type += '; charset=utf-8'
+        self.bodies = {}
+        if self.size > SENDFILE_BYTES:
+            digest = hashlib.sha1(f"{path.name}:{self.key}".encode()).hexdigest()[:16]
+        else:
+            raw = path.read_bytes()
+            digest = hashlib.sha1(raw).hexdigest()[:16]
+            self.bodies['identity'] = raw
+            if self.content_type.startswith(COMPRESSIBLE_TYPES) and len(raw) >= MIN_COMPRESS_BYTES:
+                self.bodies['gzip'] = gzip.compress(raw, compresslevel=9, mtime=0)
+                if brotli:
+                    self.bodies['br'] = brotli.compress(raw)
+        # Each encoding is a different representation, so each gets its own strong ETag
+        self.etags = {encoding: f'"{digest}-{encoding}"' for encoding in ('identity', 'gzip', 'br')}
+
+    def choose(self, accept_encoding):
+        """Best encoding the client accepts that we have a body for"""
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.bodies:
+                return encoding
+        return 'identity'
+
+    def matches(self, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return bool(tags & set(self.etags.values()))
+
+
+class StaticFiles:
+    """Cache of StaticEntry objects for the files in STATIC_FILES"""
+
+    def __init__(self, root, names=STATIC_FILES):
+        self.root = Path(root)
+        self.names = set(names)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, url_path):
+        name = url_path.lstrip('/') or 'index.html'
+        return name if name in self.names else None
+
+    def get(self, name):
+        """Current entry for a file, rebuilt only when it has changed on disk"""
+        path = self.root / name
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            entry = self.entries.get(name)
+            if not entry or entry.key != (stat.st_mtime_ns, stat.st_size):
+                entry = self.entries[name] = StaticEntry(path, stat)
+            return entry
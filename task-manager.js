@@ -3,70 +3,149 @@ class TaskManager {
         this.recurringTasks = [];
         this.completions = {};
         this.singleTasks = [];
+        this.versions = {}; // Last known version (ETag) of each task file
+        this.occurrences = {}; // date -> tasks, expanded server-side by /api/occurrences
         this.apiBaseUrl = this.getApiBaseUrl();
     }
 
     getApiBaseUrl() {
-        // Use the same host as the current page but port 8001 for API
+        // The API server also serves the app, so normally it's the page's own origin;
+        // pages opened some other way still reach it on the same host at port 8001
+        if (window.location.port === '8001') {
+            return window.location.origin;
+        }
         const host = window.location.hostname;
         return `http://${host}:8001`;
     }
 
     async loadTasks() {
+        this.invalidateOccurrences();
         try {
-            // Load single tasks (non-recurring)
-            const singleResponse = await fetch('./single-tasks.json?t=' + Date.now());
-            if (singleResponse.ok) {
-                this.singleTasks = await singleResponse.json();
-            } else {
-                this.singleTasks = [];
+            // Load through the API so we also learn each file's version
+            const [singleTasks, recurringTasks, completions] = await Promise.all([
+                this.loadFile('single-tasks.json', []),
+                this.loadFile('recurring-tasks.json', []),
+                this.loadFile('task-completions.json', {})
+            ]);
+            this.singleTasks = singleTasks;
+            this.recurringTasks = recurringTasks;
+            this.completions = completions;
+        } catch (error) {
+            console.error('Error loading tasks:', error);
+            this.singleTasks = [];
+            this.recurringTasks = [];
+            this.completions = {};
+        }
+    }
+
+    async loadFile(filename, fallback) {
+        try {
+            const response = await fetch(`${this.apiBaseUrl}/api/tasks/${filename}`);
+            if (response.ok) {
+                const result = await response.json();
+                this.versions[filename] = result.version;
+                return result.content;
+            }
+        } catch (error) {
+            console.log(`API unavailable for ${filename}, reading it directly`);
+        }
+
+        const response = await fetch(`./${filename}`, { cache: 'no-cache' });
+        return response.ok ? await response.json() : fallback;
+    }
+
+    applyChange(event) {
+        // 'current' if we already have this version (our own save), 'applied' if the
+        // event's ops brought us up to date, null if the file needs reloading
+        if (this.versions[event.file] === event.version) {
+            return 'current';
+        }
+        if (event.ops && event.baseVersion && this.versions[event.file] === event.baseVersion) {
+            this.applyOps(event.file, event.ops);
+            this.versions[event.file] = event.version;
+            this.invalidateOccurrences();
+            return 'applied';
+        }
+        return null;
+    }
+
+    applyOps(filename, ops) {
+        // Mirrors apply_operation in task_files.py
+        for (const op of ops) {
+            if (filename === 'task-completions.json') {
+                if (op.op === 'toggle') {
+                    const dates = this.completions[op.id] || (this.completions[op.id] = {});
+                    dates[op.date] = 'completed' in op ? op.completed : !dates[op.date];
+                } else if (op.op === 'delete') {
+                    delete this.completions[op.id];
+                }
+                continue;
             }
 
-            // Load recurring tasks
-            const recurringResponse = await fetch('./recurring-tasks.json?t=' + Date.now());
-            if (recurringResponse.ok) {
-                this.recurringTasks = await recurringResponse.json();
-            } else {
-                this.recurringTasks = [];
+            const tasks = filename === 'single-tasks.json' ? this.singleTasks : this.recurringTasks;
+            const index = tasks.findIndex(t => t.id === op.id);
+            if (op.op === 'add') {
+                // Our own add can arrive as an event before the PATCH response does
+                if (!tasks.some(t => t.id === op.task.id)) {
+                    tasks.push(op.task);
+                }
+            } else if (index === -1) {
+                continue;
+            } else if (op.op === 'update') {
+                Object.assign(tasks[index], op.changes);
+            } else if (op.op === 'delete') {
+                tasks.splice(index, 1);
+            } else if (op.op === 'toggle') {
+                tasks[index].completed = 'completed' in op ? op.completed : !tasks[index].completed;
             }
+        }
+    }
 
-            // Load completion states
-            const completionsResponse = await fetch('./task-completions.json?t=' + Date.now());
-            if (completionsResponse.ok) {
-                this.completions = await completionsResponse.json();
-            } else {
-                this.completions = {};
+    async loadOccurrences(fromDate, toDate) {
+        // One request expands every template for the whole visible range
+        const from = this.formatDateForStorage(fromDate);
+        const to = this.formatDateForStorage(toDate);
+        try {
+            const response = await fetch(`${this.apiBaseUrl}/api/occurrences?from=${from}&to=${to}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
             }
+            const result = await response.json();
+            Object.assign(this.occurrences, result.days);
+            return true;
         } catch (error) {
-            console.error('Error loading tasks:', error);
-            this.singleTasks = [];
-            this.recurringTasks = [];
-            this.completions = {};
+            console.error('Error loading occurrences:', error);
+            return false;
         }
     }
 
+    hasOccurrences(fromDate, toDate) {
+        const date = new Date(fromDate);
+        while (date <= toDate) {
+            if (!(this.formatDateForStorage(date) in this.occurrences)) return false;
+            date.setDate(date.getDate() + 1);
+        }
+        return true;
+    }
+
+    invalidateOccurrences() {
+        this.occurrences = {};
+    }
+
     getTasksForDate(date) {
         const dateStr = this.formatDateForStorage(date);
-        console.log('TaskManager.getTasksForDate called for:', dateStr);
-        console.log('Available single tasks:', this.singleTasks.map(t => `${t.title} (${t.date})`));
-        console.log('Available recurring tasks:', this.recurringTasks);
-        
-        const tasks = [];
-
-        // Get single tasks for this date
-        const singleTasksForDate = this.singleTasks.filter(task => task.date === dateStr);
-        console.log('Single tasks for', dateStr, ':', singleTasksForDate);
-        tasks.push(...singleTasksForDate);
+        if (dateStr in this.occurrences) {
+            return this.occurrences[dateStr];
+        }
 
-        // Generate recurring tasks for this date
+        // Fallback when /api/occurrences couldn't be reached
+        const tasks = this.singleTasks.filter(task => task.date === dateStr);
         this.recurringTasks.forEach(recurringTask => {
             if (this.shouldShowTaskOnDate(recurringTask, date)) {
-                const taskInstance = this.createTaskInstance(recurringTask, dateStr);
-                tasks.push(taskInstance);
+                tasks.push(this.createTaskInstance(recurringTask, dateStr));
             }
         });
 
-        console.log('Total tasks for', dateStr, ':', tasks);
         return tasks.sort((a, b) => (a.startTime || '').localeCompare(b.startTime || ''));
     }
 
@@ -114,26 +193,39 @@ class TaskManager {
         };
     }
 
+    parseInstanceId(taskId) {
+        // Recurring instance ids look like <recurringId>_YYYY-MM-DD
+        const match = taskId.match(/^(.*)_(\d{4}-\d{2}-\d{2})$/);
+        return match ? { recurringId: match[1], date: match[2] } : null;
+    }
+
     async toggleTaskComplete(taskId) {
-        if (taskId.includes('_')) {
+        this.invalidateOccurrences();
+        const instance = this.parseInstanceId(taskId);
+        if (instance && this.recurringTasks.some(t => t.id === instance.recurringId)) {
             // This is a recurring task instance
-            const [recurringId, date] = taskId.split('_');
+            const { recurringId, date } = instance;
             if (!this.completions[recurringId]) {
                 this.completions[recurringId] = {};
             }
             this.completions[recurringId][date] = !this.completions[recurringId][date];
-            await this.saveCompletions();
+            await this.patchFile('task-completions.json', [
+                { op: 'toggle', id: recurringId, date, completed: this.completions[recurringId][date] }
+            ]);
         } else {
             // This is a single task
             const task = this.singleTasks.find(t => t.id === taskId);
             if (task) {
                 task.completed = !task.completed;
-                await this.saveSingleTasks();
+                await this.patchFile('single-tasks.json', [
+                    { op: 'toggle', id: taskId, completed: task.completed }
+                ]);
             }
         }
     }
 
     async addTask(task) {
+        this.invalidateOccurrences();
         if (task.recurrence) {
             // Add as recurring task
             const recurringTask = {
@@ -149,15 +241,16 @@ class TaskManager {
                 }
             };
             this.recurringTasks.push(recurringTask);
-            await this.saveRecurringTasks();
+            await this.patchFile('recurring-tasks.json', [{ op: 'add', task: recurringTask }]);
         } else {
             // Add as single task
             this.singleTasks.push(task);
-            await this.saveSingleTasks();
+            await this.patchFile('single-tasks.json', [{ op: 'add', task }]);
         }
     }
 
     async updateTask(task) {
+        this.invalidateOccurrences();
         console.log('TaskManager.updateTask called with:', task);
         console.log('Current recurring tasks:', this.recurringTasks.map(t => t.id));
         console.log('Current single tasks:', this.singleTasks.map(t => t.id));
@@ -246,42 +339,102 @@ class TaskManager {
     }
 
     async deleteTask(taskId) {
-        if (taskId.includes('_')) {
+        this.invalidateOccurrences();
+        const instance = this.parseInstanceId(taskId);
+        if (instance && this.recurringTasks.some(t => t.id === instance.recurringId)) {
             // Delete recurring task instance or all instances
-            const [recurringId] = taskId.split('_');
+            const { recurringId } = instance;
             const index = this.recurringTasks.findIndex(t => t.id === recurringId);
-            if (index !== -1) {
-                this.recurringTasks.splice(index, 1);
-                delete this.completions[recurringId];
-                await Promise.all([this.saveRecurringTasks(), this.saveCompletions()]);
-            }
+            this.recurringTasks.splice(index, 1);
+            delete this.completions[recurringId];
+            await Promise.all([
+                this.patchFile('recurring-tasks.json', [{ op: 'delete', id: recurringId }]),
+                this.patchFile('task-completions.json', [{ op: 'delete', id: recurringId }])
+            ]);
         } else {
             // Delete single task
             const index = this.singleTasks.findIndex(t => t.id === taskId);
             if (index !== -1) {
                 this.singleTasks.splice(index, 1);
-                await this.saveSingleTasks();
+                await this.patchFile('single-tasks.json', [{ op: 'delete', id: taskId }]);
             }
         }
     }
 
-    async saveRecurringTasks() {
-        try {
-            console.log('Saving recurring tasks to file...');
-            const response = await fetch(`${this.apiBaseUrl}/api/save-file`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    filename: 'recurring-tasks.json',
-                    content: this.recurringTasks
-                })
+    async patchFile(filename, ops) {
+        // Send only the changed records; If-Match makes the server reject stale edits
+        const send = () => {
+            const headers = { 'Content-Type': 'application/json' };
+            if (this.versions[filename]) {
+                headers['If-Match'] = `"${this.versions[filename]}"`;
+            }
+            return fetch(`${this.apiBaseUrl}/api/tasks/${filename}`, {
+                method: 'PATCH',
+                headers,
+                body: JSON.stringify({ ops })
             });
-            
+        };
+
+        try {
+            let response = await send();
+            let reload = false;
+            if (response.status === 412) {
+                // Someone else changed the file - our edit is record-level, so reapply it
+                // on top of their version and then pick up their changes
+                console.log(`${filename} changed on the server, reapplying edit`);
+                this.versions[filename] = (await response.json()).version;
+                response = await send();
+                reload = true;
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            
+
             const result = await response.json();
+            this.versions[filename] = result.version;
+            if (reload) {
+                await this.loadTasks();
+            }
+        } catch (error) {
+            console.error(`Error patching ${filename}:`, error);
+            throw error;
+        }
+    }
+
+    async saveFile(filename, content) {
+        // If-Match lets the server merge this save with edits made since we loaded the file
+        const headers = { 'Content-Type': 'application/json' };
+        if (this.versions[filename]) {
+            headers['If-Match'] = `"${this.versions[filename]}"`;
+        }
+        const response = await fetch(`${this.apiBaseUrl}/api/save-file`, {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({ filename, content })
+        });
+
+        if (response.status === 412) {
+            // Based on a version the server can no longer merge with - start over from its copy
+            await this.loadTasks();
+            throw new Error(`${filename} changed on the server, reloaded it`);
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const result = await response.json();
+        this.versions[filename] = result.version;
+        if (result.merged) {
+            // Our save was combined with someone else's edits - pick those up
+            await this.loadTasks();
+        }
+        return result;
+    }
+
+    async saveRecurringTasks() {
+        try {
+            console.log('Saving recurring tasks to file...');
+            const result = await this.saveFile('recurring-tasks.json', this.recurringTasks);
             console.log('Recurring tasks saved:', result);
         } catch (error) {
             console.error('Error saving recurring tasks:', error);
@@ -292,20 +445,7 @@ class TaskManager {
     async saveCompletions() {
         try {
             console.log('Saving task completions...');
-            const response = await fetch(`${this.apiBaseUrl}/api/save-file`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    filename: 'task-completions.json',
-                    content: this.completions
-                })
-            });
-            
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const result = await response.json();
+            const result = await this.saveFile('task-completions.json', this.completions);
             console.log('Task completions saved:', result);
         } catch (error) {
             console.error('Error saving completions:', error);
@@ -315,20 +455,7 @@ class TaskManager {
     async saveSingleTasks() {
         try {
             console.log('Saving single tasks to file...');
-            const response = await fetch(`${this.apiBaseUrl}/api/save-file`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    filename: 'single-tasks.json',
-                    content: this.singleTasks
-                })
-            });
-            
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const result = await response.json();
+            const result = await this.saveFile('single-tasks.json', this.singleTasks);
             console.log('Single tasks saved:', result);
         } catch (error) {
             console.error('Error saving single tasks:', error);
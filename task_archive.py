@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Task Archive - Compact columnar file format for task history
+
+The legacy tasks.json stores every recurring instance as a full, pretty-
+printed object that repeats its description and recurrence. An archive
+stores the same tasks column by column instead:
+
+    magic  b"TASKARC1"
+    zlib-compressed payload:
+        header   - row count and string count (uint32 each)
+        strings  - every distinct string once: uint32 lengths + one utf-8 blob
+        columns  - one array per field; strings are indexes into the string
+                   table, dates are epoch days, times are minutes after midnight
+
+Fields outside the fixed columns (e.g. recurrence objects) are kept as
+interned JSON in the "extra" column, so nothing is lost on a round trip.
+All integers are little-endian.
+
+Usage:
+    python3 task_archive.py tasks-archive.bin              # summary
+    python3 task_archive.py tasks-archive.bin 2025-07-01   # tasks on a date
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date, timedelta
+from pathlib import Path
+
+from task_files import atomic_write_bytes
+
+MAGIC = b"TASKARC1"
+EPOCH = date(1970, 1, 1)
+NONE = -1
+
+STRING_FIELDS = ('id', 'title', 'description', 'type', 'recurrenceId')
+# (column, array typecode) in file order
+COLUMNS = [(field, 'I') for field in STRING_FIELDS] + [
+    ('date', 'i'), ('startTime', 'h'), ('endTime', 'h'), ('completed', 'b'), ('extra', 'I'),
+]
+
+
+class ArchivedTask:
+    """One task loaded from an archive"""
+
+    __slots__ = ('id', 'title', 'description', 'type', 'recurrenceId',
+                 'date', 'startTime', 'endTime', 'completed', 'extra')
+
+    def __init__(self, id, title, description, type, recurrenceId,
+                 date, startTime, endTime, completed, extra):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.type = type
+        self.recurrenceId = recurrenceId
+        self.date = date
+        self.startTime = startTime
+        self.endTime = endTime
+        self.completed = completed
+        self.extra = extra
+
+    def to_dict(self):
+        """The task as it looked in the JSON it was archived from"""
+        task = {}
+        for name in self.__slots__[:-1]:
+            value = getattr(self, name)
+            if value is not None:
+                task[name] = value
+        if self.extra:
+            task.update(json.loads(self.extra))
+        return task
+
+
+def _minutes(value):
+    if not value:
+        return NONE
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _time(value):
+    return None if value == NONE else f"{value // 60:02d}:{value % 60:02d}"
+
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def encode(tasks):
+    """Archive bytes for a list of task dicts"""
+    strings = {None: 0}  # index 0 means "missing"
+    def intern(value):
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    known = set(STRING_FIELDS) | {'date', 'startTime', 'endTime', 'completed'}
+    for task in tasks:
+        for field in STRING_FIELDS:
+            value = task.get(field)
+            columns[field].append(intern(None if value is None else str(value)))
+        columns['date'].append((date.fromisoformat(task['date']) - EPOCH).days if task.get('date') else NONE)
+        columns['startTime'].append(_minutes(task.get('startTime')))
+        columns['endTime'].append(_minutes(task.get('endTime')))
+        completed = task.get('completed')
+        columns['completed'].append(NONE if completed is None else int(bool(completed)))
+        extra = {key: value for key, value in task.items() if key not in known}
+        columns['extra'].append(intern(json.dumps(extra, sort_keys=True, separators=(',', ':'))) if extra else 0)
+
+    table = [s.encode() for s in list(strings)[1:]]
+    lengths = array('I', (len(s) for s in table))
+    payload = [struct.pack('<II', len(tasks), len(table)),
+               _little_endian(lengths).tobytes(), b"".join(table)]
+    payload += [_little_endian(columns[name]).tobytes() for name, _ in COLUMNS]
+    return MAGIC + zlib.compress(b"".join(payload), 9)
+
+
+def decode_columns(data):
+    """(strings, {column: array}) without building per-task objects"""
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a task archive")
+    payload = zlib.decompress(data[len(MAGIC):])
+    rows, nstrings = struct.unpack_from('<II', payload)
+    offset = 8
+
+    def take(typecode, count):
+        nonlocal offset
+        column = array(typecode)
+        column.frombytes(payload[offset:offset + column.itemsize * count])
+        offset += column.itemsize * count
+        return _little_endian(column)
+
+    lengths = take('I', nstrings)
+    strings = [None]
+    for length in lengths:
+        strings.append(payload[offset:offset + length].decode())
+        offset += length
+    columns = {name: take(typecode, rows) for name, typecode in COLUMNS}
+    return strings, columns
+
+
+def decode(data):
+    """List of ArchivedTask from archive bytes"""
+    strings, columns = decode_columns(data)
+    # Few distinct dates and times repeat across many rows, so convert each once
+    days = {d: None if d == NONE else (EPOCH + timedelta(days=d)).isoformat() for d in set(columns['date'])}
+    times = {m: _time(m) for m in set(columns['startTime']) | set(columns['endTime'])}
+    flags = {NONE: None, 0: False, 1: True}
+    return list(map(
+        ArchivedTask,
+        *([strings[i] for i in columns[field]] for field in STRING_FIELDS),
+        [days[d] for d in columns['date']],
+        [times[m] for m in columns['startTime']],
+        [times[m] for m in columns['endTime']],
+        [flags[c] for c in columns['completed']],
+        [strings[i] for i in columns['extra']],
+    ))
+
+
+def write_archive(path, tasks):
+    """Write tasks to an archive file; returns its size in bytes"""
+    data = encode(tasks)
+    atomic_write_bytes(path, data)
+    return len(data)
+
+
+def read_archive(path):
+    return decode(Path(path).read_bytes())
+
+
+if __name__ == "__main__":
+    tasks = read_archive(sys.argv[1])
+    if len(sys.argv) > 2:
+        for task in tasks:
+            if task.date == sys.argv[2]:
+                print(json.dumps(task.to_dict()))
+    else:
+        dates = sorted(task.date for task in tasks if task.date)
+        print(f"{len(tasks)} tasks" + (f", {dates[0]} to {dates[-1]}" if dates else ""))
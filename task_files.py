@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Task Files - Atomic, versioned access to the split task JSON files
+
+The app keeps its data in three files:
+- recurring-tasks.json  - list of recurring task templates
+- single-tasks.json     - list of one-time tasks
+- task-completions.json - {recurringId: {date: true/false}}
+
+Writes go to a temp file that is renamed over the original, so a crash
+never leaves half a file behind. Each file's version (used as the HTTP
+ETag) is a hash of its bytes, so edits made directly on disk by the
+Claude CLI change the version too. write_task_file also takes the
+cross-process lock and journal in task_journal.py.
+
+merge_records() combines two edits made from the same starting point
+record by record, so concurrent writers don't overwrite each other.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from metrics import counter, json_parse_seconds, json_serialize_seconds
+
+RECURRING_FILE = 'recurring-tasks.json'
+SINGLE_FILE = 'single-tasks.json'
+COMPLETIONS_FILE = 'task-completions.json'
+TASK_FILES = [RECURRING_FILE, COMPLETIONS_FILE, SINGLE_FILE]
+
+# Serialises read-modify-write cycles on the same file within this process
+file_locks = {name: threading.Lock() for name in TASK_FILES}
+
+bytes_read = counter('task_file_bytes_read_total', 'Bytes read from task files', ['file'])
+bytes_written = counter('task_file_bytes_written_total', 'Bytes written to task files', ['file'])
+
+
+class VersionConflict(Exception):
+    """Raised when a patch was based on an older version of the file"""
+
+    def __init__(self, filename, current_version):
+        super().__init__(f"{filename} has changed (now version {current_version})")
+        self.filename = filename
+        self.current_version = current_version
+
+
+class PatchError(ValueError):
+    """Raised for a patch operation that can't be applied"""
+
+
+def empty_content(filename):
+    return {} if filename == COMPLETIONS_FILE else []
+
+
+def content_version(raw):
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def read_task_file(path):
+    """Return (content, version) for a task file"""
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        return empty_content(path.name), content_version(b"")
+    return parse(path.name, raw), content_version(raw)
+
+
+def parse(filename, raw):
+    """Content of a task file from its bytes, counted and timed for /api/metrics"""
+    bytes_read.inc(len(raw), file=filename)
+    if not raw.strip():
+        return empty_content(filename)
+    with json_parse_seconds.time(what=filename):
+        return json.loads(raw)
+
+
+def serialize(content, filename='task file'):
+    with json_serialize_seconds.time(what=filename):
+        return json.dumps(content, indent=2).encode()
+
+
+def atomic_write_json(path, content):
+    """Write JSON via temp file + rename and return the new version"""
+    return atomic_write_bytes(path, serialize(content, Path(path).name))
+
+
+def atomic_write_bytes(path, raw):
+    """Write already serialized JSON via temp file + rename and return its version"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    version = content_version(raw)
+    os.replace(tmp_path, path)
+    bytes_written.inc(len(raw), file=path.name)
+    return version
+
+
+def write_task_file(path, content, expected_version=None):
+    """Replace a whole task file, optionally only if it is still at expected_version"""
+    from task_journal import DiskConflict, TaskJournal  # task_journal builds on this module
+    path = Path(path)
+    raw = serialize(content, path.name)
+    with file_locks[path.name]:
+        try:
+            TaskJournal(path.parent).commit(path.name, raw, expected_version)
+        except DiskConflict as e:
+            raise VersionConflict(path.name, content_version(e.raw))
+        return content_version(raw)
+
+
+def _find(tasks, task_id):
+    for i, task in enumerate(tasks):
+        if task.get('id') == task_id:
+            return i
+    raise PatchError(f"No task with id {task_id}")
+
+
+def apply_operation(filename, content, op):
+    """Apply one add/update/delete/toggle operation to a file's content in place"""
+    kind = op.get('op')
+    if filename == COMPLETIONS_FILE:
+        task_id = op.get('id')
+        if kind == 'toggle':
+            dates = content.setdefault(task_id, {})
+            date = op.get('date')
+            dates[date] = op['completed'] if 'completed' in op else not dates.get(date, False)
+        elif kind == 'delete':
+            content.pop(task_id, None)
+        else:
+            raise PatchError(f"Unsupported operation {kind!r} for {filename}")
+        return content
+
+    if kind == 'add':
+        task = op.get('task') or {}
+        if not task.get('id'):
+            raise PatchError("Task to add needs an id")
+        if any(t.get('id') == task['id'] for t in content):
+            raise PatchError(f"Task {task['id']} already exists")
+        content.append(task)
+    elif kind == 'update':
+        content[_find(content, op.get('id'))].update(op.get('changes') or {})
+    elif kind == 'delete':
+        content.pop(_find(content, op.get('id')))
+    elif kind == 'toggle' and filename == SINGLE_FILE:
+        task = content[_find(content, op.get('id'))]
+        task['completed'] = op['completed'] if 'completed' in op else not task.get('completed', False)
+    else:
+        raise PatchError(f"Unsupported operation {kind!r} for {filename}")
+    return content
+
+
+def merge_records(filename, base, ours, theirs):
+    """theirs plus the records ours added, changed or deleted since base
+
+    base is the content both sides started from. Records are matched by id
+    (template id and date for completions); where both sides changed the
+    same record, ours wins.
+    """
+    if filename == COMPLETIONS_FILE:
+        merged = {task_id: dict(dates) for task_id, dates in theirs.items()}
+        for task_id in base.keys() - ours.keys():
+            merged.pop(task_id, None)
+        for task_id, dates in ours.items():
+            before = base.get(task_id, {})
+            target = merged.setdefault(task_id, {})
+            target.update((day, done) for day, done in dates.items() if before.get(day) != done)
+            for day in before.keys() - dates.keys():
+                target.pop(day, None)
+        return merged
+
+    base_by_id = {task.get('id'): task for task in base}
+    ours_ids = {task.get('id') for task in ours}
+    merged = [task for task in theirs if task.get('id') in ours_ids or task.get('id') not in base_by_id]
+    position = {task.get('id'): i for i, task in enumerate(merged)}
+    for task in ours:
+        if base_by_id.get(task.get('id')) == task:
+            continue  # untouched on our side
+        if task.get('id') in position:
+            merged[position[task.get('id')]] = task
+        else:
+            position[task.get('id')] = len(merged)
+            merged.append(task)
+    return merged
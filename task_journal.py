@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Task Journal - Coordinates every process that writes the task files
+
+The API server, the bridge and the command-line tools share the task files
+with the Claude CLI. Writes made through commit() hold an advisory flock on
+.<file>.lock and:
+
+1. check the file on disk is still the version the edit was based on,
+   raising DiskConflict with what is there now if it isn't
+2. append an intent record {file, seq, version} to .task-journal.jsonl
+   and fsync it
+3. write the bytes to a temp file, fsync it, rename it over the file and
+   fsync the directory
+4. append a commit record and keep a copy as .<file>.committed
+
+seq goes up by one with every write to a file, including edits made by
+programs that don't use the journal (the Claude CLI), which get a seq the
+first time a journal user reads them (seq_for). Aborted writes use up
+their seq too, so it never repeats.
+
+recover() runs at startup. An intent without a commit means the writer
+died mid-write: the temp file is renamed into place if it is complete,
+otherwise it is discarded and the old file stays. A file that no longer
+parses (torn by a program writing it in place) is restored from the last
+committed copy.
+"""
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from jsonl_log import JsonlLog
+from task_files import bytes_written, content_version
+
+JOURNAL_FILE = '.task-journal.jsonl'
+
+# Past this size the journal is cut back to the records head() still needs
+JOURNAL_COMPACT_BYTES = 64 * 1024
+
+log = logging.getLogger(__name__)
+
+
+class DiskConflict(Exception):
+    """Raised by commit() when someone else wrote the file since it was read"""
+
+    def __init__(self, filename, raw):
+        super().__init__(f"{filename} was changed on disk (now version {content_version(raw)})")
+        self.filename = filename
+        self.raw = raw
+
+
+def _read(path):
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return b""
+
+
+def _parses(raw):
+    try:
+        json.loads(raw) if raw.strip() else None
+        return True
+    except ValueError:
+        return False
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TaskJournal:
+    """Write-ahead journal and version counter for the task files in one directory"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.log = JsonlLog(self.directory / JOURNAL_FILE, fsync_interval=0)
+
+    def path(self, filename):
+        return self.directory / filename
+
+    @contextmanager
+    def lock(self, filename):
+        """Advisory lock shared by every journal user writing filename"""
+        with open(self.directory / f".{filename}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def head(self, filename):
+        """{seq, version, pending} for a file: its highest seq, the version last
+        written or seen on disk, and the intent record of a write still in progress"""
+        head = {"seq": 0, "version": None, "pending": None}
+        for record in self.log.read_all():
+            if record.get("file") != filename:
+                continue
+            head["seq"] = max(head["seq"], record["seq"])
+            if record["state"] == "intent":
+                head["pending"] = record
+            else:
+                head["pending"] = None
+                if record["state"] in ("commit", "external"):
+                    head["version"] = record["version"]
+        return head
+
+    def seq_for(self, filename, version):
+        """seq of the file's content at version, recording it if another program wrote it"""
+        with self.lock(filename):
+            head = self.head(filename)
+            if head["version"] == version:
+                return head["seq"]
+            seq = head["seq"] + 1
+            self.log.append({"file": filename, "seq": seq, "version": version, "state": "external"})
+            return seq
+
+    def commit(self, filename, raw, expected_version=None, seq=0):
+        """Write raw as the file's new content and return its seq
+
+        expected_version is the version (content_version of the bytes) the
+        edit was based on; None writes unconditionally. seq is a floor - the
+        file's next seq is used if that is higher.
+        """
+        path = self.path(filename)
+        tmp_path = path.with_name(f".{filename}.journal.tmp")
+        with self.lock(filename):
+            if expected_version is not None:
+                current = _read(path)
+                if content_version(current) != expected_version:
+                    raise DiskConflict(filename, current)
+            head = self.head(filename)
+            seq = max(seq, head["seq"] + 1)
+            version = content_version(raw)
+            self.log.append({"file": filename, "seq": seq, "version": version, "state": "intent"})
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(raw)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                _fsync_dir(self.directory)
+            except OSError:
+                tmp_path.unlink(missing_ok=True)
+                self.log.append({"file": filename, "seq": seq, "state": "abort"})
+                raise
+            self.log.append({"file": filename, "seq": seq, "version": version, "state": "commit"})
+            bytes_written.inc(len(raw), file=filename)
+            self._keep_copy(filename, raw)
+        if self.log.path.stat().st_size > JOURNAL_COMPACT_BYTES:
+            self.compact()
+        return seq
+
+    def _keep_copy(self, filename, raw):
+        # Only read back if the file is torn later, so it needn't be fsynced
+        tmp_path = self.path(f".{filename}.committed.tmp")
+        tmp_path.write_bytes(raw)
+        os.replace(tmp_path, self.path(f".{filename}.committed"))
+
+    def recover(self, filename):
+        """Finish or undo a write interrupted by a crash and repair a torn file"""
+        path = self.path(filename)
+        tmp_path = path.with_name(f".{filename}.journal.tmp")
+        with self.lock(filename):
+            pending = self.head(filename)["pending"]
+            if pending:
+                if content_version(_read(path)) == pending["version"]:
+                    state = "commit"  # renamed, but the commit record never made it
+                elif tmp_path.exists() and content_version(tmp_path.read_bytes()) == pending["version"]:
+                    os.replace(tmp_path, path)
+                    _fsync_dir(self.directory)
+                    self._keep_copy(filename, _read(path))
+                    state = "commit"
+                    log.warning("Finished interrupted write", extra={"file": filename, "seq": pending["seq"]})
+                else:
+                    tmp_path.unlink(missing_ok=True)
+                    state = "abort"
+                    log.warning("Discarded interrupted write", extra={"file": filename, "seq": pending["seq"]})
+                self.log.append({**pending, "state": state})
+
+            if _parses(_read(path)):
+                return
+            backup = path.with_name(f".{filename}.committed")
+            raw = _read(backup)
+            if not raw or not _parses(raw):
+                log.error("Task file is unreadable and has no committed copy", extra={"file": filename})
+                return
+            tmp_path.write_bytes(raw)
+            os.replace(tmp_path, path)
+            log.warning("Restored torn task file from its last committed copy",
+                        extra={"file": filename, "version": content_version(raw)})
+
+    def compact(self):
+        """Keep only what head() needs: per file, the last version seen and anything after it"""
+        def needed(records):
+            last_version = {}
+            for i, record in enumerate(records):
+                if record["state"] in ("commit", "external"):
+                    last_version[record.get("file")] = i
+            last = {record.get("file"): i for i, record in enumerate(records)}
+            keep = set(last_version.values()) | set(last.values())
+            return [record for i, record in enumerate(records) if i in keep]
+        self.log.retain(needed)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Task Store - The three task files held in memory, persisted write-behind
+
+The files are read once. Reads are served from memory. Edits update memory
+straight away, and a background flusher writes each changed file as a whole
+snapshot (temp file + rename) a moment later, so a burst of edits costs one
+disk write instead of one per request.
+
+Edits apply to copies of the list/dict (copy-on-write), so a reader keeps a
+consistent view of the content it was given.
+
+Edits made directly on disk (e.g. by the Claude CLI) are picked up by
+reload() - called by a file watcher - or refresh(), which compares mtimes.
+Only the files that actually changed are reloaded.
+
+Versions are "<seq>-<hash>", where seq counts the edits to the file and
+never goes down (task_journal.py keeps it across processes and restarts).
+Writes go through the journal, so nothing written by someone else is
+overwritten: if the Claude CLI changed a file that has unsaved edits, the
+edits are merged record by record on top of its change. A whole-file save
+based on a recent older version is merged the same way instead of being
+rejected.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from task_files import (COMPLETIONS_FILE, TASK_FILES, VersionConflict,
+                        apply_operation, content_version, empty_content, merge_records, parse,
+                        serialize)
+from task_journal import DiskConflict, TaskJournal
+
+log = logging.getLogger(__name__)
+
+# How long an edit waits for more edits before its file is written
+FLUSH_DELAY = 0.2
+
+# Earlier versions of each file kept for merging saves made from them
+HISTORY_SIZE = 16
+
+# Attempts to write a file that keeps being changed on disk under us
+FLUSH_ATTEMPTS = 3
+
+# A file that doesn't parse may be mid-write - re-read it this often before writing over it
+TORN_READ_ATTEMPTS = 5
+TORN_READ_DELAY = 0.1
+
+
+class StoredFile:
+    """In-memory state of one task file"""
+
+    def __init__(self, name):
+        self.name = name
+        self.content = empty_content(name)
+        self.seq = 0
+        self.version = _version(0, content_version(b""))
+        self.raw = b""             # serialized content, None until the flusher needs it
+        self.base = self.content   # content as it is on disk - what unsaved edits are based on
+        self.history = OrderedDict()  # recent version -> content
+        self.disk_version = None   # content_version of the bytes currently on disk
+        self.disk_key = None       # (mtime_ns, size) when last read or written
+        self.dirty = False
+
+
+def _version(seq, digest):
+    return f"{seq}-{digest}"
+
+
+def _copy_for(filename, content, operations):
+    """Copy of content that operations can modify without touching what readers hold"""
+    ids = {op.get('id') for op in operations}
+    if filename == COMPLETIONS_FILE:
+        return {task_id: dict(dates) if task_id in ids else dates for task_id, dates in content.items()}
+    return [dict(task) if task.get('id') in ids else task for task in content]
+
+
+class TaskStore:
+    """Process-wide cache of the task files with write-behind persistence"""
+
+    def __init__(self, schedule_dir, flush_delay=FLUSH_DELAY, on_change=None):
+        self.schedule_dir = Path(schedule_dir)
+        self.flush_delay = flush_delay
+        # Called with (filename, content, version) when a flush merged in a change made on disk
+        self.on_change = on_change
+        self.journal = TaskJournal(self.schedule_dir)
+        self.files = {name: StoredFile(name) for name in TASK_FILES}
+        self.lock = threading.RLock()
+        self.flush_needed = threading.Condition(self.lock)
+        self.flush_lock = threading.Lock()  # one writer at a time, so an older snapshot never lands last
+        self.flusher = None
+        self.closed = False
+        for name in TASK_FILES:
+            self.journal.recover(name)
+            self.reload(name)
+
+    def path(self, filename):
+        return self.schedule_dir / filename
+
+    # Reads
+
+    def read(self, filename):
+        """(content, version) of a task file - treat the content as read-only"""
+        stored = self.files[filename]
+        with self.lock:
+            return stored.content, stored.version
+
+    def versions(self):
+        with self.lock:
+            return {name: stored.version for name, stored in self.files.items()}
+
+    # Writes
+
+    def _remember(self, stored):
+        stored.history[stored.version] = stored.content
+        while len(stored.history) > HISTORY_SIZE:
+            stored.history.popitem(last=False)
+
+    def _commit(self, stored, content, digest, raw=None):
+        stored.seq += 1
+        stored.version = _version(stored.seq, digest)
+        stored.content = content
+        stored.raw = raw
+        stored.dirty = True
+        self._remember(stored)
+        self._start_flusher()
+        self.flush_needed.notify()
+        return stored.version
+
+    def replace(self, filename, content, expected_version=None):
+        """Replace a whole file; returns (content, version)
+
+        With expected_version, a save made from an older version this store
+        still remembers is merged with the edits made since; one made from a
+        version it no longer has raises VersionConflict.
+        """
+        raw = serialize(content, filename)
+        stored = self.files[filename]
+        with self.lock:
+            if expected_version is None or stored.version == expected_version:
+                return content, self._commit(stored, content, content_version(raw), raw)
+            base = stored.history.get(expected_version)
+            if base is None:
+                raise VersionConflict(filename, stored.version)
+            merged = merge_records(filename, base, content, stored.content)
+            digest = content_version(f"{stored.version}+{content_version(raw)}".encode())
+            return merged, self._commit(stored, merged, digest)
+
+    def patch(self, filename, operations, expected_version=None):
+        """Apply operations atomically; returns (content, new_version, previous_version)
+
+        The new version is derived from the previous one and the operations, so
+        an edit never has to re-serialize the whole file on the request thread.
+        """
+        stored = self.files[filename]
+        with self.lock:
+            previous = stored.version
+            if expected_version is not None and previous != expected_version:
+                raise VersionConflict(filename, previous)
+            content = _copy_for(filename, stored.content, operations)
+            for op in operations:
+                apply_operation(filename, content, op)
+            digest = f"{previous}:{json.dumps(operations, sort_keys=True)}".encode()
+            version = self._commit(stored, content, hashlib.sha1(digest).hexdigest()[:16])
+            return content, version, previous
+
+    # Persistence
+
+    def _start_flusher(self):
+        if not self.flusher:
+            self.flusher = threading.Thread(target=self._flush_loop, name="task-store-flush", daemon=True)
+            self.flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self.lock:
+                self.flush_needed.wait_for(
+                    lambda: self.closed or any(stored.dirty for stored in self.files.values()))
+                if self.closed:
+                    return
+            # Let a burst of edits land before writing
+            time.sleep(self.flush_delay)
+            self.flush()
+
+    def flush(self):
+        """Write every file with unsaved edits now"""
+        with self.flush_lock:
+            for stored in self.files.values():
+                for _ in range(FLUSH_ATTEMPTS):
+                    if self._flush_file(stored):
+                        break
+
+    def _flush_file(self, stored):
+        """Write the file if it has unsaved edits; False if it has to be tried again"""
+        with self.lock:
+            if not stored.dirty:
+                return True
+            # Stays dirty until the write lands, so a reload meanwhile merges rather than replaces it
+            content, raw, seq = stored.content, stored.raw, stored.seq
+        # Content is never modified in place, so it can be serialized without the lock
+        if raw is None:
+            raw = serialize(content, stored.name)
+        with self.lock:
+            if stored.content is content:
+                stored.raw = raw
+            # Known before the rename, so a watcher seeing the new file knows it is ours
+            previous_disk_version = stored.disk_version
+            writing_version = stored.disk_version = content_version(raw)
+        try:
+            self.journal.commit(stored.name, raw, previous_disk_version, seq)
+            stat = self.path(stored.name).stat()
+        except DiskConflict as e:
+            self._restore_disk_version(stored, writing_version, previous_disk_version)
+            self._merge_disk_change(stored, e.raw)
+            return False
+        except OSError as e:
+            log.error("Failed to write task file, will retry", extra={"file": stored.name, "error": str(e)})
+            self._restore_disk_version(stored, writing_version, previous_disk_version)
+            return True
+        with self.lock:
+            stored.disk_key = (stat.st_mtime_ns, stat.st_size)
+            stored.base = content
+            if stored.content is content:
+                stored.dirty = False  # otherwise edited (or merged) since - written next time
+        return True
+
+    def _restore_disk_version(self, stored, writing_version, previous_disk_version):
+        with self.lock:
+            # Unless a reload has since adopted what is really on disk
+            if stored.disk_version == writing_version:
+                stored.disk_version = previous_disk_version
+
+    def _merge_disk_change(self, stored, raw):
+        """Someone wrote the file between our last read and this flush"""
+        for _ in range(TORN_READ_ATTEMPTS):
+            try:
+                changed = self._adopt(stored.name, raw)
+                break
+            except ValueError:
+                # Probably caught a program writing in place - give it time to finish
+                time.sleep(TORN_READ_DELAY)
+                try:
+                    raw = self.path(stored.name).read_bytes()
+                except FileNotFoundError:
+                    raw = b""
+        else:
+            # Still torn - our content is the last good one, so write over it
+            log.warning("Task file on disk is not valid JSON; overwriting it", extra={"file": stored.name})
+            with self.lock:
+                stored.disk_version = content_version(raw)
+            return
+        if changed and self.on_change:
+            self.on_change(stored.name, *changed)
+
+    def close(self):
+        """Stop the flusher and write anything outstanding"""
+        with self.lock:
+            self.closed = True
+            self.flush_needed.notify_all()
+        self.flush()
+
+    # External edits
+
+    def reload(self, filename):
+        """Pick up the file from disk if someone else changed it
+
+        Returns (content, version) when the file was reloaded, None if the
+        disk still holds what this store last read or wrote.
+        """
+        path = self.path(filename)
+        try:
+            stat = path.stat()
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            stat, raw = None, b""
+        with self.lock:
+            self.files[filename].disk_key = (stat.st_mtime_ns, stat.st_size) if stat else None
+        return self._adopt(filename, raw)
+
+    def _adopt(self, filename, raw):
+        """Take the bytes someone else wrote as the file's content, keeping unsaved edits on top
+
+        Returns (content, version), or None if they are what this store last
+        read or wrote. Raises ValueError if they aren't valid JSON.
+        """
+        stored = self.files[filename]
+        disk_version = content_version(raw)
+        if disk_version == stored.disk_version:
+            return None
+        content = parse(filename, raw)
+        seq = self.journal.seq_for(filename, disk_version)
+
+        with self.lock:
+            if disk_version == stored.disk_version:
+                return None  # written by a flush while we were parsing
+            stored.seq = max(seq, stored.seq + 1)
+            if stored.dirty:
+                log.info("Merging unsaved edits with a change made on disk", extra={"file": filename})
+                stored.content = merge_records(filename, stored.base, stored.content, content)
+                stored.version = _version(stored.seq, content_version(f"{stored.version}+{disk_version}".encode()))
+                stored.raw = None
+                self.flush_needed.notify()
+            else:
+                stored.content = content
+                stored.version = _version(stored.seq, disk_version)
+                stored.raw = raw
+            stored.base = content
+            stored.disk_version = disk_version
+            self._remember(stored)
+            return stored.content, stored.version
+
+    def changed_on_disk(self):
+        """Files whose mtime or size no longer match what this store last read or wrote"""
+        changed = []
+        for name, stored in self.files.items():
+            try:
+                stat = self.path(name).stat()
+                key = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                key = None
+            if key != stored.disk_key:
+                changed.append(name)
+        return changed
+
+    def refresh(self):
+        """Reload files whose mtime or size changed; returns the reloaded filenames"""
+        reloaded = []
+        for name in self.changed_on_disk():
+            try:
+                if self.reload(name):
+                    reloaded.append(name)
+            except ValueError:
+                pass  # mid-write - try again next time
+        return reloaded
@@ -0,0 +1,77 @@
+from datetime import date
+
+from command_parser import CommandRouter
+
+TODAY = date(2026, 10, 18)
+
+
+def plan_add(message):
+    plan = CommandRouter(TODAY).plan(message, [], [])
+    task = plan.patches[0][1][0]["task"] if plan.patches else None
+    return plan, task
+
+
+def test_ordinal_day_rolls_over_to_next_month():
+    plan, task = plan_add("add pay rent on the 1st")
+    assert plan.confident
+    assert task["date"] == "2026-11-01"
+
+
+def test_ordinal_day_later_this_month():
+    _, task = plan_add("add pay rent on the 25th")
+    assert task["date"] == "2026-10-25"
+
+
+def test_range_ending_at_noon_starts_in_the_morning():
+    _, task = plan_add("add movie 10-12")
+    assert (task["startTime"], task["endTime"]) == ("10:00", "12:00")
+
+
+def test_range_ending_before_it_starts_goes_to_claude():
+    plan, _ = plan_add("add movie 9-5")
+    assert not plan.confident
+    assert not plan.patches
+
+
+def test_bare_hour_resolved_from_known_item():
+    plan, task = plan_add("add dinner at 7")
+    assert plan.confident
+    assert task["startTime"] == "19:00"
+
+
+def test_bare_hour_without_hint_goes_to_claude():
+    plan, _ = plan_add("add movie at 7")
+    assert not plan.confident
+
+
+def test_title_keeps_its_case():
+    _, task = plan_add("add Meeting with Bob tomorrow at 3pm")
+    assert task["title"] == "Meeting with Bob"
+    assert (task["date"], task["startTime"]) == ("2026-10-19", "15:00")
+
+
+def test_time_with_minutes_but_no_meridiem_goes_to_claude():
+    plan, _ = plan_add("add pick up kids at 3:30")
+    assert not plan.confident
+
+
+def test_two_times_joined_by_and_are_not_a_range():
+    plan, task = plan_add("add take meds at 8 am and 8 pm")
+    assert not plan.confident
+    assert task["startTime"] == "08:00"
+
+
+def test_between_and_is_a_range():
+    _, task = plan_add("add gym between 5 and 6pm")
+    assert (task["startTime"], task["endTime"]) == ("17:00", "18:00")
+
+
+def test_weekday_abbreviation_in_title_is_not_a_date():
+    _, task = plan_add("add sat exam prep tomorrow at 5pm")
+    assert task["title"] == "Sat exam prep"
+    assert task["date"] == "2026-10-19"
+
+
+def test_weekday_abbreviation_with_date_context():
+    _, task = plan_add("add dentist on sat")
+    assert task["date"] == "2026-10-24"